@@ -0,0 +1,426 @@
+import ctypes  # for the wanted board of the thread fallback
+import multiprocessing  # for searching in a worker process next to the game loop
+import queue  # for the results of the thread fallback
+import signal  # for the default signal handlers of the worker process
+import threading  # for the lock of the hint cache and the thread fallback
+from collections import OrderedDict  # for the bounded hint cache
+from bitboard import directions, move_board, transpose, empty_shifts, count_empty, unpack_board
+from symmetry import canonical_board, canonical_values, restore_direction
+
+"""
+---------------------------------------------------------------------
+    Move search for the 2048 game
+---------------------------------------------------------------------
+    - Expectimax search over the packed boards of bitboard.py
+    - Player nodes take the best move, chance nodes average over all spawns (2 with 90 %, 4 with 10 %)
+    - Positions at the search horizon are scored by a heuristic precomputed for every row
+    - Value of a move = score of its merges + expected value of the position after it
+    - HintEngine runs the search in a worker process for the hint button -> the search never competes
+      with the game loop for the GIL, only the board (one integer) and the best move are exchanged,
+      positions of the opening book (opening_book.py) or covered by an endgame tablebase (tablebase.py)
+      are answered without a search
+---------------------------------------------------------------------
+"""
+
+# region VARIABLES
+"""
+Variables of the search
+    - score_lost_penalty: float -> base value of every row, a lost board gets 0 instead
+    - score_monotonicity_power: float -> power of the pieces in the monotonicity penalty
+    - score_monotonicity_weight: float -> weight of the monotonicity penalty
+    - score_sum_power: float -> power of the pieces in the sum penalty
+    - score_sum_weight: float -> weight of the sum penalty
+    - score_merges_weight: float -> weight of the possible merges
+    - score_empty_weight: float -> weight of the empty cells
+    - row_heuristic_table: list -> heuristic of every row (used for the rows and for the columns)
+    - stop_check_interval: int -> searched nodes between two checks if the search should stop
+    - search_context: multiprocessing context of the hint worker, forked -> the worker does not import the game
+      again (None -> no fork on this platform, the hint search runs in a thread)
+"""
+score_lost_penalty = 200000.0
+score_monotonicity_power = 4.0
+score_monotonicity_weight = 47.0
+score_sum_power = 3.5
+score_sum_weight = 11.0
+score_merges_weight = 700.0
+score_empty_weight = 270.0
+
+row_heuristic_table = [0.0] * 65536
+
+stop_check_interval = 256
+
+search_context = multiprocessing.get_context('fork') if 'fork' in multiprocessing.get_all_start_methods() else None
+
+
+# endregion VARIABLES
+
+# region HEURISTIC
+
+def row_heuristic(line):
+    """
+    Heuristic of one row -> rewards empty cells, possible merges and monotonic rows, penalizes big pieces
+    Args:
+        line: list -> exponents of the row
+    Return:
+        float -> heuristic of the row
+    """
+    piece_sum = 0.0
+    empty = 0
+    merges = 0
+    previous = 0
+    counter = 0
+    for exponent in line:
+        piece_sum += exponent ** score_sum_power
+        if exponent == 0:
+            empty += 1
+        else:
+            if previous == exponent:
+                counter += 1
+            elif counter > 0:
+                merges += 1 + counter
+                counter = 0
+            previous = exponent
+    if counter > 0:
+        merges += 1 + counter
+
+    monotonicity_left = 0.0
+    monotonicity_right = 0.0
+    for i in range(1, 4):
+        if line[i - 1] > line[i]:
+            monotonicity_left += (line[i - 1] ** score_monotonicity_power
+                                  - line[i] ** score_monotonicity_power)
+        else:
+            monotonicity_right += (line[i] ** score_monotonicity_power
+                                   - line[i - 1] ** score_monotonicity_power)
+
+    return (score_lost_penalty + score_empty_weight * empty + score_merges_weight * merges
+            - score_monotonicity_weight * min(monotonicity_left, monotonicity_right)
+            - score_sum_weight * piece_sum)
+
+
+def build_heuristic_table():
+    """
+    Fill the heuristic table for all 65536 possible rows
+    """
+    for row in range(65536):
+        row_heuristic_table[row] = row_heuristic([(row >> shift) & 0xF for shift in (0, 4, 8, 12)])
+
+
+build_heuristic_table()
+
+
+def evaluate(board):
+    """
+    Heuristic of the whole board -> sum of the heuristic of all rows and all columns
+    Args:
+        board: int -> packed board
+    Return:
+        float -> heuristic of the board
+    """
+    transposed = transpose(board)
+    table = row_heuristic_table
+    return (table[board & 0xFFFF] + table[(board >> 16) & 0xFFFF]
+            + table[(board >> 32) & 0xFFFF] + table[(board >> 48) & 0xFFFF]
+            + table[transposed & 0xFFFF] + table[(transposed >> 16) & 0xFFFF]
+            + table[(transposed >> 32) & 0xFFFF] + table[(transposed >> 48) & 0xFFFF])
+
+
+# endregion HEURISTIC
+
+# region EXPECTIMAX
+
+class SearchCancelled(Exception):
+    """
+    Raised inside the search when should_stop asked to stop it
+    """
+
+
+class Expectimax:
+    """
+    Depth limited expectimax search with a transposition cache
+    Args:
+        depth: int -> number of player moves searched
+        probability_cutoff: float -> spawn sequences less likely than this are scored by the heuristic
+        should_stop: callable -> returns True when the search should be cancelled (None -> never)
+        canonical_cache: bool -> key the cache by the canonical board, all 8 symmetries share one entry
+                                 (off by default, inside one search symmetric positions are rare)
+    """
+
+    def __init__(self, depth=2, probability_cutoff=0.0001, should_stop=None, canonical_cache=False):
+        self.depth = depth
+        self.probability_cutoff = probability_cutoff
+        self.should_stop = should_stop
+        self.canonical_cache = canonical_cache
+        self.cache = {}
+        self.nodes = 0
+
+    def move_values(self, board):
+        """
+        Expected value of every possible move
+        Args:
+            board: int -> packed board
+        Return:
+            dict -> direction -> expected value, moves which do not change the board are left out
+        """
+        values = {}
+        for move_direction in directions:
+            new_board, move_score = move_board(board, move_direction)
+            if new_board != board:
+                values[move_direction] = move_score + self.chance_node(new_board, self.depth - 1, 1.0)
+        return values
+
+    def best_move(self, board):
+        """
+        Find the best move of the board
+        Args:
+            board: int -> packed board
+        Return:
+            str -> best direction, None if no move is possible
+        """
+        values = self.move_values(board)
+        if not values:
+            return None
+        return max(values, key=values.get)
+
+    def max_node(self, board, depth, probability):
+        """
+        Value of a position where the player moves
+        Args:
+            board: int -> packed board
+            depth: int -> remaining player moves
+            probability: float -> probability of reaching this position
+        Return:
+            float -> value of the best move, 0 if the game is over
+        """
+        self.nodes += 1
+        if self.should_stop is not None and self.nodes % stop_check_interval == 0 and self.should_stop():
+            raise SearchCancelled()
+
+        best_value = 0.0
+        for move_direction in directions:
+            new_board, move_score = move_board(board, move_direction)
+            if new_board != board:
+                value = move_score + self.chance_node(new_board, depth, probability)
+                if value > best_value:
+                    best_value = value
+        return best_value
+
+    def chance_node(self, board, depth, probability):
+        """
+        Value of a position where a new piece spawns -> average over all empty cells and both pieces
+        Args:
+            board: int -> packed board
+            depth: int -> remaining player moves
+            probability: float -> probability of reaching this position
+        Return:
+            float -> expected value of the position
+        """
+        if depth <= 0 or probability < self.probability_cutoff:
+            return evaluate(board)
+
+        key = canonical_board(board)[0] if self.canonical_cache else board
+        cached = self.cache.get(key)
+        if cached is not None and cached[0] >= depth:
+            return cached[1]
+
+        shifts = empty_shifts(board)
+        if not shifts:
+            return evaluate(board)
+        cell_probability = probability / len(shifts)
+        total = 0.0
+        for shift in shifts:
+            total += 0.9 * self.max_node(board | (1 << shift), depth - 1, cell_probability * 0.9)
+            total += 0.1 * self.max_node(board | (2 << shift), depth - 1, cell_probability * 0.1)
+        value = total / len(shifts)
+
+        self.cache[key] = (depth, value)
+        return value
+
+
+def survival_probability(board, moves, cache=None):
+    """
+    Probability that the best playing player can still make the given number of moves
+    Args:
+        board: int -> packed board before the move
+        moves: int -> number of moves to survive
+        cache: dict -> memo of already computed positions, shared between calls (None -> new memo)
+    Return:
+        float -> probability of surviving (1.0 -> safe, 0.0 -> lost for sure)
+    """
+    # every move keeps at least the empty cells it had and a spawn fills only one of them
+    if moves <= 0 or count_empty(board) >= moves:
+        return 1.0
+    if cache is None:
+        cache = {}
+    key = (board, moves)
+    if key in cache:
+        return cache[key]
+
+    best = 0.0
+    for move_direction in directions:
+        new_board, _ = move_board(board, move_direction)
+        if new_board == board:
+            continue
+        shifts = empty_shifts(new_board)
+        total = 0.0
+        for shift in shifts:
+            total += 0.9 * survival_probability(new_board | (1 << shift), moves - 1, cache)
+            total += 0.1 * survival_probability(new_board | (2 << shift), moves - 1, cache)
+        best = max(best, total / len(shifts))
+        if best == 1.0:
+            break
+
+    cache[key] = best
+    return best
+
+
+# endregion EXPECTIMAX
+
+# region HINT ENGINE
+
+def search_worker(depth, wanted, wake, results):
+    """
+    Body of the hint worker -> search the wanted board until a new one is requested
+    Args:
+        depth: int -> number of player moves searched
+        wanted: ctypes.c_uint64 -> canonical board to search, shared with the game (0 -> nothing to search)
+        wake: Event -> set by the game when a new board is wanted
+        results: Queue -> (canonical board, best direction) of every finished search
+    """
+    while True:
+        wake.wait()
+        wake.clear()
+        board = wanted.value
+        if board == 0:
+            continue
+
+        search = Expectimax(depth, should_stop=lambda: wanted.value != board)
+        try:
+            hint = search.best_move(board) or ''
+        except SearchCancelled:
+            continue
+        results.put((board, hint))
+
+
+def search_process(depth, wanted, wake, results):
+    """
+    Entry of the hint worker process -> the forked process inherits the signal handlers of SDL, which turn
+    SIGTERM into a quit event, the default handlers let the game stop the worker when it exits
+    Args:
+        depth: int -> number of player moves searched
+        wanted: ctypes.c_uint64 -> canonical board to search, shared with the game (0 -> nothing to search)
+        wake: Event -> set by the game when a new board is wanted
+        results: Queue -> (canonical board, best direction) of every finished search
+    """
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    # Ctrl+C in the terminal is handled by the game
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    search_worker(depth, wanted, wake, results)
+
+
+class HintEngine:
+    """
+    Finds the best move in a worker process, so the game loop never waits for the search
+    Call request after every change of the board, the search of an old board is cancelled
+    Finished searches are cached by the canonical board (symmetry.py), so repeated positions and their
+    rotations and reflections are answered instantly
+    The worker is forked when the engine is created, before the game starts its other threads
+    Args:
+        depth: int -> number of player moves searched
+        cache_size: int -> number of positions kept in the cache
+        tablebase: Tablebase -> mapped endgame table consulted before searching (None -> always search)
+        book: OpeningBook -> mapped opening book consulted before searching (None -> always search)
+    """
+
+    def __init__(self, depth=2, cache_size=4096, tablebase=None, book=None):
+        self.depth = depth
+        self.cache_size = cache_size
+        self.tablebase = tablebase
+        self.book = book
+        self.cache = OrderedDict()
+        self.lock = threading.Lock()
+        if search_context is not None:
+            self.wanted = search_context.Value(ctypes.c_uint64, 0, lock=False)
+            self.wake = search_context.Event()
+            self.results = search_context.Queue()
+            self.worker = search_context.Process(target=search_process,
+                                                 args=(depth, self.wanted, self.wake, self.results), daemon=True)
+        else:
+            self.wanted = ctypes.c_uint64(0)
+            self.wake = threading.Event()
+            self.results = queue.Queue()
+            self.worker = threading.Thread(target=search_worker,
+                                           args=(depth, self.wanted, self.wake, self.results), daemon=True)
+        self.worker.start()
+
+    def request(self, board_values):
+        """
+        Start searching the board in the background, returns immediately
+        Args:
+            board_values: list -> values of the board (None -> cancel the current search)
+        """
+        board = canonical_values(board_values)[0] if board_values is not None else 0
+        with self.lock:
+            self.collect_results()
+            if board == 0 or board in self.cache:
+                self.wanted.value = 0
+                return
+            # a position of the book or the table is answered at once, the search only runs when neither decides
+            hint = self.book.best_move(board) if self.book is not None else None
+            if hint is None and self.tablebase is not None:
+                hint = self.tablebase.best_move(unpack_board(board))
+            if hint is not None:
+                self.wanted.value = 0
+                self.add_hint(board, hint)
+                return
+        self.wanted.value = board
+        self.wake.set()
+
+    def cancel(self):
+        """
+        Cancel the current search
+        """
+        self.request(None)
+
+    def get_hint(self, board_values):
+        """
+        Get the best move of the board if it is already searched, never waits
+        Args:
+            board_values: list -> values of the board
+        Return:
+            str -> best direction, '' if no move is possible, None if the search did not finish yet
+        """
+        board, symmetry = canonical_values(board_values)
+        with self.lock:
+            self.collect_results()
+            hint = self.cache.get(board)
+            if hint is None:
+                return None
+            self.cache.move_to_end(board)
+        # the cached move belongs to the canonical board
+        return restore_direction(hint, symmetry) if hint else hint
+
+    def collect_results(self):
+        """
+        Move the finished searches of the worker into the cache, the caller holds the lock
+        """
+        while True:
+            try:
+                board, hint = self.results.get_nowait()
+            except queue.Empty:
+                return
+            self.add_hint(board, hint)
+
+    def add_hint(self, board, hint):
+        """
+        Cache the best move of a board, the oldest position is dropped when the cache is full
+        Args:
+            board: int -> canonical board
+            hint: str -> best direction, '' if no move is possible
+        """
+        self.cache[board] = hint
+        if len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+
+
+# endregion HINT ENGINE
@@ -0,0 +1,379 @@
+import argparse  # for the command line options
+import json  # for the reports
+import multiprocessing  # for analyzing the games on all cores
+import os  # for the report paths
+import sqlite3  # for the move value cache shared between runs
+import time  # for the summary
+from ai import Expectimax, survival_probability
+from bitboard import directions, pack_board, max_exponent
+from recording import load_record, find_recordings
+from variants import rule_variants
+from symmetry import canonical_board, restore_direction
+from opening_book import default_book_file, find_opening_book
+from ntuple import default_weights_file, load_network
+
+"""
+---------------------------------------------------------------------
+    Offline analysis of recorded games
+---------------------------------------------------------------------
+    - Replays every recorded game and searches every position where the player moved
+    - For every move it reports the best move and the heuristic value lost by the played move
+      (difference of the expectimax values of ai.py, the positions at the horizon are scored by ai.evaluate,
+      so the loss is in heuristic units and not in game score)
+    - With trained n-tuple weights (ntuple.py) it also reports the expected game score lost by the played move:
+      merge score of the move + value of the board after it, the network is trained to predict the score
+      of the rest of the game, so this loss is in game points and comparable between positions and games
+    - It finds the position where the game was effectively lost -> from there on the best play
+      survives the next few moves with less than the given probability until the end of the game
+    - Move values are cached in a SQLite file shared by all workers and all runs,
+      positions analyzed once are never searched again
+    - Positions of the opening book (opening_book.py) take the deeper move values of the book
+    - The cache is keyed by the canonical board (symmetry.py) -> rotated and mirrored positions share one row
+    - Games are analyzed in parallel by a process pool, one report file is written per game
+    - Only games on classic boards are analyzed, games of the other rule variants are skipped as unsupported
+
+Usage: python analyzer.py assets/recordings --output assets/reports
+---------------------------------------------------------------------
+"""
+
+# region VARIABLES
+"""
+Variables of the analysis
+    - default_cache_file: str -> path of the move value cache
+    - lost_horizon: int -> number of moves the survival is checked for
+    - lost_probability: float -> survival probability below which a position counts as lost
+    - worker_search: Expectimax -> search of the worker process, its memo lives for one game
+    - worker_cache: sqlite3.Connection -> move value cache of the worker process
+    - worker_depth: int -> search depth of the worker process
+    - worker_book: OpeningBook -> opening book of the worker process (None -> search every position)
+    - worker_network: NTupleNetwork -> network of the expected score loss (None -> no expected score loss)
+"""
+default_cache_file = 'assets/save_files/analysis_cache.sqlite'
+lost_horizon = 3
+lost_probability = 0.5
+
+worker_search = None
+worker_cache = None
+worker_depth = 2
+worker_book = None
+worker_network = None
+
+
+# endregion VARIABLES
+
+# region MOVE VALUE CACHE
+
+def to_signed(board):
+    """
+    Convert a packed board to a signed 64 bit integer which fits into a SQLite INTEGER
+    Args:
+        board: int -> packed board
+    Return:
+        int -> signed key of the board
+    """
+    return board - (1 << 64) if board >= (1 << 63) else board
+
+
+def open_cache(cache_file):
+    """
+    Open the move value cache and create its table if needed
+    Args:
+        cache_file: str -> path of the cache file
+    Return:
+        sqlite3.Connection -> connection to the cache
+    """
+    directory = os.path.dirname(cache_file)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    connection = sqlite3.connect(cache_file, timeout=60)
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("CREATE TABLE IF NOT EXISTS canonical_move_values (board INTEGER, depth INTEGER, "
+                       "up REAL, down REAL, left REAL, right REAL, PRIMARY KEY (board, depth))")
+    connection.commit()
+    return connection
+
+
+def load_cached_values(connection, boards, depth):
+    """
+    Read the move values of the boards which are already in the cache
+    Args:
+        connection: sqlite3.Connection -> connection to the cache
+        boards: list -> canonical boards
+        depth: int -> search depth of the values
+    Return:
+        dict -> canonical board -> (direction on the canonical board -> value)
+    """
+    cached = {}
+    keys = list({to_signed(board) for board in boards})
+    # SQLite limits the number of query parameters
+    for start in range(0, len(keys), 500):
+        chunk = keys[start:start + 500]
+        rows = connection.execute(
+            f"SELECT board, up, down, left, right FROM canonical_move_values "
+            f"WHERE depth = ? AND board IN ({', '.join('?' * len(chunk))})", [depth] + chunk)
+        for key, *values in rows:
+            board = key + (1 << 64) if key < 0 else key
+            cached[board] = {move_direction: value for move_direction, value in zip(directions, values)
+                             if value is not None}
+    return cached
+
+
+def store_values(connection, new_values, depth):
+    """
+    Write newly searched move values into the cache in one transaction
+    Args:
+        connection: sqlite3.Connection -> connection to the cache
+        new_values: dict -> canonical board -> (direction on the canonical board -> value)
+        depth: int -> search depth of the values
+    """
+    if not new_values:
+        return
+    with connection:
+        connection.executemany(
+            "INSERT OR IGNORE INTO canonical_move_values VALUES (?, ?, ?, ?, ?, ?)",
+            [(to_signed(board), depth, *(values.get(move_direction) for move_direction in directions))
+             for board, values in new_values.items()])
+
+
+# endregion MOVE VALUE CACHE
+
+# region ANALYSIS
+
+def init_worker(cache_file, depth, book_file, weights_file):
+    """
+    Initialize a worker process -> open its cache connection, create its search, map the opening book
+    and the n-tuple weights
+    Args:
+        cache_file: str -> path of the move value cache
+        depth: int -> search depth
+        book_file: str -> path of the opening book (None -> no book)
+        weights_file: str -> path of the n-tuple weights (None -> no expected score loss)
+    """
+    global worker_search, worker_cache, worker_depth, worker_book, worker_network
+    worker_depth = depth
+    worker_search = Expectimax(depth)
+    worker_cache = open_cache(cache_file)
+    worker_book = find_opening_book(book_file) if book_file is not None else None
+    try:
+        worker_network = load_network(weights_file) if weights_file is not None else None
+    except (OSError, ValueError):
+        worker_network = None
+
+
+def expected_score_loss(board, played):
+    """
+    Expected game score lost by the played move, valued by the n-tuple network
+    Args:
+        board: int -> packed board before the move
+        played: str -> played direction
+    Return:
+        tuple -> (direction -> expected score of every possible move, loss of the played move),
+                 the loss is None without a network
+    """
+    if worker_network is None:
+        return None, None
+    values = worker_network.move_values(board)
+    if not values:
+        return values, 0.0
+    # a move which does not change the board leaves the board itself as the afterstate
+    played_value = values[played] if played in values else worker_network.value(board)
+    return values, max(values.values()) - played_value
+
+
+def find_lost_position(positions):
+    """
+    Find the position where the game was effectively lost
+    Args:
+        positions: list -> reports of the positions in the game order
+    Return:
+        int -> index of the position, None if the game was never lost
+    """
+    survival_cache = {}
+    lost_index = None
+    # walk backwards, the game is lost from the first position of the last unsafe stretch
+    for index in range(len(positions) - 1, -1, -1):
+        board = pack_board(positions[index]["board"])
+        if survival_probability(board, lost_horizon, survival_cache) >= lost_probability:
+            break
+        lost_index = index
+    return lost_index
+
+
+def analyze_game(path, output_directory):
+    """
+    Analyze one recorded game and write its report
+    Args:
+        path: str -> path of the recording file
+        output_directory: str -> directory of the reports
+    Return:
+        dict -> summary of the game (recording, positions, searched positions, total heuristic loss,
+                total expected score loss -> None without a network),
+                unsupported is True for a game whose boards the search cannot represent
+    """
+    record = load_record(path)
+    # blockers and the tiles of other merge rules do not fit into a packed board
+    rules = rule_variants.get(record.variant)
+    if rules is None or not rules.classic_board:
+        return {"recording": path, "positions": 0, "searched": 0, "total_heuristic_loss": 0.0,
+                "total_expected_score_loss": None, "unsupported": True}
+    move_positions = record.move_positions()
+    boards = [pack_board(board_values) for board_values, _, _ in move_positions]
+    canonical = [canonical_board(board) for board in boards]
+
+    cached = load_cached_values(worker_cache, [key for key, _ in canonical], worker_depth)
+    new_values = {}
+    worker_search.cache.clear()
+
+    positions = []
+    total_heuristic_loss = 0.0
+    total_expected_score_loss = 0.0 if worker_network is not None else None
+    for board, (key, symmetry), (board_values, played, score) in zip(boards, canonical, move_positions):
+        values = worker_book.move_values(board) if worker_book is not None else None
+        # a move which does not change the board is scored by the search, its depth has to match the values
+        if values is None or played not in values:
+            canonical_values = cached.get(key)
+            if canonical_values is None:
+                canonical_values = new_values.get(key)
+            if canonical_values is None:
+                canonical_values = worker_search.move_values(key)
+                new_values[key] = canonical_values
+            # the cached values belong to the moves of the canonical board
+            values = {restore_direction(move_direction, symmetry): value
+                      for move_direction, value in canonical_values.items()}
+
+        if values:
+            best = max(values, key=values.get)
+            if played in values:
+                loss = values[best] - values[played]
+            else:
+                # a move which does not change the board still spawns a piece
+                loss = values[best] - worker_search.chance_node(board, worker_depth - 1, 1.0)
+        else:
+            best = None
+            loss = 0.0
+        total_heuristic_loss += loss
+        score_values, score_loss = expected_score_loss(board, played)
+        if score_loss is not None:
+            total_expected_score_loss += score_loss
+        positions.append({
+            "move": len(positions),
+            "score": score,
+            "board": board_values,
+            "played": played,
+            "best": best,
+            "values": values,
+            "heuristic_loss": loss,
+            "expected_score_values": score_values,
+            "expected_score_loss": score_loss
+        })
+
+    store_values(worker_cache, new_values, worker_depth)
+
+    lost_index = find_lost_position(positions)
+    # the score of the last position is the score before the last move, the replay has the score after it
+    final_values = record.initial_board
+    final_score = 0
+    for _, player in record.replay():
+        final_values = player.board_values
+        final_score = player.score
+    final_board = pack_board(final_values)
+    report = {
+        "recording": path,
+        "mode": record.mode,
+        "moves": len(positions),
+        "final_score": final_score,
+        "max_tile": 1 << max_exponent(final_board) if final_board else 0,
+        "total_heuristic_loss": total_heuristic_loss,
+        "total_expected_score_loss": total_expected_score_loss,
+        "mistakes": sum(1 for position in positions if position["best"] not in (None, position["played"])),
+        "lost_at": positions[lost_index] if lost_index is not None else None,
+        "positions": positions
+    }
+
+    os.makedirs(output_directory, exist_ok=True)
+    report_name = os.path.splitext(os.path.basename(path))[0] + '.report.json'
+    with open(os.path.join(output_directory, report_name), 'w') as f:
+        json.dump(report, f, indent=1)
+
+    return {"recording": path, "positions": len(positions), "searched": len(new_values),
+            "total_heuristic_loss": total_heuristic_loss, "total_expected_score_loss": total_expected_score_loss,
+            "unsupported": False}
+
+
+def analyze_game_task(task):
+    """
+    Pool wrapper of analyze_game
+    Args:
+        task: tuple -> (path of the recording, output directory)
+    Return:
+        dict -> summary of the game
+    """
+    return analyze_game(*task)
+
+
+def analyze_games(paths, output_directory, cache_file=default_cache_file, depth=2, workers=None,
+                  book_file=default_book_file, weights_file=default_weights_file):
+    """
+    Analyze many recorded games in parallel
+    Args:
+        paths: list -> recording files or directories
+        output_directory: str -> directory of the reports
+        cache_file: str -> path of the move value cache
+        depth: int -> search depth
+        workers: int -> number of worker processes (None -> all cores)
+        book_file: str -> path of the opening book (None -> search every position)
+        weights_file: str -> path of the n-tuple weights of the expected score loss (None -> no expected score loss)
+    Return:
+        list -> summaries of all games
+    """
+    recordings = find_recordings(paths)
+    # create the table once before the workers race for it
+    open_cache(cache_file).close()
+    tasks = [(path, output_directory) for path in recordings]
+    with multiprocessing.Pool(workers, initializer=init_worker, initargs=(cache_file, depth, book_file, weights_file)) as pool:
+        return list(pool.imap_unordered(analyze_game_task, tasks, chunksize=4))
+
+
+# endregion ANALYSIS
+
+# region MAIN
+
+def main():
+    """
+    Parse the command line options, analyze the games and print a summary
+    """
+    parser = argparse.ArgumentParser(description="Analyze recorded 2048 games")
+    parser.add_argument('recordings', nargs='+', help="recording files or directories")
+    parser.add_argument('--output', default='assets/reports', help="directory of the reports")
+    parser.add_argument('--cache', default=default_cache_file, help="move value cache shared between runs")
+    parser.add_argument('--depth', type=int, default=2, help="search depth in moves")
+    parser.add_argument('--workers', type=int, default=None, help="worker processes (default: all cores)")
+    parser.add_argument('--book', default=default_book_file, help="opening book used for its positions")
+    parser.add_argument('--no-book', action='store_true', help="search every position, even the positions of the book")
+    parser.add_argument('--weights', default=default_weights_file,
+                        help="n-tuple weights of the expected score loss (skipped if the file does not exist)")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    summaries = analyze_games(args.recordings, args.output, args.cache, args.depth, args.workers,
+                              None if args.no_book else args.book, args.weights)
+    elapsed = time.perf_counter() - start
+
+    unsupported = [summary["recording"] for summary in summaries if summary["unsupported"]]
+    positions = sum(summary["positions"] for summary in summaries)
+    searched = sum(summary["searched"] for summary in summaries)
+    print(f"games: {len(summaries) - len(unsupported)}, positions: {positions}, searched: {searched}, "
+          f"from cache: {positions - searched}")
+    for path in unsupported:
+        print(f"skipped {path}: rule variant without classic boards")
+    score_losses = [summary["total_expected_score_loss"] for summary in summaries
+                    if summary["total_expected_score_loss"] is not None]
+    if score_losses:
+        print(f"expected score lost per game: {sum(score_losses) / len(score_losses):.0f}")
+    print(f"time: {elapsed:.2f} s, positions per second: {positions / max(elapsed, 1e-9):.0f}")
+
+
+if __name__ == "__main__":
+    main()
+
+# endregion MAIN
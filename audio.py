@@ -0,0 +1,254 @@
+import argparse  # for the command line options
+import os  # for the decoded sound cache
+import time  # for measuring the latency and the decoding
+import pygame
+
+"""
+---------------------------------------------------------------------
+    Audio of the 2048 game
+---------------------------------------------------------------------
+    - The mixer is opened with a small buffer -> a sound starts a few milliseconds after it is played
+    - Every MP3 is decoded to raw PCM only once and stored in assets/sounds/cache,
+      later starts load the PCM directly (no MP3 decoding at all)
+    - Sounds are loaded when the audio is opened, not when the game is imported
+    - Every sound category has its own reserved channels -> a click never cuts off a move and the other way round
+    - Fast moves overlap on a few move channels (voices), when all of them are busy the oldest one is restarted
+      -> rapid moves are never delayed and never pile up
+    - The latency from the input (key or click) to the start of the sound is measured for every sound:
+      time until the game called play + the time the mixer buffer needs to play out
+
+Usage: python main.py --audio-buffer 256
+       python audio.py info --buffer 256
+---------------------------------------------------------------------
+"""
+
+# region VARIABLES
+"""
+Variables of the audio
+    - sound_files: dict -> sound name -> (file, category)
+    - category_voices: dict -> category -> number of reserved channels (voices playing at once)
+    - default_frequency: int -> sample rate of the mixer
+    - default_buffer: int -> samples in the mixer buffer, smaller -> lower latency but more CPU
+    - sound_cache_directory: str -> directory of the decoded PCM files
+    - latency_window: int -> number of latencies kept for the percentiles
+"""
+sound_files = {
+    "move": ('assets/sounds/move.mp3', "move"),
+    "click": ('assets/sounds/button_click.mp3', "ui"),
+    "reset": ('assets/sounds/reset.mp3', "ui")
+}
+category_voices = {
+    "move": 3,
+    "ui": 1
+}
+default_frequency = 44100
+default_buffer = 256
+sound_cache_directory = 'assets/sounds/cache'
+latency_window = 256
+
+
+# endregion VARIABLES
+
+# region DECODING
+
+def decoded_sound(path, mixer_format):
+    """
+    Load a sound as PCM in the format of the mixer, the MP3 is decoded only if there is no up to date PCM file
+    Args:
+        path: str -> path of the sound file
+        mixer_format: tuple -> (frequency, size, channels) of the opened mixer
+    Return:
+        pygame.mixer.Sound -> sound ready to be played
+    """
+    frequency, size, channels = mixer_format
+    name = os.path.splitext(os.path.basename(path))[0]
+    pcm_path = os.path.join(sound_cache_directory, f"{name}_{frequency}_{size}_{channels}.pcm")
+    try:
+        if os.path.getmtime(pcm_path) >= os.path.getmtime(path):
+            with open(pcm_path, 'rb') as f:
+                return pygame.mixer.Sound(buffer=f.read())
+    except OSError:
+        pass  # no decoded file yet
+
+    sound = pygame.mixer.Sound(path)
+    try:
+        os.makedirs(sound_cache_directory, exist_ok=True)
+        with open(pcm_path, 'wb') as f:
+            f.write(sound.get_raw())
+    except OSError:
+        pass  # a read-only game still plays, it only decodes again next time
+    return sound
+
+
+# endregion DECODING
+
+# region AUDIO MANAGER
+
+class AudioManager:
+    """
+    Plays the sounds of the game on reserved channels
+    The manager does nothing until it is opened -> importing the game never touches the audio device
+    """
+
+    def __init__(self):
+        self.sounds = {}
+        self.channels = {}  # category -> reserved channels
+        self.voice_starts = {}  # category -> perf_counter time each channel last started a sound
+        self.buffer = default_buffer
+        self.buffer_latency = 0.0
+        self.input_time = None  # perf_counter time of the input waiting for its sound
+        self.latencies = []
+
+    @property
+    def opened(self):
+        """
+        True if the mixer is opened and the sounds are loaded
+        """
+        return bool(self.sounds)
+
+    def open(self, buffer=default_buffer, frequency=default_frequency):
+        """
+        Open the mixer with a small buffer, reserve the channels and load the decoded sounds
+        Args:
+            buffer: int -> samples in the mixer buffer (power of two)
+            frequency: int -> sample rate
+        Return:
+            bool -> True if the audio device could be opened
+        """
+        self.close()
+        try:
+            pygame.mixer.quit()
+            pygame.mixer.init(frequency, -16, 2, buffer)
+        except pygame.error:
+            return False
+        mixer_format = pygame.mixer.get_init()
+        self.buffer = buffer
+        self.buffer_latency = buffer / mixer_format[0]
+
+        # reserved channels are never picked by Sound.play -> the categories never steal from each other
+        total = sum(category_voices.values())
+        pygame.mixer.set_num_channels(total)
+        pygame.mixer.set_reserved(total)
+        first = 0
+        for category, voices in category_voices.items():
+            self.channels[category] = [pygame.mixer.Channel(index) for index in range(first, first + voices)]
+            self.voice_starts[category] = [0.0] * voices
+            first += voices
+
+        for name, (path, _) in sound_files.items():
+            self.sounds[name] = decoded_sound(path, mixer_format)
+        return True
+
+    def mark_input(self):
+        """
+        Remember the time of a key press or click, the next played sound measures its latency from it
+        """
+        self.input_time = time.perf_counter()
+
+    def play(self, name):
+        """
+        Play a sound on a free channel of its category, the oldest voice is restarted when all are busy
+        Args:
+            name: str -> name of the sound (key of sound_files)
+        Return:
+            float -> input to sound latency in milliseconds, None if no input was waiting or nothing was played
+        """
+        if not self.sounds:
+            return None
+        category = sound_files[name][1]
+        channels = self.channels[category]
+        starts = self.voice_starts[category]
+        for index, channel in enumerate(channels):
+            if not channel.get_busy():
+                break
+        else:
+            # every voice is busy -> take the one which started first
+            index = starts.index(min(starts))
+            channel = channels[index]
+        channel.play(self.sounds[name])
+        starts[index] = time.perf_counter()
+
+        if self.input_time is None:
+            return None
+        latency = (time.perf_counter() - self.input_time + self.buffer_latency) * 1000
+        self.input_time = None
+        self.latencies.append(latency)
+        if len(self.latencies) > latency_window:
+            del self.latencies[0]
+        return latency
+
+    def latency_percentiles(self):
+        """
+        Percentiles of the measured input to sound latencies
+        Return:
+            tuple -> (p50, p95, max) in milliseconds, None if nothing was measured yet
+        """
+        if not self.latencies:
+            return None
+        latencies = sorted(self.latencies)
+        count = len(latencies)
+        return latencies[count // 2], latencies[count * 95 // 100], latencies[-1]
+
+    def close(self):
+        """
+        Stop all sounds and forget the loaded sounds
+        """
+        if self.sounds:
+            pygame.mixer.stop()
+        self.sounds = {}
+        self.channels = {}
+        self.voice_starts = {}
+
+
+# endregion AUDIO MANAGER
+
+# region MAIN
+
+def info(buffer, frequency, plays):
+    """
+    Print the mixer settings, the loading times of the sounds and the latency of rapid move sounds
+    Args:
+        buffer: int -> samples in the mixer buffer
+        frequency: int -> sample rate
+        plays: int -> number of move sounds played in a row
+    """
+    pygame.init()
+    manager = AudioManager()
+    start = time.perf_counter()
+    if not manager.open(buffer, frequency):
+        print("audio device not available")
+        return
+    opened = time.perf_counter() - start
+    print(f"mixer: {pygame.mixer.get_init()}, buffer {buffer} samples = {manager.buffer_latency * 1000:.1f} ms")
+    print(f"opened with {len(manager.sounds)} sounds in {opened * 1000:.1f} ms (decoded PCM in {sound_cache_directory})")
+    print("channels: " + ", ".join(f"{category} {voices}" for category, voices in category_voices.items()))
+
+    # a move every 20 ms, far faster than a player -> the move voices are reused
+    for _ in range(plays):
+        manager.mark_input()
+        manager.play("move")
+        time.sleep(0.02)
+    p50, p95, longest = manager.latency_percentiles()
+    print(f"input to sound latency of {plays} rapid moves: p50 {p50:.1f} ms, p95 {p95:.1f} ms, max {longest:.1f} ms")
+    manager.close()
+    pygame.quit()
+
+
+def main():
+    """
+    Parse the command line options and print the audio information
+    """
+    parser = argparse.ArgumentParser(description="Audio of the 2048 game")
+    parser.add_argument('command', choices=['info'], help="print the mixer settings and the measured latency")
+    parser.add_argument('--buffer', type=int, default=default_buffer, help="samples in the mixer buffer")
+    parser.add_argument('--frequency', type=int, default=default_frequency, help="sample rate of the mixer")
+    parser.add_argument('--plays', type=int, default=50, help="move sounds played in a row")
+    args = parser.parse_args()
+
+    info(args.buffer, args.frequency, args.plays)
+
+
+if __name__ == "__main__":
+    main()
+
+# endregion MAIN
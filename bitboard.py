@@ -0,0 +1,248 @@
+"""
+---------------------------------------------------------------------
+    Packed 2048 board with precomputed row tables
+---------------------------------------------------------------------
+    - The whole 4x4 board is one int, every cell is a 4 bit exponent (0 -> empty, 1 -> 2, 2 -> 4, ...)
+    - Cell (row, col) is stored at bits 16 * row + 4 * col
+    - A row is 16 bits, so every row move is one lookup in a 65536 entry table built at import
+    - Columns are moved as rows of the transposed board
+    - Used by the search (ai.py) and the tools which need millions of moves, the game itself uses game_logic.py
+    - Exponents are limited to 15 (32768), two 32768 pieces merge into 32768
+---------------------------------------------------------------------
+"""
+
+# region VARIABLES
+"""
+Variables of the packed board
+    - directions: tuple -> all move directions in the order used by the search
+    - row_left_table: list -> row after a move to the left, indexed by the row
+    - row_right_table: list -> row after a move to the right, indexed by the row
+    - row_score_table: list -> score of the merges in the row (same for both directions)
+    - row_empty_table: list -> number of empty cells in the row
+"""
+directions = ("UP", "DOWN", "LEFT", "RIGHT")
+
+row_left_table = [0] * 65536
+row_right_table = [0] * 65536
+row_score_table = [0] * 65536
+row_empty_table = [0] * 65536
+
+
+# endregion VARIABLES
+
+# region ROW TABLES
+
+def merge_line(line):
+    """
+    Move and merge one line of exponents towards its start, same rules as the move functions in game_logic.py
+    Args:
+        line: list -> exponents of the line
+    Return:
+        merged_line: list -> exponents after the move
+        line_score: int -> score of the merges
+    """
+    tiles = [tile for tile in line if tile != 0]
+    merged_line = []
+    line_score = 0
+    skip = False
+    for i in range(len(tiles)):
+        if skip:
+            skip = False
+            continue
+        if i + 1 < len(tiles) and tiles[i] == tiles[i + 1]:
+            merged_exponent = min(tiles[i] + 1, 15)
+            merged_line.append(merged_exponent)
+            line_score += 1 << (tiles[i] + 1)
+            skip = True
+        else:
+            merged_line.append(tiles[i])
+    merged_line += [0] * (len(line) - len(merged_line))
+    return merged_line, line_score
+
+
+def pack_row(line):
+    """
+    Pack a line of 4 exponents to a 16 bit row
+    Args:
+        line: list -> exponents of the row
+    Return:
+        int -> packed row
+    """
+    return line[0] | (line[1] << 4) | (line[2] << 8) | (line[3] << 12)
+
+
+def build_row_tables():
+    """
+    Fill the row tables for all 65536 possible rows
+    """
+    for row in range(65536):
+        line = [(row >> shift) & 0xF for shift in (0, 4, 8, 12)]
+        merged_line, line_score = merge_line(line)
+        row_left_table[row] = pack_row(merged_line)
+        row_score_table[row] = line_score
+        row_empty_table[row] = line.count(0)
+        merged_line, _ = merge_line(line[::-1])
+        row_right_table[row] = pack_row(merged_line[::-1])
+
+
+build_row_tables()
+
+
+# endregion ROW TABLES
+
+# region BOARD CONVERSION
+
+def pack_board(board_values):
+    """
+    Pack a board of values (list of lists as used by the game) to one int
+    Args:
+        board_values: list -> values of the board
+    Return:
+        int -> packed board
+    """
+    board = 0
+    for row in range(4):
+        for col in range(4):
+            value = board_values[row][col]
+            if value:
+                board |= min(value.bit_length() - 1, 15) << (16 * row + 4 * col)
+    return board
+
+
+def unpack_board(board):
+    """
+    Unpack a packed board back to the list of lists of values used by the game
+    Args:
+        board: int -> packed board
+    Return:
+        list -> values of the board
+    """
+    board_values = []
+    for row in range(4):
+        row_values = []
+        for col in range(4):
+            exponent = (board >> (16 * row + 4 * col)) & 0xF
+            row_values.append(1 << exponent if exponent else 0)
+        board_values.append(row_values)
+    return board_values
+
+
+def transpose(board):
+    """
+    Transpose the packed board (rows become columns)
+    Args:
+        board: int -> packed board
+    Return:
+        int -> transposed board
+    """
+    a1 = board & 0xF0F00F0FF0F00F0F
+    a2 = board & 0x0000F0F00000F0F0
+    a3 = board & 0x0F0F00000F0F0000
+    a = a1 | (a2 << 12) | (a3 >> 12)
+    b1 = a & 0xFF00FF0000FF00FF
+    b2 = a & 0x00FF00FF00000000
+    b3 = a & 0x00000000FF00FF00
+    return b1 | (b2 >> 24) | (b3 << 24)
+
+
+# endregion BOARD CONVERSION
+
+# region MOVES
+
+def move_rows(board, table):
+    """
+    Apply a row table to all four rows of the board
+    Args:
+        board: int -> packed board
+        table: list -> row table (row_left_table or row_right_table)
+    Return:
+        int -> board after the move
+    """
+    return (table[board & 0xFFFF]
+            | (table[(board >> 16) & 0xFFFF] << 16)
+            | (table[(board >> 32) & 0xFFFF] << 32)
+            | (table[(board >> 48) & 0xFFFF] << 48))
+
+
+def board_score(board):
+    """
+    Score of the merges of a move to the left or right, for up and down pass the transposed board
+    Args:
+        board: int -> packed board
+    Return:
+        int -> score of the merges
+    """
+    return (row_score_table[board & 0xFFFF] + row_score_table[(board >> 16) & 0xFFFF]
+            + row_score_table[(board >> 32) & 0xFFFF] + row_score_table[(board >> 48) & 0xFFFF])
+
+
+def move_board(board, move_direction):
+    """
+    Move the packed board in the given direction
+    Args:
+        board: int -> packed board
+        move_direction: str -> direction of the move (UP, DOWN, LEFT, RIGHT)
+    Return:
+        new_board: int -> board after the move
+        move_score: int -> score of the merges
+    """
+    if move_direction == "LEFT":
+        return move_rows(board, row_left_table), board_score(board)
+    if move_direction == "RIGHT":
+        return move_rows(board, row_right_table), board_score(board)
+    transposed = transpose(board)
+    if move_direction == "UP":
+        return transpose(move_rows(transposed, row_left_table)), board_score(transposed)
+    return transpose(move_rows(transposed, row_right_table)), board_score(transposed)
+
+
+def count_empty(board):
+    """
+    Count the empty cells of the board
+    Args:
+        board: int -> packed board
+    Return:
+        int -> number of empty cells
+    """
+    return (row_empty_table[board & 0xFFFF] + row_empty_table[(board >> 16) & 0xFFFF]
+            + row_empty_table[(board >> 32) & 0xFFFF] + row_empty_table[(board >> 48) & 0xFFFF])
+
+
+def empty_shifts(board):
+    """
+    Get the bit positions of all empty cells
+    Args:
+        board: int -> packed board
+    Return:
+        list -> bit shift of every empty cell (16 * row + 4 * col)
+    """
+    return [shift for shift in range(0, 64, 4) if not (board >> shift) & 0xF]
+
+
+def can_move(board):
+    """
+    Check if any move changes the board -> False means the game is over
+    Args:
+        board: int -> packed board
+    Return:
+        bool -> True if at least one move is possible
+    """
+    if move_rows(board, row_left_table) != board or move_rows(board, row_right_table) != board:
+        return True
+    transposed = transpose(board)
+    return (move_rows(transposed, row_left_table) != transposed
+            or move_rows(transposed, row_right_table) != transposed)
+
+
+def max_exponent(board):
+    """
+    Get the exponent of the highest piece on the board
+    Args:
+        board: int -> packed board
+    Return:
+        int -> highest exponent (0 for an empty board)
+    """
+    return max((board >> shift) & 0xF for shift in range(0, 64, 4))
+
+
+# endregion MOVES
@@ -0,0 +1,405 @@
+import argparse  # for the command line options
+import multiprocessing  # for rendering the segments of a replay in parallel
+import os  # for the dummy video driver and the output files
+import shutil  # for joining the encoded segments
+import struct  # for the GIF blocks
+import time  # for measuring the export
+import numpy as np  # for mapping the frames to the palette
+import pygame
+from recording import load_record
+
+try:
+    from PIL import Image  # only needed for the LZW encoder of the GIF export
+except ImportError:
+    Image = None
+
+"""
+---------------------------------------------------------------------
+    Replay exporter of the 2048 game
+---------------------------------------------------------------------
+    - Exports a recorded game as an animated GIF or as an image sequence (PNG, BMP, ...)
+    - Frames are rendered off-screen with the SDL dummy video driver -> no window is opened,
+      the board and the pieces are drawn by draw_board and draw_pieces of main.py with the theme colors
+    - One frame per move or undo (a move and its spawn are one frame)
+    - The replay is split into segments, every segment is rendered and encoded by a worker of a process pool
+    - Frames are never kept: every frame is encoded as soon as it is drawn and appended to the part file
+      of its segment, the parts are appended to the output in order as soon as they are done
+      -> memory stays the same for a game of 50 or 50,000 moves
+    - GIF frames use one global palette built from the theme (tile colors + antialiased text blends),
+      a frame only stores the rectangle which changed since the previous frame
+    - GIF needs Pillow for its LZW encoder, image sequences only need pygame
+
+Usage: python exporter.py assets/recordings/game.json
+       python exporter.py assets/recordings/game.json --output game.gif --theme dark
+       python exporter.py assets/recordings/game.json --output frames --format png --workers 4
+---------------------------------------------------------------------
+"""
+
+# region VARIABLES
+"""
+Variables of the exporter
+    - exports_directory: str -> default directory of the exported games
+    - export_formats: tuple -> output formats, gif or an image format of pygame.image.save
+    - default_size: tuple -> size of the exported frames in pixels
+    - default_fps: float -> frames (moves) per second of the animation
+    - hold_time: int -> milliseconds the last frame is shown before the GIF loops
+    - segment_frames: int -> frames rendered by one task of the pool
+    - text_blend_steps: int -> blends between every color and the text colors in the palette
+    - worker_*: state of a worker process (game module, palette and lookup tables)
+"""
+exports_directory = 'assets/exports'
+export_formats = ('gif', 'png', 'bmp', 'tga', 'jpg')
+default_size = (400, 500)
+default_fps = 10
+hold_time = 2000
+segment_frames = 250
+text_blend_steps = 3
+
+worker_game = None
+worker_palette = None
+worker_lookup = None
+worker_pixel_lookup = None
+
+# endregion VARIABLES
+
+# region FRAMES
+
+def replay_frames(record):
+    """
+    Replay a recorded game with the game rules and keep the state of every exported frame
+    Only the values are kept, the frames are drawn later by the workers
+    Args:
+        record: GameRecord -> recorded game
+    Return:
+        list -> (16 values of the board, score, number of moves) of every frame
+    """
+    history = record.history
+    frames = []
+    if not history or history[0][0] != "spawn":
+        frames.append((tuple(value for row in record.initial_board for value in row), 0, 0))
+    moves = 0
+    for index, (event, player) in enumerate(record.replay()):
+        if event[0] == "move":
+            moves += 1
+        # a move and the spawn after it are one frame
+        if index + 1 < len(history) and history[index + 1][0] == "spawn":
+            continue
+        frames.append((tuple(value for row in player.board_values for value in row), player.score, moves))
+    return frames
+
+
+def build_palette(theme_colors):
+    """
+    Build the global palette of a theme -> every color of the theme and the blends of every color
+    with the text colors (edges of antialiased texts)
+    Args:
+        theme_colors: dict -> colors of the theme
+    Return:
+        np.ndarray -> (256, 3) palette, unused entries are black
+    """
+    base = []
+    for color in theme_colors.values():
+        if tuple(color[:3]) not in base:
+            base.append(tuple(color[:3]))
+    palette = list(base)
+    for text_color in (theme_colors["dark_text"], theme_colors["light_text"]):
+        for color in base:
+            for step in range(1, text_blend_steps + 1):
+                weight = step / (text_blend_steps + 1)
+                blend = tuple(round(c + (t - c) * weight) for c, t in zip(color, text_color[:3]))
+                if blend not in palette:
+                    palette.append(blend)
+    palette = palette[:256]
+    return np.array(palette + [(0, 0, 0)] * (256 - len(palette)), dtype=np.uint8)
+
+
+def build_lookup(palette):
+    """
+    Map every color (5 bits per channel) to the nearest palette entry
+    Args:
+        palette: np.ndarray -> (256, 3) palette
+    Return:
+        np.ndarray -> (32768,) palette index of every 15 bit color
+    """
+    levels = np.arange(32) * 8 + 4
+    red, green, blue = np.meshgrid(levels, levels, levels, indexing='ij')
+    colors = np.stack([red.ravel(), green.ravel(), blue.ravel()], axis=1).astype(np.int32)
+    lookup = np.empty(len(colors), dtype=np.uint8)
+    entries = palette.astype(np.int32)
+    for start in range(0, len(colors), 4096):
+        chunk = colors[start:start + 4096]
+        distances = ((chunk[:, None, :] - entries[None, :, :]) ** 2).sum(axis=2)
+        lookup[start:start + 4096] = distances.argmin(axis=1)
+    return lookup
+
+
+def build_pixel_lookup(lookup, surface):
+    """
+    Map every pixel value of a surface format to the nearest palette entry
+    -> a frame is converted with one table lookup of its raw pixels, without copying it to RGB first
+    Args:
+        lookup: np.ndarray -> palette index of every 15 bit color
+        surface: pygame.Surface -> surface the frames are drawn on
+    Return:
+        np.ndarray -> palette index of every pixel value (alpha ignored), None if the format is not 8 bits per color
+    """
+    red_mask, green_mask, blue_mask, _ = surface.get_masks()
+    color_mask = red_mask | green_mask | blue_mask
+    if surface.get_bytesize() != 4 or surface.get_losses()[:3] != (0, 0, 0) or color_mask >= 1 << 24:
+        return None
+    red_shift, green_shift, blue_shift, _ = surface.get_shifts()
+    pixel_lookup = np.empty(color_mask + 1, dtype=np.uint8)
+    # built in chunks -> the worker never holds more than the finished table
+    for start in range(0, color_mask + 1, 1 << 20):
+        pixels = np.arange(start, min(start + (1 << 20), color_mask + 1), dtype=np.uint32)
+        keys = ((((pixels >> (red_shift + 3)) & 31) << 10) | (((pixels >> (green_shift + 3)) & 31) << 5)
+                | ((pixels >> (blue_shift + 3)) & 31))
+        pixel_lookup[start:start + len(pixels)] = lookup[keys]
+    return pixel_lookup
+
+
+# endregion FRAMES
+
+# region WORKER
+
+def init_worker(theme, size, variant='classic'):
+    """
+    Initialize a worker process -> headless display, layout of the export size, the theme and the rule variant
+    Args:
+        theme: str -> theme of the exported frames
+        size: tuple -> size of the frames in pixels
+        variant: str -> rule variant of the recorded game (decides the colors of the tiles)
+    """
+    global worker_game, worker_palette, worker_lookup, worker_pixel_lookup
+    os.environ["SDL_VIDEODRIVER"] = "dummy"
+    os.environ["SDL_AUDIODRIVER"] = "dummy"
+    # SDL turns SIGTERM into a quit event -> the pool could not stop its workers
+    os.environ["SDL_NO_SIGNAL_HANDLERS"] = "1"
+    # main.py opens its display when imported -> import it only after the dummy driver is selected
+    import main as game
+    import layout
+    from renderer import SoftwareRenderer
+
+    pygame.init()
+    layout.fonts.clear()
+    layout.get_layout.cache_clear()
+    game.renderer = SoftwareRenderer(size)
+    game.layout = layout.get_layout(*size)
+    game.tile_surface_cache.clear()
+    game.apply_theme(theme)
+    game.current_variant = variant
+    worker_game = game
+    worker_palette = build_palette(game.colors)
+    worker_lookup = build_lookup(worker_palette)
+    worker_pixel_lookup = build_pixel_lookup(worker_lookup, game.renderer.surface)
+
+
+def draw_frame(frame, total_moves):
+    """
+    Draw one frame off-screen with the drawing functions of the game
+    Args:
+        frame: tuple -> (16 values of the board, score, number of moves)
+        total_moves: int -> moves of the whole game
+    Return:
+        pygame.Surface -> drawn frame
+    """
+    game = worker_game
+    values, score, moves = frame
+    board = [list(values[row * 4:row * 4 + 4]) for row in range(4)]
+    game.renderer.fill(game.colors["screen_color"])
+    game.draw_board('replay')
+    game.draw_pieces(board)
+    score_text = game.layout.render(f"Score: {score}", game.colors['dark_text'])
+    moves_text = game.layout.render(f"Move: {moves} / {total_moves}", game.colors['dark_text'])
+    game.renderer.blit(score_text, game.layout.point(10, 410))
+    game.renderer.blit(moves_text, game.layout.point(10, 450))
+    return game.renderer.surface
+
+
+def palette_indexes(surface):
+    """
+    Convert a drawn frame to indexes of the global palette
+    Args:
+        surface: pygame.Surface -> drawn frame
+    Return:
+        np.ndarray -> (height, width) palette indexes
+    """
+    if worker_pixel_lookup is not None:
+        pixels = pygame.surfarray.pixels2d(surface)
+        indexes = worker_pixel_lookup[pixels.T & (len(worker_pixel_lookup) - 1)]
+        del pixels  # unlock the surface for the next frame
+        return indexes
+    width, height = surface.get_size()
+    pixels = np.frombuffer(pygame.image.tobytes(surface, 'RGB'), dtype=np.uint8).reshape(height, width, 3)
+    pixels = pixels >> 3
+    keys = (pixels[:, :, 0].astype(np.uint16) << 10) | (pixels[:, :, 1].astype(np.uint16) << 5) | pixels[:, :, 2]
+    return worker_lookup[keys]
+
+
+def gif_frame(indexes, previous, delay):
+    """
+    Encode one GIF frame, only the rectangle which changed since the previous frame is stored
+    Args:
+        indexes: np.ndarray -> palette indexes of the frame
+        previous: np.ndarray -> palette indexes of the previous frame (None -> full frame)
+        delay: int -> time the frame is shown in hundredths of a second
+    Return:
+        bytes -> graphic control extension, image descriptor and LZW data of the frame
+    """
+    if previous is None:
+        top, bottom, left, right = 0, indexes.shape[0], 0, indexes.shape[1]
+    else:
+        changed = indexes != previous
+        rows = np.flatnonzero(changed.any(axis=1))
+        columns = np.flatnonzero(changed.any(axis=0))
+        if len(rows) == 0:
+            # nothing changed (an undo back to the same board) -> one pixel keeps the timing
+            top, bottom, left, right = 0, 1, 0, 1
+        else:
+            top, bottom, left, right = rows[0], rows[-1] + 1, columns[0], columns[-1] + 1
+    region = np.ascontiguousarray(indexes[top:bottom, left:right])
+    image = Image.frombuffer('L', (right - left, bottom - top), region.tobytes(), 'raw', 'L', 0, 1)
+    # disposal 1 -> the next frame is drawn over this one
+    control = b'!\xf9\x04\x04' + struct.pack('<H', delay) + b'\x00\x00'
+    descriptor = b',' + struct.pack('<HHHHB', left, top, right - left, bottom - top, 0)
+    return control + descriptor + b'\x08' + image.tobytes('gif', 'L') + b'\x00'
+
+
+def export_segment(task):
+    """
+    Render and encode the frames of one segment
+    GIF frames are appended to the part file of the segment, image frames are saved as single files
+    Args:
+        task: tuple -> (frames of the segment, frame before the segment (None for the first segment),
+                        index of the first frame, total moves, output format, output path, delay, last delay)
+    Return:
+        tuple -> (path of the part file or None, global palette as bytes)
+    """
+    frames, before, first_index, total_moves, output_format, output, delay, last_delay = task
+    if output_format != 'gif':
+        for offset, frame in enumerate(frames):
+            pygame.image.save(draw_frame(frame, total_moves),
+                              os.path.join(output, f"frame_{first_index + offset:06}.{output_format}"))
+        return None, worker_palette.tobytes()
+
+    # the last frame of the previous segment is drawn again -> the first frame only stores its changes
+    previous = None if before is None else palette_indexes(draw_frame(before, total_moves))
+    part_path = f"{output}.part{first_index:06}"
+    with open(part_path, 'wb') as f:
+        for offset, frame in enumerate(frames):
+            indexes = palette_indexes(draw_frame(frame, total_moves))
+            frame_delay = last_delay if offset == len(frames) - 1 and last_delay else delay
+            f.write(gif_frame(indexes, previous, frame_delay))
+            previous = indexes
+    return part_path, worker_palette.tobytes()
+
+
+# endregion WORKER
+
+# region EXPORT
+
+def gif_header(size, palette):
+    """
+    Header of a looping GIF with a global palette of 256 colors
+    Args:
+        size: tuple -> width and height in pixels
+        palette: bytes -> 256 RGB entries
+    Return:
+        bytes -> header, global palette and loop extension
+    """
+    screen = b'GIF89a' + struct.pack('<HHBBB', size[0], size[1], 0xF7, 0, 0)
+    loop = b'!\xff\x0bNETSCAPE2.0\x03\x01\x00\x00\x00'
+    return screen + palette + loop
+
+
+def export_replay(path, output, output_format='gif', theme='classic', size=default_size, fps=default_fps,
+                  workers=None):
+    """
+    Export a recorded game as an animated GIF or an image sequence
+    Args:
+        path: str -> path of the recording file
+        output: str -> GIF file or directory of the image sequence
+        output_format: str -> gif or an image format (png, bmp, ...)
+        theme: str -> theme of the frames
+        size: tuple -> size of the frames in pixels
+        fps: float -> frames (moves) per second
+        workers: int -> number of worker processes (None -> all cores)
+    Return:
+        int -> number of exported frames
+    """
+    if output_format == 'gif' and Image is None:
+        raise RuntimeError("GIF export needs Pillow (pip install pillow), image sequences work without it")
+    record = load_record(path)
+    frames = replay_frames(record)
+    total_moves = frames[-1][2]
+    delay = max(2, round(100 / fps))
+    tasks = []
+    for start in range(0, len(frames), segment_frames):
+        before = frames[start - 1] if start else None
+        last_delay = hold_time // 10 if start + segment_frames >= len(frames) else 0
+        tasks.append((frames[start:start + segment_frames], before, start, total_moves, output_format, output,
+                      delay, last_delay))
+
+    if output_format != 'gif':
+        os.makedirs(output, exist_ok=True)
+    directory = os.path.dirname(output)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    with multiprocessing.Pool(workers, initializer=init_worker, initargs=(theme, tuple(size), record.variant)) as pool:
+        if output_format != 'gif':
+            for _ in pool.imap(export_segment, tasks):
+                pass
+            return len(frames)
+
+        # the parts come back in order -> each one is appended and deleted while the next ones are encoded
+        with open(output, 'wb') as f:
+            for index, (part_path, palette) in enumerate(pool.imap(export_segment, tasks)):
+                if index == 0:
+                    f.write(gif_header(size, palette))
+                with open(part_path, 'rb') as part:
+                    shutil.copyfileobj(part, f)
+                os.remove(part_path)
+            f.write(b';')
+    return len(frames)
+
+
+# endregion EXPORT
+
+# region MAIN
+
+def main():
+    """
+    Parse the command line options and export the recording
+    """
+    parser = argparse.ArgumentParser(description="Export a recorded 2048 game as a GIF or an image sequence")
+    parser.add_argument('recording', help="recording file")
+    parser.add_argument('--output', default=None,
+                        help="GIF file or directory of the image sequence (default: in assets/exports)")
+    parser.add_argument('--format', choices=export_formats, default='gif', help="output format")
+    parser.add_argument('--theme', choices=['basic', 'dark', 'classic', 'retro'], default='classic',
+                        help="theme of the frames")
+    parser.add_argument('--size', type=int, nargs=2, default=default_size, metavar=('WIDTH', 'HEIGHT'),
+                        help="size of the frames in pixels")
+    parser.add_argument('--fps', type=float, default=default_fps, help="moves per second of the animation")
+    parser.add_argument('--workers', type=int, default=None, help="worker processes (default: all cores)")
+    args = parser.parse_args()
+    if args.output is None:
+        name = os.path.splitext(os.path.basename(args.recording))[0]
+        args.output = os.path.join(exports_directory, name + ('.gif' if args.format == 'gif' else ''))
+
+    start = time.perf_counter()
+    try:
+        count = export_replay(args.recording, args.output, args.format, args.theme, args.size, args.fps,
+                              args.workers)
+    except RuntimeError as error:
+        parser.error(str(error))
+    elapsed = time.perf_counter() - start
+    print(f"frames: {count}, time: {elapsed:.2f} s, frames per second: {count / max(elapsed, 1e-9):.0f}")
+    print(f"saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
+
+# endregion MAIN
@@ -0,0 +1,260 @@
+import random  # for random piece spawning
+from array import array  # for the preallocated board buffer
+from functools import lru_cache  # for the memoized line kernel
+
+"""
+---------------------------------------------------------------------
+    Flat in-place board of the 2048 game
+---------------------------------------------------------------------
+    - The board is one preallocated array('B') of 16 exponents (row by row, 0 -> empty, 1 -> 2, 2 -> 4, ...)
+    - Moves change the buffer in place, nothing is copied and no row or column lists are built
+    - Lines are merged by a memoized kernel which also returns which tiles moved and merged
+    - Every move returns a MoveRecord with exactly what happened: moved tiles, merges, score and the old
+      exponents of the changed cells -> undo, animation, rendering and network deltas use the record
+      instead of copying and diffing whole boards
+    - Same rules and the same random numbers as spawn_piece and the move functions in game_logic.py
+---------------------------------------------------------------------
+"""
+
+# region VARIABLES
+"""
+Variables of the flat board
+    - move_lines: dict -> direction -> the 4 lines of cell indexes, every line starts at the side the tiles move to
+    - line_cache_size: int -> maximum number of lines kept in the line kernel cache
+"""
+move_lines = {
+    "UP": [(col, col + 4, col + 8, col + 12) for col in range(4)],
+    "DOWN": [(col + 12, col + 8, col + 4, col) for col in range(4)],
+    "LEFT": [(4 * row, 4 * row + 1, 4 * row + 2, 4 * row + 3) for row in range(4)],
+    "RIGHT": [(4 * row + 3, 4 * row + 2, 4 * row + 1, 4 * row) for row in range(4)]
+}
+line_cache_size = 65536
+
+
+# endregion VARIABLES
+
+# region LINE KERNEL
+
+@lru_cache(maxsize=line_cache_size)
+def merge_exponents(line):
+    """
+    Move and merge one line of exponents towards its start, same rules as merge_row in game_logic.py
+    Args:
+        line: tuple -> the 4 exponents of the line
+    Return:
+        merged_line: tuple -> exponents after the move
+        gain: int -> score of the merges
+        line_moves: tuple -> (from index, to index) of every tile which changed its place, empty if nothing moved
+        line_merges: tuple -> indexes where two tiles merged
+        changed_indexes: tuple -> indexes whose exponent changed
+    """
+    merged_line = [0, 0, 0, 0]
+    gain = 0
+    line_moves = []
+    line_merges = []
+    target = 0  # index of the next free place of the line
+    mergeable = False  # the tile before the target can still merge
+    for index in range(4):
+        exponent = line[index]
+        if not exponent:
+            continue
+        if mergeable and merged_line[target - 1] == exponent:
+            merged_line[target - 1] = exponent + 1
+            line_moves.append((index, target - 1))
+            line_merges.append(target - 1)
+            gain += 2 << exponent
+            mergeable = False
+        else:
+            merged_line[target] = exponent
+            if index != target:
+                line_moves.append((index, target))
+            target += 1
+            mergeable = True
+    changed_indexes = tuple(index for index in range(4) if merged_line[index] != line[index])
+    return tuple(merged_line), gain, tuple(line_moves), tuple(line_merges), changed_indexes
+
+
+# endregion LINE KERNEL
+
+# region MOVE RECORD
+
+class MoveRecord:
+    """
+    Everything one move (and the spawn after it) changed on the board
+    The move only stores the changed lines, the cells of the moves and merges are resolved when asked for
+    Args:
+        move_direction: str -> direction of the move
+    """
+    __slots__ = ("move_direction", "lines", "score", "spawn_cell")
+
+    def __init__(self, move_direction):
+        self.move_direction = move_direction
+        self.lines = []  # (cells of the line, old exponents, result of merge_exponents) of every changed line
+        self.score = 0  # score of the merges
+        self.spawn_cell = None  # cell of the piece spawned after the move
+
+    @property
+    def changed(self):
+        """
+        True if the move changed the board
+        """
+        return bool(self.lines)
+
+    @property
+    def moves(self):
+        """
+        (from cell, to cell) of every tile which changed its cell, merged tiles included
+        """
+        return [(line[start], line[end]) for line, _, result in self.lines for start, end in result[2]]
+
+    @property
+    def merges(self):
+        """
+        Cells where two tiles merged
+        """
+        return [line[index] for line, _, result in self.lines for index in result[3]]
+
+    @property
+    def previous(self):
+        """
+        (cell, old exponent) of every cell changed by the move and the spawn
+        """
+        previous = [(line[index], old[index]) for line, old, result in self.lines for index in result[4]]
+        if self.spawn_cell is not None and self.spawn_cell not in [cell for cell, _ in previous]:
+            previous.append((self.spawn_cell, 0))
+        return previous
+
+    def changed_cells(self):
+        """
+        Cells changed by the move and the spawn
+        Return:
+            list -> indexes of the changed cells
+        """
+        return [cell for cell, _ in self.previous]
+
+
+# endregion MOVE RECORD
+
+# region FLAT BOARD
+
+class FlatBoard:
+    """
+    Board stored as a flat buffer of exponents which is changed in place
+    Args:
+        board_values: list -> values of the board as used by the game (None -> empty board)
+    """
+
+    def __init__(self, board_values=None):
+        self.cells = array('B', bytes(16))
+        if board_values is not None:
+            self.load_values(board_values)
+
+    def clear(self):
+        """
+        Empty all cells
+        """
+        cells = self.cells
+        for cell in range(16):
+            cells[cell] = 0
+
+    def load_values(self, board_values):
+        """
+        Copy a board of values (list of lists) into the buffer
+        Args:
+            board_values: list -> values of the board
+        """
+        cells = self.cells
+        for row in range(4):
+            for col in range(4):
+                value = board_values[row][col]
+                cells[4 * row + col] = value.bit_length() - 1 if value else 0
+
+    def to_values(self):
+        """
+        Convert the buffer to the list of lists of values used by the game
+        Return:
+            list -> values of the board
+        """
+        cells = self.cells
+        return [[1 << cells[cell] if cells[cell] else 0 for cell in range(row * 4, row * 4 + 4)]
+                for row in range(4)]
+
+    def move(self, move_direction):
+        """
+        Move and merge the tiles in place
+        Args:
+            move_direction: str -> direction of the move (UP, DOWN, LEFT, RIGHT)
+        Return:
+            MoveRecord -> changes of the move, record.changed is False if nothing moved
+        """
+        cells = self.cells
+        record = MoveRecord(move_direction)
+        lines = record.lines
+        score = 0
+        for line in move_lines[move_direction]:
+            first, second, third, fourth = line
+            old = (cells[first], cells[second], cells[third], cells[fourth])
+            result = merge_exponents(old)
+            changed_indexes = result[4]
+            if not changed_indexes:
+                continue  # nothing moved in the line
+            merged_line = result[0]
+            for index in changed_indexes:
+                cells[line[index]] = merged_line[index]
+            lines.append((line, old, result))
+            score += result[1]
+        record.score = score
+        return record
+
+    def undo(self, record):
+        """
+        Undo a move and the spawn after it
+        Args:
+            record: MoveRecord -> record returned by the move, the move must be the last change of the board
+        """
+        cells = self.cells
+        if record.spawn_cell is not None:
+            cells[record.spawn_cell] = 0
+        for line, old, _ in record.lines:
+            for cell, exponent in zip(line, old):
+                cells[cell] = exponent
+
+    def spawn(self, rng=random, record=None):
+        """
+        Spawn a new piece, same rules and the same random numbers as spawn_piece in game_logic.py
+        Args:
+            rng: random.Random -> random generator used for the spawn
+            record: MoveRecord -> record of the move before the spawn, the spawn is added to it (None -> not recorded)
+        Return:
+            int -> cell of the new piece, None if the board is full
+        """
+        cells = self.cells
+        if 0 not in cells:
+            return None
+        while True:
+            cell = 4 * rng.randint(0, 3) + rng.randint(0, 3)
+            if cells[cell] == 0:
+                # one in ten chance of getting a 4
+                cells[cell] = 2 if rng.randint(1, 10) == 1 else 1
+                if record is not None:
+                    record.spawn_cell = cell
+                return cell
+
+    def can_move(self):
+        """
+        Check if any move is possible (an empty cell or two same neighbours)
+        Return:
+            bool -> True if the board can be moved in any direction
+        """
+        cells = self.cells
+        if 0 in cells:
+            return True
+        for cell in range(16):
+            if cell % 4 < 3 and cells[cell] == cells[cell + 1]:
+                return True
+            if cell < 12 and cells[cell] == cells[cell + 4]:
+                return True
+        return False
+
+
+# endregion FLAT BOARD
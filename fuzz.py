@@ -0,0 +1,462 @@
+import argparse  # for the command line options
+import multiprocessing  # for fuzzing on all cores
+import random  # for the random boards and the spawn seeds
+import time  # for the cases per second
+from bitboard import directions, pack_board, unpack_board, move_board, can_move
+from flat_board import FlatBoard
+from game_logic import spawn_piece, can_move_check, move_up, move_down, move_left, move_right
+from variants import ClassicRules
+
+"""
+---------------------------------------------------------------------
+    Differential fuzzing of the move engines
+---------------------------------------------------------------------
+    - The functions of game_logic.py (move_up, ..., spawn_piece, can_move_check) are the reference,
+      every optimized engine has to give exactly the same boards, scores and game over checks
+    - Engines: flat (FlatBoard of flat_board.py), bitboard (packed boards of bitboard.py, also the row tables
+      of ai.py, rl_env.py and ntuple.py) and variants (classic row table of variants.py)
+    - Every board is moved in all four directions, full boards are checked for a possible move and
+      every engine with the random numbers of spawn_piece spawns with the same seed as the reference
+    - Boards come from a 64 bit random number read as 16 nibbles (or 4 rows), the generator decides what a nibble means:
+      any tile, full boards, small tiles (many merges), tiles past 2048 and rows of merge chains like 2-2-4-8
+    - A mismatch is shrunk before it is reported -> tiles are removed or made smaller while the mismatch stays
+    - The cases are split into chunks which run in a process pool, a seed makes every run repeatable
+    - python fuzz.py benchmark measures the engines against the reference on the fuzzed boards and
+      fails like the fuzzer when an engine does not match
+
+Usage: python fuzz.py run --cases 10000000
+       python fuzz.py benchmark
+---------------------------------------------------------------------
+"""
+
+# region VARIABLES
+"""
+Variables of the fuzzer
+    - reference_moves: dict -> direction -> move function of game_logic.py
+    - nibble_values: dict -> generator -> value of every nibble of the random number
+    - chain_rows: list -> edge case rows, chains of merges and tiles past 2048
+    - chunk_cases: int -> cases of one pool task
+    - max_reports: int -> mismatches kept per engine and check
+    - reference_engine: ReferenceEngine -> engine of game_logic.py
+    - engine_classes: dict -> name -> class of every optimized engine
+    - worker_engines: list -> engines of the worker process
+"""
+reference_moves = {
+    "UP": move_up,
+    "DOWN": move_down,
+    "LEFT": move_left,
+    "RIGHT": move_right
+}
+nibble_values = {
+    "any": tuple([0] + [2 ** exponent for exponent in range(1, 16)]),
+    "full": tuple(2 ** exponent for exponent in range(1, 17)),
+    "small": (0, 0, 0, 0, 2, 2, 2, 4, 4, 4, 8, 8, 16, 32, 64, 128),
+    "high": (0, 0, 2, 4, 1024, 2048, 2048, 4096, 4096, 8192, 16384, 32768, 65536, 131072, 262144, 524288)
+}
+chain_rows = [
+    (2, 2, 4, 8), (8, 4, 2, 2), (2, 2, 2, 2), (4, 4, 8, 8), (2, 4, 8, 16), (2, 2, 4, 4), (2, 0, 2, 4),
+    (0, 2, 2, 4), (2, 2, 0, 4), (4, 0, 0, 4), (0, 0, 0, 2), (0, 0, 0, 0), (16, 8, 8, 16), (4, 2, 2, 0),
+    (1024, 1024, 2048, 4096), (2048, 2048, 2048, 2048), (4096, 4096, 8192, 0), (8192, 8192, 16384, 16384),
+    (16384, 16384, 32768, 65536), (65536, 65536, 0, 131072), (2, 4, 2, 4), (32768, 32768, 32768, 2)
+]
+chunk_cases = 20000
+max_reports = 3
+
+worker_engines = None
+
+
+# endregion VARIABLES
+
+# region ENGINES
+
+class ReferenceEngine:
+    """
+    The rules of game_logic.py, every other engine is compared with them
+    """
+    name = 'reference'
+    max_tile = None  # largest tile the engine holds without changing the rules (None -> no limit)
+    spawns = True  # True if the engine spawns with the random numbers of spawn_piece
+
+    def move(self, board, move_direction):
+        """
+        Move a copy of the board
+        Args:
+            board: list -> values of the board (not changed)
+            move_direction: str -> direction of the move
+        Return:
+            tuple -> (values of the board after the move, score of the merges)
+        """
+        return reference_moves[move_direction]([row[:] for row in board], 0)
+
+    def can_move(self, board):
+        """
+        Check if a full board can still be moved (the game over check of spawn_piece)
+        Args:
+            board: list -> values of a board without empty cells
+        Return:
+            bool -> True if a move is possible
+        """
+        return can_move_check(board)
+
+    def spawn(self, board, rng):
+        """
+        Spawn a piece on a copy of the board
+        Args:
+            board: list -> values of the board (not changed)
+            rng: random.Random -> random generator of the spawn
+        Return:
+            tuple -> (values of the board after the spawn, True if the game is over)
+        """
+        return spawn_piece([row[:] for row in board], rng)
+
+
+class FlatEngine(ReferenceEngine):
+    """
+    FlatBoard of flat_board.py, one buffer reused for every case
+    """
+    name = 'flat'
+    max_tile = 2 ** 254
+
+    def __init__(self):
+        self.board = FlatBoard()
+
+    def move(self, board, move_direction):
+        self.board.load_values(board)
+        record = self.board.move(move_direction)
+        return self.board.to_values(), record.score
+
+    def can_move(self, board):
+        self.board.load_values(board)
+        return self.board.can_move()
+
+    def spawn(self, board, rng):
+        self.board.load_values(board)
+        cell = self.board.spawn(rng)
+        return self.board.to_values(), cell is None and not self.board.can_move()
+
+
+class BitboardEngine(ReferenceEngine):
+    """
+    Packed boards of bitboard.py, exponents stop at 15 -> only boards up to 16384 merge like the reference
+    """
+    name = 'bitboard'
+    max_tile = 16384
+    spawns = False
+
+    def move(self, board, move_direction):
+        moved, move_score = move_board(pack_board(board), move_direction)
+        return unpack_board(moved), move_score
+
+    def can_move(self, board):
+        return can_move(pack_board(board))
+
+
+class VariantEngine(ReferenceEngine):
+    """
+    Classic row table of variants.py, its spawns use other random numbers than spawn_piece
+    """
+    name = 'variants'
+    spawns = False
+
+    def __init__(self):
+        self.rules = ClassicRules()
+        self.rules.compile()
+
+    def move(self, board, move_direction):
+        return self.rules.move([row[:] for row in board], move_direction, 0)
+
+    def can_move(self, board):
+        return self.rules.can_move(board)
+
+
+reference_engine = ReferenceEngine()
+engine_classes = {engine.name: engine for engine in (FlatEngine, BitboardEngine, VariantEngine)}
+
+
+# endregion ENGINES
+
+# region BOARD GENERATORS
+
+def random_board(rng):
+    """
+    Generate a random board of one of the generators
+    Args:
+        rng: random.Random -> random generator
+    Return:
+        list -> values of the board
+    """
+    bits = rng.getrandbits(67)
+    generator = bits & 7
+    bits >>= 3
+    if generator < 2:
+        # rows of the edge cases, transposed half of the time -> the chains are checked in the columns too
+        board = [list(chain_rows[((bits >> (16 * row)) & 0xFFFF) % len(chain_rows)]) for row in range(4)]
+        if generator:
+            board = [list(column) for column in zip(*board)]
+        return board
+    values = nibble_values[("any", "any", "full", "small", "small", "high")[generator - 2]]
+    return [[values[(bits >> (16 * row + 4 * col)) & 0xF] for col in range(4)] for row in range(4)]
+
+
+def board_max(board):
+    """
+    Get the highest tile of a board
+    Args:
+        board: list -> values of the board
+    Return:
+        int -> highest tile
+    """
+    return max(max(row) for row in board)
+
+
+# endregion BOARD GENERATORS
+
+# region CHECKS
+
+def check_case(engine, check, board, argument, reference=None):
+    """
+    Compare one engine with the reference on one board
+    Args:
+        engine: ReferenceEngine -> engine to check
+        check: str -> move, can_move or spawn
+        board: list -> values of the board
+        argument: str or int -> direction of the move or seed of the spawn
+        reference: tuple -> result of the reference if it is known already (None -> computed)
+    Return:
+        tuple -> (result of the reference, result of the engine), None if they match or the check does not apply
+    """
+    if engine.max_tile is not None and board_max(board) > engine.max_tile:
+        return None
+    if check == 'move':
+        expected = reference or reference_engine.move(board, argument)
+        result = engine.move(board, argument)
+    elif check == 'can_move':
+        if any(0 in row for row in board):
+            return None  # the reference only checks full boards
+        expected = reference_engine.can_move(board) if reference is None else reference
+        result = engine.can_move(board)
+    else:
+        if not engine.spawns:
+            return None
+        expected = reference or reference_engine.spawn(board, random.Random(argument))
+        result = engine.spawn(board, random.Random(argument))
+    return None if result == expected else (expected, result)
+
+
+def shrink(engine, check, board, argument):
+    """
+    Shrink a mismatching board -> tiles are removed or made smaller as long as the engine still does not match
+    Args:
+        engine: ReferenceEngine -> engine which does not match
+        check: str -> move, can_move or spawn
+        board: list -> values of the mismatching board
+        argument: str or int -> direction of the move or seed of the spawn
+    Return:
+        list -> smallest mismatching board found
+    """
+    board = [row[:] for row in board]
+    shrunk = True
+    while shrunk:
+        shrunk = False
+        for row in range(4):
+            for col in range(4):
+                value = board[row][col]
+                # removing the tile first, then the smallest tile, then half of it
+                for smaller in (0, 2, value // 2):
+                    if smaller >= value or smaller == 1:
+                        continue
+                    board[row][col] = smaller
+                    if check_case(engine, check, board, argument) is not None:
+                        shrunk = True
+                        break
+                    board[row][col] = value
+    return board
+
+
+def fuzz_cases(engines, seed, cases):
+    """
+    Fuzz the engines with random boards, each board is a case for every direction, the can move check and a spawn
+    Args:
+        engines: list -> engines to check
+        seed: int -> seed of the boards
+        cases: int -> number of boards
+    Return:
+        checked: int -> number of engine results compared with the reference
+        mismatches: list -> dict of every mismatch (engine, check, argument, board, shrunk, expected, result)
+    """
+    rng = random.Random(seed)
+    checked = 0
+    mismatches = []
+    reported = {}
+    for _ in range(cases):
+        board = random_board(rng)
+        board_top = board_max(board)
+        full = not any(0 in row for row in board)
+        spawn_seed = rng.getrandbits(32)
+        tasks = [('move', move_direction, reference_engine.move(board, move_direction))
+                 for move_direction in directions]
+        if full:
+            tasks.append(('can_move', None, reference_engine.can_move(board)))
+        tasks.append(('spawn', spawn_seed, reference_engine.spawn(board, random.Random(spawn_seed))))
+
+        for engine in engines:
+            if engine.max_tile is not None and board_top > engine.max_tile:
+                continue
+            for check, argument, expected in tasks:
+                if check == 'spawn' and not engine.spawns:
+                    continue
+                checked += 1
+                if check == 'move':
+                    result = engine.move(board, argument)
+                elif check == 'can_move':
+                    result = engine.can_move(board)
+                else:
+                    result = engine.spawn(board, random.Random(argument))
+                if result == expected:
+                    continue
+                key = (engine.name, check)
+                reported[key] = reported.get(key, 0) + 1
+                if reported[key] > max_reports:
+                    continue
+                shrunk = shrink(engine, check, board, argument)
+                if any((other["engine"], other["check"], other["argument"], other["shrunk"])
+                       == (engine.name, check, argument, shrunk) for other in mismatches):
+                    continue  # the same counterexample as an earlier board
+                expected, result = check_case(engine, check, shrunk, argument)
+                mismatches.append({
+                    "engine": engine.name, "check": check, "argument": argument, "board": board,
+                    "shrunk": shrunk, "expected": expected, "result": result
+                })
+    return checked, mismatches
+
+
+# endregion CHECKS
+
+# region PARALLEL FUZZING
+
+def init_worker(engine_names):
+    """
+    Initialize a worker process -> create its engines (the row tables are built once per worker)
+    Args:
+        engine_names: list -> names of the engines to check
+    """
+    global worker_engines
+    worker_engines = [engine_classes[name]() for name in engine_names]
+
+
+def fuzz_task(task):
+    """
+    Pool wrapper of fuzz_cases
+    Args:
+        task: tuple -> (seed, cases)
+    Return:
+        tuple -> (cases, checked, mismatches)
+    """
+    seed, cases = task
+    checked, mismatches = fuzz_cases(worker_engines, seed, cases)
+    return cases, checked, mismatches
+
+
+def fuzz(engine_names, cases, seed=0, workers=None):
+    """
+    Fuzz the engines in a process pool
+    Args:
+        engine_names: list -> names of the engines to check
+        cases: int -> number of boards
+        seed: int -> seed of the run, every chunk gets its own seed derived from it
+        workers: int -> number of worker processes (None -> all cores)
+    Return:
+        checked: int -> number of engine results compared with the reference
+        mismatches: list -> mismatches of all chunks, max_reports per engine and check
+    """
+    tasks = [(seed * 1000003 + index, min(chunk_cases, cases - start))
+             for index, start in enumerate(range(0, cases, chunk_cases))]
+    checked = 0
+    mismatches = []
+    with multiprocessing.Pool(workers, initializer=init_worker, initargs=(engine_names,)) as pool:
+        for _, task_checked, task_mismatches in pool.imap_unordered(fuzz_task, tasks):
+            checked += task_checked
+            for mismatch in task_mismatches:
+                same = [other for other in mismatches
+                        if (other["engine"], other["check"]) == (mismatch["engine"], mismatch["check"])]
+                if len(same) < max_reports and all(other["shrunk"] != mismatch["shrunk"] for other in same):
+                    mismatches.append(mismatch)
+    return checked, mismatches
+
+
+# endregion PARALLEL FUZZING
+
+# region MAIN
+
+def print_mismatches(mismatches):
+    """
+    Print the shrunk counterexamples
+    Args:
+        mismatches: list -> mismatches returned by fuzz
+    """
+    for mismatch in mismatches:
+        print(f"MISMATCH {mismatch['engine']} {mismatch['check']} {mismatch['argument']}")
+        print(f"    board:     {mismatch['board']}")
+        print(f"    shrunk:    {mismatch['shrunk']}")
+        print(f"    reference: {mismatch['expected']}")
+        print(f"    engine:    {mismatch['result']}")
+
+
+def benchmark(engine_names, boards, seed):
+    """
+    Time every engine against the reference on fuzzed boards, the boards are checked first
+    Args:
+        engine_names: list -> names of the engines
+        boards: int -> number of boards moved in all four directions
+        seed: int -> seed of the boards
+    Return:
+        list -> mismatches of the engines
+    """
+    engines = [engine_classes[name]() for name in engine_names]
+    checked, mismatches = fuzz_cases(engines, seed, boards)
+    rng = random.Random(seed)
+    board_list = [random_board(rng) for _ in range(boards)]
+    print(f"checked {checked} results of {boards} boards, mismatches: {len(mismatches)}")
+    for engine in [reference_engine] + engines:
+        engine_boards = [board for board in board_list
+                         if engine.max_tile is None or board_max(board) <= engine.max_tile]
+        start = time.perf_counter()
+        for board in engine_boards:
+            for move_direction in directions:
+                engine.move(board, move_direction)
+        elapsed = time.perf_counter() - start
+        print(f"{engine.name}: {elapsed / max(len(engine_boards) * 4, 1) * 1e6:.2f} µs per move "
+              f"(conversions included)")
+    return mismatches
+
+
+def main():
+    """
+    Parse the command line options and fuzz or benchmark the engines
+    """
+    parser = argparse.ArgumentParser(description="Differential fuzzing of the 2048 move engines")
+    parser.add_argument('command', choices=['run', 'benchmark'], help="fuzz the engines or time them")
+    parser.add_argument('--cases', type=int, default=1000000, help="random boards (each one is moved 4 times)")
+    parser.add_argument('--engines', nargs='+', choices=list(engine_classes), default=list(engine_classes),
+                        help="engines compared with game_logic.py")
+    parser.add_argument('--seed', type=int, default=0, help="seed of the boards")
+    parser.add_argument('--workers', type=int, default=None, help="worker processes (default: all cores)")
+    args = parser.parse_args()
+
+    if args.command == 'benchmark':
+        mismatches = benchmark(args.engines, min(args.cases, 20000), args.seed)
+    else:
+        start = time.perf_counter()
+        checked, mismatches = fuzz(args.engines, args.cases, args.seed, args.workers)
+        elapsed = time.perf_counter() - start
+        print(f"boards: {args.cases}, checked results: {checked}, mismatches: {len(mismatches)}")
+        print(f"time: {elapsed:.2f} s, checked results per minute: {checked / max(elapsed, 1e-9) * 60:.0f}")
+    print_mismatches(mismatches)
+    if mismatches:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
+
+# endregion MAIN
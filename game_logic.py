@@ -0,0 +1,341 @@
+import random  # for random piece spawning
+from collections import deque  # for queued player moves
+from functools import lru_cache  # for the memoized merge kernel
+
+"""
+---------------------------------------------------------------------
+    Game logic of the 2048 game without any Pygame dependency
+---------------------------------------------------------------------
+    - Spawning of new pieces and the game over check
+    - Moving and merging of the tiles in all four directions, all of them share one memoized merge kernel
+    - PlayerState keeps the state of one player, so more boards can be played in one process
+    - Nothing in here opens a window or loads sounds -> safe to import from tools and servers
+---------------------------------------------------------------------
+"""
+
+# region MERGE KERNEL
+"""
+Variables of the game logic
+    - merge_cache_size: int -> maximum number of rows kept in the merge cache
+    - undo_cooldown: int -> moves after an undo before the next undo is available
+"""
+merge_cache_size = 65536
+undo_cooldown = 10
+
+
+@lru_cache(maxsize=merge_cache_size)
+def merge_row(line):
+    """
+    Move and merge one line of tiles towards its start, shared by all four move functions
+    Results are memoized -> a game only ever sees a few thousand distinct lines
+    Args:
+        line: tuple -> values of the line, the first value is the side the tiles move to
+    Return:
+        merged_line: tuple -> values of the line after the move
+        gain: int -> score of the merges
+        changed: bool -> True if the move changed the line
+    """
+    # Compact the line
+    tiles = [tile for tile in line if tile != 0]
+    # Merge tiles
+    merged_line = []
+    gain = 0
+    skip = False
+    for i in range(len(tiles)):
+        if skip:
+            skip = False
+            continue
+        if i + 1 < len(tiles) and tiles[i] == tiles[i + 1]:
+            merged_line.append(tiles[i] * 2)
+            gain += tiles[i] * 2
+            skip = True
+        else:
+            merged_line.append(tiles[i])
+    # Fill the remaining spaces with zeros
+    merged_line += [0] * (len(line) - len(merged_line))
+    merged_line = tuple(merged_line)
+    return merged_line, gain, merged_line != line
+
+
+def merge_cache_stats():
+    """
+    Statistics of the merge cache
+    Return:
+        dict -> hits, misses, size, max_size and hit_rate of the cache
+    """
+    info = merge_row.cache_info()
+    lookups = info.hits + info.misses
+    return {
+        "hits": info.hits,
+        "misses": info.misses,
+        "size": info.currsize,
+        "max_size": info.maxsize,
+        "hit_rate": info.hits / lookups if lookups else 0.0
+    }
+
+
+def clear_merge_cache():
+    """
+    Empty the merge cache and reset its statistics
+    """
+    merge_row.cache_clear()
+
+
+# endregion MERGE KERNEL
+
+# region GAME LOGIC FUNCTIONS
+
+def spawn_piece(board, rng=random):
+    """
+    Spawn a new piece on the board per function call and checks if the game is over
+    Args:
+        board: list -> values of the board
+        rng: random.Random -> random generator used for the spawn (module random by default)
+    """
+    # only one new piece per function call
+    count = 0
+    # spawn a new piece on the board randomly
+    while any(0 in row for row in board) and count < 1:
+        row = rng.randint(0, 3)
+        col = rng.randint(0, 3)
+        if board[row][col] == 0:
+            count += 1
+            # one in ten chance of getting a 4
+            if rng.randint(1, 10) == 1:
+                board[row][col] = 4
+            else:
+                board[row][col] = 2
+
+    if count == 0 and not can_move_check(board):
+        return board, True  # game over
+
+    return board, False  # game not over
+
+
+def can_move_check(board):
+    """
+    Check if the board can be moved in any direction (up, down, left, right) by checking if there are any same adjacent
+    For determining if the game is over
+    Args:
+        board: list -> values of the board
+    Return:
+        bool -> True if the board can be moved in any direction, False otherwise
+    """
+    size = len(board)
+    for i in range(size):
+        for j in range(size):
+            if i < size - 1 and board[i][j] == board[i + 1][j]:
+                return True  # Check vertical moves
+            if j < size - 1 and board[i][j] == board[i][j + 1]:
+                return True  # Check horizontal moves
+    return False
+
+
+def move_up(board, global_score):
+    """
+    Move the board up and merge the tiles + update the score
+    Args:
+        board: list -> values of the board
+        global_score: int -> score of the game
+    Return:
+        board: list -> updated values of the board after move UP
+        global_score: int -> updated score of the game
+    """
+    size = len(board)
+    for col in range(size):
+        merged_col, gain, changed = merge_row(tuple([board[row][col] for row in range(size)]))
+        if changed:
+            # Place back into the board
+            for row in range(size):
+                board[row][col] = merged_col[row]
+            global_score += gain
+    return board, global_score
+
+
+def move_down(board, global_score):
+    """
+        Move the board down and merge the tiles + update the score
+        Args:
+            board: list -> values of the board
+            global_score: int -> score of the game
+        Return:
+            board: list -> updated values of the board after move DOWN
+            global_score: int -> updated score of the game
+    """
+    size = len(board)
+    for col in range(size):
+        # Merge the column in reverse (bottom to top)
+        merged_col, gain, changed = merge_row(tuple([board[row][col] for row in range(size - 1, -1, -1)]))
+        if changed:
+            for row in range(size):
+                board[size - 1 - row][col] = merged_col[row]
+            global_score += gain
+    return board, global_score
+
+
+def move_left(board, global_score):
+    """
+        Move the board left and merge the tiles + update the score
+        Args:
+            board: list -> values of the board
+            global_score: int -> score of the game
+        Return:
+            board: list -> updated values of the board after move LEFT
+            global_score: int -> updated score of the game
+    """
+    for row in range(len(board)):
+        merged_row, gain, changed = merge_row(tuple(board[row]))
+        if changed:
+            board[row] = list(merged_row)
+            global_score += gain
+    return board, global_score
+
+
+def move_right(board, global_score):
+    """
+        Move the board right and merge the tiles + update the score
+        Args:
+            board: list -> values of the board
+            global_score: int -> score of the game
+        Return:
+            board: list -> updated values of the board after move RIGHT
+            global_score: int -> updated score of the game
+    """
+    for row in range(len(board)):
+        # Merge the row in reverse (right to left)
+        merged_row, gain, changed = merge_row(tuple(board[row][::-1]))
+        if changed:
+            board[row] = list(merged_row[::-1])
+            global_score += gain
+    return board, global_score
+
+
+def save_undo_state(board, previous_states, cooldown_counter):
+    """
+    Undo rule of a move -> save the board before the move if undo is available, otherwise count the cooldown down
+    Shared by PlayerState and the classic and timed modes of main.py
+    Args:
+        board: list -> values of the board before the move
+        previous_states: list -> previous states of the board, the board is appended to it
+        cooldown_counter: int -> cooldown counter of the undo
+    Return:
+        int -> new cooldown counter
+    """
+    if cooldown_counter == 0:
+        previous_states.append([row[:] for row in board])
+        return cooldown_counter
+    return max(0, cooldown_counter - 1)
+
+
+def undo_move(board, previous_states, cooldown_counter):
+    """
+    Return one move back by popping the last state from the previous states, only if the cooldown is over
+    Shared by PlayerState and the classic and timed modes of main.py
+    Args:
+        board: list -> values of the board
+        previous_states: list -> previous states of the board, the last one is popped
+        cooldown_counter: int -> cooldown counter of the undo
+    Return:
+        board: list -> board after the undo (the same board if nothing was undone)
+        cooldown_counter: int -> new cooldown counter
+        undone: bool -> True if the move is undone
+    """
+    if previous_states and cooldown_counter == 0:
+        return previous_states.pop(), undo_cooldown, True
+    return board, cooldown_counter, False
+
+
+# endregion GAME LOGIC FUNCTIONS
+
+# region PLAYER STATE
+
+class PlayerState:
+    """
+    State of one player -> board, score, undo cooldown, undo history and spawn RNG
+    Every player has its own random generator, so the spawns of one board never influence the other one
+    Args:
+        seed: int -> seed of the spawn random generator (None -> random seed)
+    """
+
+    def __init__(self, seed=None):
+        self.rng = random.Random(seed)
+        self.pending_moves = deque()
+        self.rules = None  # rule variant of variants.py, None -> classic rules
+        self.reset()
+
+    def reset(self):
+        """
+        Restart the game of the player -> resets game values
+        """
+        self.board_values = [[0 for _ in range(4)] for _ in range(4)]
+        self.score = 0
+        self.cooldown_counter = undo_cooldown
+        self.previous_states = []
+        self.spawn_new = True
+        self.init_pieces_count = 0
+        self.game_over = False
+        self.pending_moves.clear()
+
+    def queue_move(self, move_direction):
+        """
+        Queue a move of the player, it is applied on the next update -> no key press is lost
+        Args:
+            move_direction: str -> direction of the move (UP, DOWN, LEFT, RIGHT)
+        """
+        if not self.game_over:
+            self.pending_moves.append(move_direction)
+
+    def move(self, move_direction):
+        """
+        Move the board of the player in the given direction, same rules as move_board in main.py
+        Args:
+            move_direction: str -> direction of the move
+        """
+        # Save the previous state of the board if return is available
+        self.cooldown_counter = save_undo_state(self.board_values, self.previous_states, self.cooldown_counter)
+
+        if self.rules is not None:
+            self.board_values, self.score = self.rules.move(self.board_values, move_direction, self.score)
+        elif move_direction == "UP":
+            self.board_values, self.score = move_up(self.board_values, self.score)
+        elif move_direction == "DOWN":
+            self.board_values, self.score = move_down(self.board_values, self.score)
+        elif move_direction == "LEFT":
+            self.board_values, self.score = move_left(self.board_values, self.score)
+        elif move_direction == "RIGHT":
+            self.board_values, self.score = move_right(self.board_values, self.score)
+        self.spawn_new = True
+
+    def return_one_move(self):
+        """
+        Return one move back by popping the last state from the previous_states list
+        Return:
+            bool -> True if the move is undone, False otherwise
+        """
+        self.board_values, self.cooldown_counter, undone = undo_move(self.board_values, self.previous_states,
+                                                                     self.cooldown_counter)
+        return undone
+
+    def update(self):
+        """
+        One frame of the player's game -> spawns the pending piece and applies at most one queued move
+        Return:
+            str -> direction of the applied move, empty string if no move was applied
+        """
+        if self.spawn_new or self.init_pieces_count < 2:
+            self.board_values, self.game_over = spawn_piece(self.board_values, self.rng)
+            self.spawn_new = False
+            self.init_pieces_count += 1
+
+        if self.game_over:
+            self.pending_moves.clear()
+            return ''
+
+        if self.pending_moves:
+            move_direction = self.pending_moves.popleft()
+            self.move(move_direction)
+            return move_direction
+        return ''
+
+
+# endregion PLAYER STATE
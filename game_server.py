@@ -0,0 +1,480 @@
+import asyncio  # for serving many sessions in one thread
+import argparse  # for the command line options
+import struct  # for the compact binary messages
+import random  # for the spawn random generator of the sessions
+import threading  # for running the client next to the pygame loop
+from flat_board import FlatBoard
+
+"""
+---------------------------------------------------------------------
+    Authoritative 2048 game server using asyncio
+---------------------------------------------------------------------
+    - The server runs the game logic (moves and spawns) of every session, clients only send moves
+    - Sessions keep their board as a FlatBoard, the move record gives the changed cells of the delta
+    - A player connection creates a new session, spectators join an existing session by its id
+    - Moves are sent as single bytes, the server answers with compact board deltas to everybody in the session
+    - Slow connections never stall a session: when their send queue is full, deltas are dropped
+      and the connection gets one full snapshot as soon as it catches up (backpressure)
+    - GameClient and ThreadedGameClient are the client side, used by main.py and load_test.py
+
+Protocol (all integers are big-endian)
+    - client -> server hello: role (1 byte, P = player, S = spectator) + session id (4 bytes, ignored for players)
+    - server -> client welcome: session id (4 bytes), then a full snapshot
+    - client -> server moves: 1 byte each -> 0 = UP, 1 = DOWN, 2 = LEFT, 3 = RIGHT, 4 = restart
+    - server -> client snapshot: F + move number (4) + score (4) + game over (1) + 16 exponents (1 each)
+    - server -> client delta: D + move number (4) + score (4) + game over (1) + change count (1)
+      + change count * (cell index (1) + exponent (1))
+    - exponent 0 is an empty cell, otherwise the value of the piece is 2 ** exponent
+---------------------------------------------------------------------
+"""
+
+# region VARIABLES
+"""
+Variables used by the server and the clients
+    - move_directions: tuple -> direction of every move byte (index = byte)
+    - restart_byte: int -> move byte which restarts the game of the session
+    - role_player: bytes -> hello role of a player
+    - role_spectator: bytes -> hello role of a spectator
+    - hello_message: struct.Struct -> hello of the client
+    - welcome_message: struct.Struct -> welcome of the server
+    - snapshot_message: struct.Struct -> full board of the session
+    - delta_header: struct.Struct -> header of a board delta, changes follow it
+    - send_queue_size: int -> messages waiting for one connection before deltas are dropped
+"""
+move_directions = ("UP", "DOWN", "LEFT", "RIGHT")
+restart_byte = 4
+
+role_player = b'P'
+role_spectator = b'S'
+
+hello_message = struct.Struct('!cI')
+welcome_message = struct.Struct('!I')
+snapshot_message = struct.Struct('!cIIB16B')
+delta_header = struct.Struct('!cIIBB')
+
+send_queue_size = 64
+
+
+# endregion VARIABLES
+
+# region BOARD ENCODING
+
+def exponent_to_value(exponent):
+    """
+    Convert the exponent of a piece back to its value
+    Args:
+        exponent: int -> exponent of the piece (0 for an empty cell)
+    Return:
+        int -> value of the piece
+    """
+    return 1 << exponent if exponent else 0
+
+
+# endregion BOARD ENCODING
+
+# region SERVER
+
+class Connection:
+    """
+    One client connection with its own bounded send queue
+    Args:
+        writer: asyncio.StreamWriter -> writer of the connection
+        queue_size: int -> number of messages waiting before deltas are dropped
+    """
+
+    def __init__(self, writer, queue_size=send_queue_size):
+        self.writer = writer
+        self.queue = asyncio.Queue(queue_size)
+        self.needs_snapshot = False
+        self.dropped_messages = 0
+
+    def send(self, message):
+        """
+        Queue a message without waiting, a full queue drops the message and requests a snapshot instead
+        Args:
+            message: bytes -> encoded message
+        """
+        if self.needs_snapshot:
+            self.dropped_messages += 1
+            return
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            self.needs_snapshot = True
+            self.dropped_messages += 1
+
+    def close(self):
+        """
+        Stop the sender of the connection after the already queued messages
+        """
+        self.needs_snapshot = False
+        while self.queue.full():
+            self.queue.get_nowait()
+        self.queue.put_nowait(None)
+
+    async def sender(self, session):
+        """
+        Write the queued messages to the socket, the only place which waits for a slow client
+        Args:
+            session: GameSession -> session of the connection, used for the resync snapshot
+        """
+        try:
+            while True:
+                message = await self.queue.get()
+                if message is None:
+                    break
+                self.writer.write(message)
+                if self.needs_snapshot and self.queue.empty():
+                    # the client caught up -> replace all dropped deltas with one snapshot
+                    self.needs_snapshot = False
+                    self.writer.write(session.snapshot())
+                await self.writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            self.writer.close()
+
+
+class GameSession:
+    """
+    One game played on the server -> board state, the player and the spectators
+    Args:
+        session_id: int -> id of the session
+        seed: int -> seed of the spawn random generator (None -> random seed)
+    """
+
+    def __init__(self, session_id, seed=None):
+        self.session_id = session_id
+        self.board = FlatBoard()
+        self.rng = random.Random(seed)
+        self.score = 0
+        self.game_over = False
+        self.move_number = 0
+        self.player_connection = None
+        self.spectators = set()
+        self.restart()
+
+    def restart(self):
+        """
+        Restart the game of the session with the two initial pieces
+        """
+        self.board.clear()
+        for _ in range(2):
+            self.board.spawn(self.rng)
+        self.score = 0
+        self.game_over = False
+        self.move_number += 1
+
+    def snapshot(self):
+        """
+        Encode the full state of the session
+        Return:
+            bytes -> snapshot message
+        """
+        return snapshot_message.pack(b'F', self.move_number, self.score, self.game_over, *self.board.cells)
+
+    def apply_move(self, move_byte):
+        """
+        Apply one move of the player and spawn the next piece, same rules as the classic mode
+        Args:
+            move_byte: int -> move byte sent by the player
+        Return:
+            bytes -> delta message for the player and the spectators, None for an ignored move
+        """
+        if move_byte == restart_byte:
+            self.restart()
+            return self.snapshot()
+        if move_byte >= len(move_directions) or self.game_over:
+            return None
+
+        # the board is changed in place, the move record tells which cells changed
+        board = self.board
+        record = board.move(move_directions[move_byte])
+        if board.spawn(self.rng, record) is None:
+            self.game_over = not board.can_move()
+        self.score += record.score
+        self.move_number += 1
+
+        changes = []
+        for cell in record.changed_cells():
+            changes += (cell, board.cells[cell])
+        return delta_header.pack(b'D', self.move_number, self.score, self.game_over,
+                                 len(changes) // 2) + bytes(changes)
+
+    def broadcast(self, message):
+        """
+        Send a message to the player and all spectators of the session
+        Args:
+            message: bytes -> encoded message
+        """
+        if self.player_connection is not None:
+            self.player_connection.send(message)
+        for spectator in self.spectators:
+            spectator.send(message)
+
+
+class GameServer:
+    """
+    Server holding all sessions, every session is played by one player connection
+    Args:
+        queue_size: int -> send queue size of every connection
+    """
+
+    def __init__(self, queue_size=send_queue_size):
+        self.queue_size = queue_size
+        self.sessions = {}
+        self.next_session_id = 1
+        self.moves_applied = 0
+        self.server = None
+
+    async def start(self, host='127.0.0.1', port=2048):
+        """
+        Start listening for clients
+        Args:
+            host: str -> address to listen on
+            port: int -> port to listen on (0 -> any free port)
+        Return:
+            int -> port the server listens on
+        """
+        self.server = await asyncio.start_server(self.handle_client, host, port, backlog=4096)
+        return self.server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        """
+        Stop listening and close all connections
+        """
+        self.server.close()
+        for session in list(self.sessions.values()):
+            if session.player_connection is not None:
+                session.player_connection.close()
+            for spectator in session.spectators:
+                spectator.close()
+        await self.server.wait_closed()
+
+    async def handle_client(self, reader, writer):
+        """
+        Handle one client connection from the hello until it disconnects
+        Args:
+            reader: asyncio.StreamReader -> reader of the connection
+            writer: asyncio.StreamWriter -> writer of the connection
+        """
+        try:
+            role, session_id = hello_message.unpack(await reader.readexactly(hello_message.size))
+        except (asyncio.IncompleteReadError, ConnectionError):
+            writer.close()
+            return
+
+        if role == role_player:
+            session = GameSession(self.next_session_id)
+            self.next_session_id += 1
+            self.sessions[session.session_id] = session
+        elif role == role_spectator and session_id in self.sessions:
+            session = self.sessions[session_id]
+        else:
+            writer.close()
+            return
+
+        connection = Connection(writer, self.queue_size)
+        connection.send(welcome_message.pack(session.session_id) + session.snapshot())
+        sender_task = asyncio.create_task(connection.sender(session))
+
+        try:
+            if role == role_player:
+                session.player_connection = connection
+                await self.read_moves(reader, session)
+            else:
+                session.spectators.add(connection)
+                # spectators only listen, wait until they disconnect
+                while await reader.read(256):
+                    pass
+        except ConnectionError:
+            pass
+        finally:
+            if role == role_player:
+                self.sessions.pop(session.session_id, None)
+                session.player_connection = None
+                for spectator in session.spectators:
+                    spectator.close()
+            else:
+                session.spectators.discard(connection)
+            connection.close()
+            await sender_task
+
+    async def read_moves(self, reader, session):
+        """
+        Read the move bytes of a player, moves which arrived together are applied in one go
+        Args:
+            reader: asyncio.StreamReader -> reader of the player connection
+            session: GameSession -> session of the player
+        """
+        while True:
+            data = await reader.read(256)
+            if not data:
+                return
+            for move_byte in data:
+                message = session.apply_move(move_byte)
+                if message is not None:
+                    self.moves_applied += 1
+                    session.broadcast(message)
+
+
+# endregion SERVER
+
+# region CLIENT
+
+class GameClient:
+    """
+    Asyncio client of the game server, keeps a local copy of the session board
+    """
+
+    def __init__(self):
+        self.reader = None
+        self.writer = None
+        self.session_id = 0
+        self.move_number = 0
+        self.board_values = [[0 for _ in range(4)] for _ in range(4)]
+        self.score = 0
+        self.game_over = False
+
+    async def connect(self, host='127.0.0.1', port=2048, spectate_session=None):
+        """
+        Connect to the server as a player (new session) or as a spectator of an existing session
+        Args:
+            host: str -> address of the server
+            port: int -> port of the server
+            spectate_session: int -> id of the session to watch (None -> play a new session)
+        """
+        self.reader, self.writer = await asyncio.open_connection(host, port)
+        if spectate_session is None:
+            self.writer.write(hello_message.pack(role_player, 0))
+        else:
+            self.writer.write(hello_message.pack(role_spectator, spectate_session))
+        self.session_id, = welcome_message.unpack(await self.reader.readexactly(welcome_message.size))
+        await self.receive()
+
+    def send_move(self, move_direction):
+        """
+        Send one move to the server without waiting for the answer
+        Args:
+            move_direction: str -> direction of the move (UP, DOWN, LEFT, RIGHT) or RESTART
+        """
+        if move_direction == "RESTART":
+            self.writer.write(bytes((restart_byte,)))
+        else:
+            self.writer.write(bytes((move_directions.index(move_direction),)))
+
+    async def receive(self):
+        """
+        Wait for the next snapshot or delta and apply it to the local board
+        Return:
+            int -> move number of the received message
+        """
+        header = await self.reader.readexactly(1)
+        if header == b'F':
+            data = await self.reader.readexactly(snapshot_message.size - 1)
+            _, self.move_number, self.score, game_over, *exponents = snapshot_message.unpack(header + data)
+            self.board_values = [[exponent_to_value(exponents[row * 4 + col]) for col in range(4)]
+                                 for row in range(4)]
+        else:
+            data = await self.reader.readexactly(delta_header.size - 1)
+            _, self.move_number, self.score, game_over, change_count = delta_header.unpack(header + data)
+            changes = await self.reader.readexactly(change_count * 2)
+            # build a new board -> a reader in another thread never sees a half applied delta
+            board_values = [row[:] for row in self.board_values]
+            for i in range(0, len(changes), 2):
+                board_values[changes[i] // 4][changes[i] % 4] = exponent_to_value(changes[i + 1])
+            self.board_values = board_values
+        self.game_over = bool(game_over)
+        return self.move_number
+
+    async def close(self):
+        """
+        Close the connection to the server
+        """
+        self.writer.close()
+        try:
+            await self.writer.wait_closed()
+        except ConnectionError:
+            pass
+
+
+class ThreadedGameClient:
+    """
+    GameClient running its own event loop in a background thread, so the pygame loop never waits for the network
+    Args:
+        host: str -> address of the server
+        port: int -> port of the server
+        spectate_session: int -> id of the session to watch (None -> play a new session)
+    """
+
+    def __init__(self, host='127.0.0.1', port=2048, spectate_session=None):
+        self.client = GameClient()
+        self.connected = False
+        self.error = None
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.run, args=(host, port, spectate_session), daemon=True)
+        self.thread.start()
+
+    def run(self, host, port, spectate_session):
+        """
+        Body of the background thread -> connect and keep applying the server messages
+        """
+        asyncio.set_event_loop(self.loop)
+        try:
+            self.loop.run_until_complete(self.client.connect(host, port, spectate_session))
+            self.connected = True
+            while True:
+                self.loop.run_until_complete(self.client.receive())
+        except (OSError, asyncio.IncompleteReadError) as error:
+            self.error = error
+        finally:
+            self.connected = False
+
+    def send_move(self, move_direction):
+        """
+        Send a move from any thread
+        Args:
+            move_direction: str -> direction of the move (UP, DOWN, LEFT, RIGHT) or RESTART
+        """
+        if self.connected:
+            self.loop.call_soon_threadsafe(self.client.send_move, move_direction)
+
+    def close(self):
+        """
+        Close the connection from any thread
+        """
+        if self.connected:
+            self.loop.call_soon_threadsafe(self.client.writer.close)
+
+
+# endregion CLIENT
+
+# region MAIN
+
+def main():
+    """
+    Run the game server until it is interrupted
+    """
+    parser = argparse.ArgumentParser(description="2048 game server")
+    parser.add_argument('--host', default='127.0.0.1', help="address to listen on")
+    parser.add_argument('--port', type=int, default=2048, help="port to listen on")
+    parser.add_argument('--queue-size', type=int, default=send_queue_size,
+                        help="messages waiting for one client before deltas are dropped")
+    args = parser.parse_args()
+
+    async def serve():
+        game_server = GameServer(args.queue_size)
+        port = await game_server.start(args.host, args.port)
+        print(f"2048 server listening on {args.host}:{port}")
+        await game_server.server.serve_forever()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
+
+# endregion MAIN
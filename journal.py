@@ -0,0 +1,236 @@
+import json  # for the journal lines
+import os  # for the journal files and fsync
+import threading  # for writing the journal next to the game loop
+from collections import deque  # for the events waiting for the writer
+from game_logic import PlayerState
+from variants import rule_variants  # for replaying the games of other rule variants
+
+"""
+---------------------------------------------------------------------
+    Autosave journal of the classic game
+---------------------------------------------------------------------
+    - Every move, spawn and undo of the running classic game is appended to a journal file
+    - The game loop only appends the event to a queue, a background thread writes the queued events
+      in batches and makes them durable with one fsync per batch
+    - A snapshot (board, score, undo cooldown, spawn state) is written at the start of every game and the file
+      is rewritten to the snapshot alone, the snapshot never holds the undo history or the recording
+    - On start-up the snapshot is loaded and all events of the game are replayed with the game rules
+      -> the exact game is restored, the undo history and the recording are rebuilt by the replay
+    - A finished game is marked in the journal and is not restored
+    - A crash loses at most the events of the last unwritten batch, a torn last line is ignored
+
+Journal lines (NDJSON)
+    - ["snapshot", state] -> state at the start of the game: board_values, score, cooldown_counter,
+      init_pieces_count, spawn_new and record (mode, variant and initial board of the recording)
+    - ["move", direction], ["spawn", [[row, col, value], ...]], ["undo"], ["over"]
+---------------------------------------------------------------------
+"""
+
+# region VARIABLES
+"""
+Variables of the journal
+    - journals_directory: str -> directory of the journal files, one file per profile
+    - write_interval: float -> seconds between two batches of the writer
+"""
+journals_directory = 'assets/save_files/journals'
+write_interval = 0.25
+
+
+# endregion VARIABLES
+
+# region JOURNAL
+
+def journal_path(profile_name, directory=journals_directory):
+    """
+    Path of the journal of a profile, the name is hex encoded -> any profile name is a safe file name
+    Args:
+        profile_name: str -> name of the profile
+        directory: str -> directory of the journals
+    Return:
+        str -> path of the journal file
+    """
+    return os.path.join(directory, profile_name.encode().hex() + '.journal')
+
+
+class GameJournal:
+    """
+    Append-only journal written by a background thread
+    Args:
+        path: str -> path of the journal file
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.pending = deque()
+        self.active = False  # a game is journaled, events of other games are ignored
+        self.file = None
+        self.wake = threading.Event()
+        self.closing = False
+        self.thread = None
+
+    def snapshot(self, state):
+        """
+        Start journaling a game from its start state
+        Args:
+            state: dict -> copy of the game state, it must not be changed afterwards
+        """
+        self.pending.append(("snapshot", state))
+        self.active = True
+        self.start_writer()
+
+    def record(self, *event):
+        """
+        Append an event of the running game, only a queue append -> no I/O in the game loop
+        Args:
+            event: tuple -> event name and its values
+        """
+        if self.active:
+            self.pending.append(event)
+
+    def resume(self):
+        """
+        Continue journaling a game restored from this journal
+        """
+        self.active = True
+        self.start_writer()
+
+    def finish(self):
+        """
+        Mark the running game as finished, it will not be restored
+        """
+        if self.active:
+            self.pending.append(("over",))
+            self.active = False
+            self.wake.set()
+
+    def start_writer(self):
+        """
+        Start the background writer if it does not run yet
+        """
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.run, daemon=True)
+            self.thread.start()
+
+    def run(self):
+        """
+        Body of the writer thread -> write a batch every write_interval until closed
+        """
+        while not self.closing:
+            self.wake.wait(write_interval)
+            self.wake.clear()
+            self.write_pending()
+
+    def write_pending(self):
+        """
+        Write all queued events with one fsync, a snapshot in the batch rewrites the file from the snapshot
+        """
+        batch = []
+        while self.pending:
+            batch.append(self.pending.popleft())
+        if not batch:
+            return
+
+        snapshot_indexes = [index for index, event in enumerate(batch) if event[0] == "snapshot"]
+        lines = ''.join(json.dumps(event) + '\n' for event in batch[snapshot_indexes[-1] if snapshot_indexes else 0:])
+        if snapshot_indexes:
+            # everything before the snapshot is obsolete -> replace the file atomically
+            if self.file is not None:
+                self.file.close()
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            temporary_path = self.path + '.tmp'
+            with open(temporary_path, 'w') as f:
+                f.write(lines)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temporary_path, self.path)
+            self.file = open(self.path, 'a')
+        else:
+            if self.file is None:
+                self.file = open(self.path, 'a')
+            self.file.write(lines)
+            self.file.flush()
+            os.fsync(self.file.fileno())
+
+    def close(self):
+        """
+        Write the queued events and stop the writer
+        """
+        self.closing = True
+        self.wake.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        self.write_pending()
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+# endregion JOURNAL
+
+# region RECOVERY
+
+def load_journal(path):
+    """
+    Restore the game of a journal -> load the snapshot and replay the events of the game
+    Args:
+        path: str -> path of the journal file
+    Return:
+        dict -> restored state with the keys of a snapshot, None if there is no unfinished game
+    """
+    try:
+        with open(path, 'r') as f:
+            lines = f.readlines()
+    except FileNotFoundError:
+        return None
+
+    events = []
+    for line in lines:
+        try:
+            events.append(json.loads(line))
+        except json.JSONDecodeError:
+            break  # torn last line of a crash
+    snapshot_indexes = [index for index, event in enumerate(events) if event[0] == "snapshot"]
+    if not snapshot_indexes:
+        return None
+    state = events[snapshot_indexes[-1]][1]
+    events = events[snapshot_indexes[-1] + 1:]
+    if any(event[0] == "over" for event in events):
+        return None
+
+    # replay with the rules of PlayerState, the same undo rules as the classic mode
+    player = PlayerState()
+    variant = state["record"].get("variant", 'classic')
+    if variant != 'classic':
+        player.rules = rule_variants[variant]
+    player.board_values = state["board_values"]
+    player.score = state["score"]
+    player.cooldown_counter = state["cooldown_counter"]
+    # journals of older versions hold the undo history and the recording in their snapshots
+    player.previous_states = state.get("previous_states", [])
+    player.init_pieces_count = state["init_pieces_count"]
+    player.spawn_new = state["spawn_new"]
+    history = state["record"].setdefault("history", [])
+    for event in events:
+        if event[0] == "move":
+            player.move(event[1])
+            history.append(["move", event[1]])
+        elif event[0] == "spawn":
+            for row, col, value in event[1]:
+                player.board_values[row][col] = value
+                history.append(["spawn", row, col, value])
+            player.spawn_new = False
+            player.init_pieces_count += 1
+        elif event[0] == "undo":
+            player.return_one_move()
+            history.append(["undo"])
+
+    state.update(board_values=player.board_values, score=player.score, cooldown_counter=player.cooldown_counter,
+                 previous_states=player.previous_states, init_pieces_count=player.init_pieces_count,
+                 spawn_new=player.spawn_new)
+    return state
+
+
+# endregion RECOVERY
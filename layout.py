@@ -0,0 +1,164 @@
+import pygame
+from functools import lru_cache  # for one layout per resolution
+
+"""
+---------------------------------------------------------------------
+    Layout engine of the 2048 game
+---------------------------------------------------------------------
+    - The game is designed for a 400x500 window, all positions in main.py are given in these logical pixels
+    - A Layout maps the logical pixels to the pixels of the real window (any size, fullscreen, 4K)
+      -> everything is scaled by one factor and centred, the free space at the sides stays empty
+    - Boards side by side (versus mode) are columns of the layout, every column is one 400x500 panel
+    - Rectangles, points and fonts are computed once per layout and then only looked up,
+      the layout itself is built once per resolution -> nothing is recomputed while the window keeps its size
+    - Rendered texts are cached per layout, a text which does not change is rendered only once
+    - Fonts are shared by all layouts -> going back to a resolution never loads a font again
+---------------------------------------------------------------------
+"""
+
+# region VARIABLES
+"""
+Variables of the layout engine
+    - base_width: int -> logical width of one panel
+    - base_height: int -> logical height of one panel
+    - font_name: str -> system font of all texts
+    - text_cache_size: int -> rendered texts kept per layout before the cache is emptied
+    - fonts: dict -> loaded fonts by their pixel size
+"""
+base_width = 400
+base_height = 500
+font_name = 'Arial'
+text_cache_size = 512
+
+fonts = {}
+
+
+# endregion VARIABLES
+
+# region LAYOUT
+
+class Layout:
+    """
+    Logical to screen mapping of one resolution
+    Args:
+        width: int -> width of the window in pixels
+        height: int -> height of the window in pixels
+        columns: int -> number of panels side by side
+    """
+
+    def __init__(self, width, height, columns=1):
+        self.size = (width, height)
+        self.columns = columns
+        self.scale = min(width / (base_width * columns), height / base_height)
+        self.origin = ((width - round(base_width * columns * self.scale)) // 2,
+                       (height - round(base_height * self.scale)) // 2)
+        self.points = {}
+        self.rects = {}
+        self.texts = {}
+
+    def length(self, value):
+        """
+        Scale a logical length (border width, radius, padding), a non-zero length stays at least 1 pixel
+        Args:
+            value: int -> logical length
+        Return:
+            int -> length in pixels
+        """
+        if value == 0:
+            return 0
+        return max(1, round(value * self.scale))
+
+    def point(self, x, y):
+        """
+        Screen position of a logical point
+        Args:
+            x: int -> logical x (the second column starts at base_width)
+            y: int -> logical y
+        Return:
+            tuple -> (x, y) in pixels
+        """
+        position = self.points.get((x, y))
+        if position is None:
+            position = (self.origin[0] + round(x * self.scale), self.origin[1] + round(y * self.scale))
+            self.points[(x, y)] = position
+        return position
+
+    def rect(self, x, y, width, height):
+        """
+        Screen rectangle of a logical rectangle, the corners are rounded to pixels -> neighbours never overlap
+        Args:
+            x: int -> logical left
+            y: int -> logical top
+            width: int -> logical width
+            height: int -> logical height
+        Return:
+            pygame.Rect -> rectangle in pixels (a copy, it can be moved or inflated)
+        """
+        rect = self.rects.get((x, y, width, height))
+        if rect is None:
+            left, top = self.point(x, y)
+            right, bottom = self.point(x + width, y + height)
+            rect = pygame.Rect(left, top, right - left, bottom - top)
+            self.rects[(x, y, width, height)] = rect
+        return rect.copy()
+
+    def font(self, size):
+        """
+        Font of a logical size
+        Args:
+            size: int -> logical font size
+        Return:
+            pygame.font.Font -> font scaled to the layout
+        """
+        return get_font(self.length(size))
+
+    def render(self, text, color, size=24):
+        """
+        Render a text with the scaled font, the surface is cached for the next frames
+        Args:
+            text: str -> text to render
+            color: tuple -> color of the text
+            size: int -> logical font size
+        Return:
+            pygame.Surface -> rendered text
+        """
+        key = (text, color, size)
+        surface = self.texts.get(key)
+        if surface is None:
+            if len(self.texts) >= text_cache_size:
+                self.texts.clear()
+            surface = self.font(size).render(text, True, color)
+            self.texts[key] = surface
+        return surface
+
+
+def get_font(pixel_size):
+    """
+    Font of a pixel size, every size is loaded only once
+    Args:
+        pixel_size: int -> size of the font in pixels
+    Return:
+        pygame.font.Font -> loaded font
+    """
+    font = fonts.get(pixel_size)
+    if font is None:
+        font = pygame.font.SysFont(font_name, pixel_size)
+        fonts[pixel_size] = font
+    return font
+
+
+@lru_cache(maxsize=8)
+def get_layout(width, height, columns=1):
+    """
+    Layout of a resolution, built only the first time the resolution is used
+    Args:
+        width: int -> width of the window in pixels
+        height: int -> height of the window in pixels
+        columns: int -> number of panels side by side
+    Return:
+        Layout -> layout of the resolution
+    """
+    return Layout(width, height, columns)
+
+
+# endregion LAYOUT
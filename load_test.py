@@ -0,0 +1,156 @@
+import asyncio  # for simulating many clients in one process
+import argparse  # for the command line options
+import random  # for the random moves of the simulated players
+import time  # for measuring the move latency
+from game_server import GameServer, GameClient, move_directions
+
+"""
+---------------------------------------------------------------------
+    Load test of the 2048 game server on localhost
+---------------------------------------------------------------------
+    - Starts a server in this process (or uses a running one with --port)
+    - Simulates thousands of players, every player sends a move and waits for the answer
+    - Optional spectators watch every session to test the delta broadcast and backpressure
+    - Reports the moves per second and the per-move latency percentiles
+---------------------------------------------------------------------
+"""
+
+
+# region LOAD TEST
+
+def percentile(sorted_values, fraction):
+    """
+    Get a percentile of already sorted values (nearest rank)
+    Args:
+        sorted_values: list -> sorted measured values
+        fraction: float -> percentile as a fraction (0.99 -> p99)
+    Return:
+        float -> value of the percentile
+    """
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(fraction * len(sorted_values)))
+    return sorted_values[index]
+
+
+async def simulate_player(host, port, moves, spectators, latencies, rng):
+    """
+    One simulated player -> connects, plays random moves and measures the time until each answer arrives
+    Args:
+        host: str -> address of the server
+        port: int -> port of the server
+        moves: int -> number of moves to play
+        spectators: int -> number of spectators watching the session
+        latencies: list -> measured latencies in seconds are appended here
+        rng: random.Random -> random generator of the moves
+    """
+    client = GameClient()
+    await client.connect(host, port)
+
+    watchers = []
+    for _ in range(spectators):
+        watcher = GameClient()
+        await watcher.connect(host, port, client.session_id)
+        watchers.append(watcher)
+    watcher_tasks = [asyncio.create_task(watch_session(watcher)) for watcher in watchers]
+
+    for _ in range(moves):
+        if client.game_over:
+            client.send_move("RESTART")
+            await client.receive()
+        expected_move_number = client.move_number + 1
+        start = time.perf_counter()
+        client.send_move(rng.choice(move_directions))
+        while await client.receive() < expected_move_number:
+            pass
+        latencies.append(time.perf_counter() - start)
+
+    await client.close()
+    await asyncio.gather(*watcher_tasks)
+
+
+async def watch_session(watcher):
+    """
+    One simulated spectator -> applies the deltas until the session ends
+    Args:
+        watcher: GameClient -> connected spectator client
+    """
+    try:
+        while True:
+            await watcher.receive()
+    except (asyncio.IncompleteReadError, ConnectionError):
+        pass
+    await watcher.close()
+
+
+async def run_load_test(clients, moves, spectators, host, port, seed):
+    """
+    Run the load test and print the results
+    Args:
+        clients: int -> number of simulated players
+        moves: int -> moves per player
+        spectators: int -> spectators per session
+        host: str -> address of the server
+        port: int -> port of a running server (None -> start a server in this process)
+        seed: int -> seed of the random moves
+    """
+    game_server = None
+    if port is None:
+        game_server = GameServer()
+        port = await game_server.start(host, 0)
+
+    rng = random.Random(seed)
+    latencies = []
+    start = time.perf_counter()
+    await asyncio.gather(*(simulate_player(host, port, moves, spectators, latencies, random.Random(rng.random()))
+                           for _ in range(clients)))
+    elapsed = time.perf_counter() - start
+
+    if game_server is not None:
+        await game_server.stop()
+
+    latencies.sort()
+    print(f"clients: {clients}, spectators per session: {spectators}, moves: {len(latencies)}")
+    print(f"total time: {elapsed:.2f} s, moves per second: {len(latencies) / elapsed:.0f}")
+    for name, fraction in (("p50", 0.5), ("p90", 0.9), ("p99", 0.99), ("p99.9", 0.999), ("max", 1.0)):
+        print(f"{name} latency: {percentile(latencies, fraction) * 1000:.2f} ms")
+
+
+def raise_open_files_limit():
+    """
+    Raise the limit of open files to its maximum, every simulated client needs two sockets
+    """
+    try:
+        import resource  # not available on Windows
+    except ImportError:
+        return
+    soft_limit, hard_limit = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft_limit < hard_limit:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard_limit, hard_limit))
+
+
+# endregion LOAD TEST
+
+# region MAIN
+
+def main():
+    """
+    Parse the command line options and run the load test
+    """
+    parser = argparse.ArgumentParser(description="Load test of the 2048 game server")
+    parser.add_argument('--clients', type=int, default=1000, help="number of simulated players")
+    parser.add_argument('--moves', type=int, default=50, help="moves played by every player")
+    parser.add_argument('--spectators', type=int, default=1, help="spectators watching every session")
+    parser.add_argument('--host', default='127.0.0.1', help="address of the server")
+    parser.add_argument('--port', type=int, default=None, help="port of a running server (default: start one)")
+    parser.add_argument('--seed', type=int, default=2048, help="seed of the random moves")
+    args = parser.parse_args()
+
+    raise_open_files_limit()
+    asyncio.run(run_load_test(args.clients, args.moves, args.spectators, args.host, args.port, args.seed))
+
+
+if __name__ == "__main__":
+    main()
+
+# endregion MAIN
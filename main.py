@@ -1,20 +1,50 @@
 import pygame
 import random  # for random piece spawning
 import webbrowser  # for opening links in menu
-import json  # for reading the user data
+import argparse  # for the network client options
+import time  # for measuring the save duration
+from game_server import ThreadedGameClient
+from ai import HintEngine
+from recording import GameRecord
+from spawn_rules import spawn_rules
+from variants import rule_variants, blocker
+from ntuple import load_network
+from telemetry import Telemetry, FrameTimes, open_sink
+from profiles import ProfileStore, valid_profile_name, default_profiles_file
+from journal import GameJournal, journal_path, load_journal
+from layout import get_layout
+from renderer import SoftwareRenderer, create_renderer, renderer_names
+from audio import AudioManager, default_buffer
+from puzzle import PuzzleLibrary, default_puzzles_file, generate_puzzles, quick_presets
+from tablebase import find_tablebase
+from opening_book import find_opening_book
+from bitboard import move_board as move_packed_board, unpack_board, can_move, pack_board
+from game_logic import spawn_piece, PlayerState, save_undo_state, undo_move, undo_cooldown, merge_cache_stats
 
 """
 ---------------------------------------------------------------------   
     This is a 2048 game implementation using Pygame library
 ---------------------------------------------------------------------
-    - The game has two modes: Classic and Timed
+    - The game has five modes: Classic, Timed, Versus, AI and Puzzle
     - Classic mode: The player can play the game without any time limit
     - Timed mode: The player has a time limit of 3 minutes to play the game
+    - Versus mode: Two players play side by side on one keyboard (WASD vs arrows)
+    - AI mode: A trained n-tuple network plays the classic mode (train it with python ntuple.py train)
+    - Puzzle mode: Proven solvable positions with a goal and a move limit (python puzzle.py generate adds more)
+    - Network client: python main.py --connect HOST:PORT plays on a game_server.py server
     - The player can undo the last move with a cooldown of 10 moves
+    - The player can ask for a hint in the classic mode, the best move is searched in the background
+    - Every finished game is recorded into assets/recordings for the analysis tools
+    - Telemetry events: python main.py --telemetry events.ndjson (or udp://HOST:PORT for statsd)
     - The player can return to the main menu at any time
     - The game has a high score system for both modes
+    - Every player profile has its own saved game, settings and high scores, profiles are switched in the main menu
+    - A running classic game is journaled in the background and restored after quitting or a crash
+    - The window can be resized freely, F11 switches to fullscreen
+    - Optional texture renderer: python main.py --renderer texture (falls back to software without acceleration)
+    - Sounds play on reserved channels with a low latency mixer buffer: python main.py --audio-buffer 256
     - The game has a tutorial screen to explain the rules of the game
-    - The game has a settings menu to change the theme and sound settings
+    - The game has a settings menu to change the theme, sound and spawn rule settings
     - The game has four themes: Basic, Dark, Classic, and Retro
 
 Author: Julie Vondráčková
@@ -28,13 +58,16 @@ pygame.init()
 # region VARIABLES
 """
 Variables used in the game
-    - window_width: int -> width of the game window
-    - window_height: int -> height of the game window
+    - window_width: int -> logical width of the game window, all positions are given in logical pixels
+    - window_height: int -> logical height of the game window
+    - windowed_size: tuple -> size of one panel of the window when not in fullscreen
+    - fullscreen: bool -> the game runs in fullscreen
+    - renderer: SoftwareRenderer or TextureRenderer -> draws everything and shows the frames
+    - layout: Layout -> mapping of the logical pixels to the pixels of the window, rebuilt on resize
     
     - timer: pygame.time.Clock -> timer for the game
     - fps: int -> frames per second
     
-    - font: pygame.font.Font -> font for the game
     - colors: dict -> colors used in the game
     
     - board_rectangle_dimensions: list -> dimensions of the board rectangle
@@ -51,15 +84,23 @@ Variables used in the game
     - direction: str -> direction of the move
     
     - score: int -> score of the game
-    - high_score: int -> high score of the game
+    - high_score: int -> high score of the game (of the selected rule variant)
     - init_high_score: int -> initial high score
     - timed_score: int -> score of the timed game
     - timed_high_score: int -> high score of the timed game
     - init_time_high_score: int -> initial high score of the timed game
+    - variant_high_scores: dict -> rule variant -> [high score, timed high score] of the variants not selected
     
     - cooldown_counter: int -> cooldown counter for the undo button
     - previous_states: list -> previous states of the board
     
+    - tablebase: Tablebase -> mapped 4x4 endgame table used by the hint and the AI mode (None if not generated)
+    - opening_book: OpeningBook -> mapped opening book used by the hint and the AI mode (None if not built)
+    - hint_engine: HintEngine -> background search of the best move
+    - hint_visible: bool -> the hint for the current board is shown
+    
+    - game_record: GameRecord -> spawns, moves and undos of the current game
+    
     - run: bool -> run status of the game
     
     - start_time: int -> start time of the timed game
@@ -67,22 +108,51 @@ Variables used in the game
     - current_game_mode -> tracks the currently selected game mode
 
     - sound_enabled: bool -> sound status
-    - move_sound: pygame.mixer.Sound -> sound for the move
-    - mouse_click_sound: pygame.mixer.Sound -> sound for the mouse click
-    - reset_sound: pygame.mixer.Sound -> sound for the reset
+    - audio: AudioManager -> plays the move, click and reset sounds on reserved channels (opened by main)
     
     - themes: dict -> themes available in the game
     - current_theme: str -> current theme of the game
     
+    - current_spawn_rule: str -> name of the spawn rule (key of spawn_rules) used in the classic and timed modes
+    - current_variant: str -> name of the rule variant (key of rule_variants) used in the classic and timed modes
+    
+    - tile_surface_cache: dict -> pre-rendered tile surfaces by (theme, variant, value) for the current layout
+    
+    - versus_players: list -> PlayerState of both players in the versus mode
+    - versus_drawn_states: list -> what is drawn on the screen for each versus board (None -> redraw everything)
+    - drawn_frame: tuple -> state shown on the screen by the classic or timed mode (None -> redraw everything)
+    - versus_move_keys: dict -> key -> (player index, direction) for the versus mode
+    - versus_undo_keys: dict -> key -> player index for the undo in the versus mode
+    
+    - network_move_keys: dict -> key -> direction for the network client
+    
+    - ai_speeds: list -> moves per frame selectable in the AI mode
+    
+    - puzzles_file: str -> path of the puzzle library
+    - puzzle_library: PuzzleLibrary -> library of the generated puzzles (opened by the puzzle mode)
+    - puzzle_progress: int -> id of the last solved puzzle of the profile, None before the first one
+    - first_puzzle_count: int -> puzzles generated when the puzzle mode starts with an empty library
+    
+    - telemetry: Telemetry -> event stream of the game, started by the --telemetry option
+    - frame_times: FrameTimes -> frame time percentiles of the game loops and the merge cache statistics
+    
+    - json_save_file: str -> old single save file, imported as the default profile on the first start
+    - profiles_file: str -> path of the profile store
+    - profile_store: ProfileStore -> store of all profiles (opened by load_game_data)
+    - current_profile: str -> name of the selected profile
+    - profiles_per_page: int -> profiles listed on one page of the profile menu
+    - game_journal: GameJournal -> autosave journal of the classic game of the current profile
+    
 """
 window_width = 400
 window_height = 500
-screen = pygame.display.set_mode((window_width, window_height))
-pygame.display.set_caption("2048")
+windowed_size = (window_width, window_height)
+fullscreen = False
+renderer = SoftwareRenderer(windowed_size)
+layout = get_layout(window_width, window_height)
 
 timer = pygame.time.Clock()
 fps = 60
-font = pygame.font.SysFont('Arial', 24)
 
 # color library
 themes = {
@@ -167,6 +237,9 @@ themes = {
 colors = themes['classic']
 current_theme = 'classic'
 
+current_spawn_rule = 'classic'
+current_variant = 'classic'
+
 # board variables definitions
 board_rectangle_dimensions = [0, 0, 400, 400]
 board_border_width = 0
@@ -191,25 +264,80 @@ init_high_score = high_score
 
 # return buttons
 previous_states = []
-cooldown_counter = 10
+cooldown_counter = undo_cooldown
+
+# hint button
+tablebase = find_tablebase(4)
+opening_book = find_opening_book()
+hint_engine = HintEngine(depth=3, tablebase=tablebase, book=opening_book)
+hint_visible = False
+
+# recording of the current game
+game_record = GameRecord()
 
 # timed game variables
 start_time = pygame.time.get_ticks()
 timed_score = 0
 timed_high_score = 0
 init_time_high_score = timed_high_score
+variant_high_scores = {}
 
 run = False
 current_game_mode = None
+drawn_frame = None
+
+# versus game variables
+versus_players = [PlayerState(), PlayerState()]
+versus_drawn_states = [None, None]
+versus_move_keys = {
+    pygame.K_w: (0, "UP"),
+    pygame.K_s: (0, "DOWN"),
+    pygame.K_a: (0, "LEFT"),
+    pygame.K_d: (0, "RIGHT"),
+    pygame.K_UP: (1, "UP"),
+    pygame.K_DOWN: (1, "DOWN"),
+    pygame.K_LEFT: (1, "LEFT"),
+    pygame.K_RIGHT: (1, "RIGHT")
+}
+versus_undo_keys = {
+    pygame.K_q: 0,
+    pygame.K_BACKSPACE: 1
+}
+
+# network client variables
+network_move_keys = {
+    pygame.K_UP: "UP",
+    pygame.K_DOWN: "DOWN",
+    pygame.K_LEFT: "LEFT",
+    pygame.K_RIGHT: "RIGHT"
+}
+
+# AI mode variables
+ai_speeds = [1, 5, 25, 100]
+
+# puzzle mode variables
+puzzles_file = default_puzzles_file
+puzzle_library = None
+puzzle_progress = None
+first_puzzle_count = 6
+
+# telemetry variables
+telemetry = Telemetry()
+frame_times = FrameTimes(telemetry, cache_stats=merge_cache_stats)
+
+# cached rendering
+tile_surface_cache = {}
 
 # UI - sounds
-pygame.mixer.init()
-move_sound = pygame.mixer.Sound('assets/sounds/move.mp3')
-mouse_click_sound = pygame.mixer.Sound('assets/sounds/button_click.mp3')
-reset_sound = pygame.mixer.Sound('assets/sounds/reset.mp3')
+audio = AudioManager()
 sound_enabled = True
 
 json_save_file = 'assets/save_files/save.json'
+profiles_file = default_profiles_file
+profile_store = None
+current_profile = None
+profiles_per_page = 5
+game_journal = None
 
 
 # endregion VARIABLES
@@ -218,47 +346,155 @@ json_save_file = 'assets/save_files/save.json'
 
 def save_game_data():
     """
-    Save the game data including high scores to the save file
+    Save the game data including high scores to the current profile
     """
+    # high_score and timed_high_score stay the classic scores, the other variants are kept apart
+    scores = dict(variant_high_scores)
+    scores[current_variant] = [high_score, timed_high_score]
+    classic_high_score, classic_timed_high_score = scores.pop('classic', [0, 0])
     game_data = {
         "board_values": board_values,
         "score": score,
-        "high_score": high_score,
-        "timed_high_score": timed_high_score,
+        "high_score": classic_high_score,
+        "timed_high_score": classic_timed_high_score,
+        "variant_high_scores": scores,
         "sound_enabled": sound_enabled,
-        "current_theme": current_theme
+        "current_theme": current_theme,
+        "spawn_rule": current_spawn_rule,
+        "rule_variant": current_variant,
+        "puzzle_progress": puzzle_progress
     }
-    with open(json_save_file, 'w') as f:
-        json.dump(game_data, f, indent=4)
+    save_start = time.perf_counter()
+    profile_store.save(current_profile, game_data)
+    telemetry.emit("save", (time.perf_counter() - save_start) * 1000)
 
 
-def load_game_data():
-    """
-    Load the game data including high scores from the save file
+def load_game_data(profile_name=None):
     """
-    try:
-        with open(json_save_file, 'r') as f:
-            game_data = json.load(f)
-        global board_values, score, high_score, timed_high_score, sound_enabled, current_theme
-        board_values = game_data.get("board_values", [[0] * 4 for _ in range(4)])
-        score = game_data.get("score", 0)
-        high_score = game_data.get("high_score", 0)
-        timed_high_score = game_data.get("timed_high_score", 0)
-        sound_enabled = game_data.get("sound_enabled", True)
-        current_theme = game_data.get("current_theme", 'classic')
-        apply_theme(current_theme)
-    except FileNotFoundError:
-        # Initialize with default values if file is not found
-        board_values = [[0 for _ in range(4)] for _ in range(4)]
-        score = 0
-        high_score = 0
-        timed_high_score = 0
-        sound_enabled = True
-        current_theme = 'classic'
-        apply_theme(current_theme)
+    Load the game data including high scores from a profile, only this profile is read from the store
+    Args:
+        profile_name: str -> name of the profile (None -> the last selected profile)
+    """
+    global board_values, score, high_score, timed_high_score, sound_enabled, current_theme, current_spawn_rule, \
+        current_variant, variant_high_scores, puzzle_progress, profile_store, current_profile, game_journal
+
+    if profile_store is None:
+        profile_store = ProfileStore(profiles_file)
+        if profile_store.count() == 0:
+            # first start with profiles -> keep the data of the old save file
+            profile_store.import_save_file(json_save_file)
+    if profile_name is None:
+        profile_name = profile_store.current()
+
+    current_profile = profile_name
+    game_data = profile_store.select(profile_name)
+    board_values = game_data.get("board_values", [[0 for _ in range(4)] for _ in range(4)])
+    score = game_data.get("score", 0)
+    variant_high_scores = {name: list(scores) for name, scores in game_data.get("variant_high_scores", {}).items()
+                           if name in rule_variants}
+    variant_high_scores['classic'] = [game_data.get("high_score", 0), game_data.get("timed_high_score", 0)]
+    current_variant = game_data.get("rule_variant", 'classic')
+    if current_variant not in rule_variants:
+        current_variant = 'classic'
+    high_score, timed_high_score = variant_high_scores.pop(current_variant, [0, 0])
+    rule_variants[current_variant].compile()
+    sound_enabled = game_data.get("sound_enabled", True)
+    current_theme = game_data.get("current_theme", 'classic')
+    current_spawn_rule = game_data.get("spawn_rule", 'classic')
+    if current_spawn_rule not in spawn_rules:
+        current_spawn_rule = 'classic'
+    puzzle_progress = game_data.get("puzzle_progress")
+    apply_theme(current_theme)
+    if not game_data:
+        # new profile -> store it with the default values
         save_game_data()
 
-    # endregion LOAD SAVE DATA
+    if game_journal is not None:
+        game_journal.close()
+    game_journal = GameJournal(journal_path(profile_name))
+
+
+def journal_state():
+    """
+    Copy the start state of the classic game for the journal snapshot, the undo history and the recording
+    are not copied -> the journal rebuilds them from the events of the game
+    Return:
+        dict -> board, score, undo cooldown, spawn state and the description of the recording
+    """
+    return {
+        "board_values": [row[:] for row in board_values],
+        "score": score,
+        "cooldown_counter": cooldown_counter,
+        "init_pieces_count": init_pieces_count,
+        "spawn_new": spawn_new,
+        "record": {
+            "mode": game_record.mode,
+            "variant": game_record.variant,
+            "initial_board": game_record.initial_board
+        }
+    }
+
+
+def restore_journal_game():
+    """
+    Restore the unfinished classic game of the current profile from its journal
+    Return:
+        bool -> True if a game was restored, choosing the classic mode continues it
+    """
+    global board_values, score, cooldown_counter, previous_states, init_pieces_count, spawn_new, game_record, \
+        direction, game_over, hint_visible, current_game_mode
+
+    state = load_journal(game_journal.path)
+    if state is None or state["record"].get("variant", 'classic') != current_variant:
+        return False
+
+    board_values = state["board_values"]
+    score = state["score"]
+    cooldown_counter = state["cooldown_counter"]
+    previous_states = state["previous_states"]
+    init_pieces_count = state["init_pieces_count"]
+    spawn_new = state["spawn_new"]
+    game_record = GameRecord(state["record"]["mode"], state["record"]["initial_board"], current_variant)
+    game_record.history = state["record"]["history"]
+    direction = ''
+    game_over = False
+    hint_visible = False
+    current_game_mode = 'classic'
+    game_journal.resume()
+    return True
+
+
+def switch_profile(profile_name):
+    """
+    Save the current profile and load another one, the next game starts fresh for the new profile
+    Args:
+        profile_name: str -> name of the profile (a new profile is created)
+    """
+    global current_game_mode
+
+    save_game_data()
+    load_game_data(profile_name)
+    current_game_mode = None
+    restore_journal_game()
+
+
+def select_variant(variant):
+    """
+    Select the rule variant of the classic and timed modes, every variant keeps its own high scores
+    The game of the old variant is ended -> the next classic or timed game starts fresh
+    Args:
+        variant: str -> name of the rule variant (key of rule_variants)
+    """
+    global current_variant, high_score, timed_high_score, current_game_mode
+
+    variant_high_scores[current_variant] = [high_score, timed_high_score]
+    current_variant = variant
+    high_score, timed_high_score = variant_high_scores.pop(variant, [0, 0])
+    # the row table is computed here, not on the first move of the game
+    rule_variants[variant].compile()
+    current_game_mode = None
+    reset_game_data()
+    telemetry.emit("variant_change", variant)
 
 
 # endregion LOAD SAVE DATA
@@ -267,12 +503,14 @@ def load_game_data():
 
 def play_sound(sound):
     """
-    Play a sound if the sound is enabled
+    Play a sound if the sound is enabled, the measured input to sound latency is sent to the telemetry
     Args:
-        sound: pygame.mixer.Sound -> sound to play
+        sound: str -> name of the sound (move, click or reset)
     """
     if sound_enabled:
-        pygame.mixer.Sound.play(sound)
+        latency = audio.play(sound)
+        if latency is not None:
+            telemetry.emit("sound_latency", sound, round(latency, 2))
 
 
 def apply_theme(theme):
@@ -284,6 +522,7 @@ def apply_theme(theme):
     global colors, themes, current_theme
     current_theme = theme
     colors = themes[theme]
+    telemetry.emit("theme_change", theme)
 
 
 def extend_theme_colors(color_themes):
@@ -319,11 +558,88 @@ def extend_theme_colors(color_themes):
             current_max_value = value
 
 
+def set_window(columns=1):
+    """
+    Open the window (or the fullscreen) for the given number of boards side by side
+    Args:
+        columns: int -> number of 400x500 panels (2 in the versus mode)
+    """
+    renderer.open((windowed_size[0] * columns, windowed_size[1]), fullscreen)
+    update_layout(columns)
+
+
+def set_renderer(name):
+    """
+    Switch to another renderer, the texture renderer falls back to the software one without acceleration
+    Args:
+        name: str -> name of the renderer (software or texture)
+    """
+    global renderer
+    renderer = create_renderer(name, (windowed_size[0] * layout.columns, windowed_size[1]), fullscreen, renderer)
+    update_layout(layout.columns)
+    telemetry.emit("renderer", renderer.name, *renderer.size)
+
+
+def update_layout(columns):
+    """
+    Switch to the layout of the current window size, the pieces are rendered again only if the size changed
+    Args:
+        columns: int -> number of boards side by side
+    """
+    global layout, drawn_frame
+    drawn_frame = None
+    new_layout = get_layout(*renderer.size, columns)
+    if new_layout.scale != layout.scale:
+        tile_surface_cache.clear()
+    layout = new_layout
+
+
+def handle_window_event(event):
+    """
+    Handle resizing the window and the fullscreen key (F11), called for every event of every screen
+    Args:
+        event: pygame.event -> event to check
+    Return:
+        bool -> True if the window changed and everything has to be drawn again
+    """
+    global windowed_size, fullscreen
+    if event.type == pygame.WINDOWSIZECHANGED:
+        if not fullscreen:
+            width, height = renderer.size
+            windowed_size = (max(width // layout.columns, 100), max(height, 125))
+        update_layout(layout.columns)
+        return True
+    if event.type == pygame.WINDOWEXPOSED:
+        # the window lost its content -> draw the next frame even if nothing changed
+        update_layout(layout.columns)
+        return True
+    if event.type == pygame.KEYDOWN and event.key == pygame.K_F11:
+        fullscreen = not fullscreen
+        set_window(layout.columns)
+        return True
+    return False
+
+
+def frame_changed(frame_state):
+    """
+    Check if the screen has to be drawn again -> an unchanged frame is not drawn at all, at any resolution
+    Args:
+        frame_state: tuple -> everything the frame shows
+    Return:
+        bool -> True if the state differs from the state on the screen
+    """
+    global drawn_frame
+    if frame_state == drawn_frame:
+        return False
+    drawn_frame = frame_state
+    return True
+
+
 # endregion UI ADDITIONS
 
 # region RESET DATA
 def reset_high_scores():
-    play_sound(reset_sound)
+    play_sound("reset")
     are_you_sure_reset()
 
 
@@ -333,27 +649,28 @@ def are_you_sure_reset():
     """
     confirming = True
     while confirming:
-        screen.fill(colors["screen_color"])
-        confirm_text = font.render("Really reset the data?", True, colors["dark_text"])
-        confirm_rect = confirm_text.get_rect(center=(window_width / 2, 150))
-        screen.blit(confirm_text, confirm_rect)
+        renderer.fill(colors["screen_color"])
+        confirm_text = layout.render("Really reset the data?", colors["dark_text"])
+        confirm_rect = confirm_text.get_rect(center=layout.point(window_width / 2, 150))
+        renderer.blit(confirm_text, confirm_rect)
 
-        yes_text = font.render("Yes", True, colors["dark_text"])
-        yes_rect = yes_text.get_rect(center=(window_width / 2 - 50, 200))
-        screen.blit(yes_text, yes_rect)
+        yes_text = layout.render("Yes", colors["dark_text"])
+        yes_rect = yes_text.get_rect(center=layout.point(window_width / 2 - 50, 200))
+        renderer.blit(yes_text, yes_rect)
 
-        return_text = font.render("Return", True, colors["dark_text"])
-        return_rect = return_text.get_rect(center=(window_width / 2 + 50, 200))
-        screen.blit(return_text, return_rect)
+        return_text = layout.render("Return", colors["dark_text"])
+        return_rect = return_text.get_rect(center=layout.point(window_width / 2 + 50, 200))
+        renderer.blit(return_text, return_rect)
 
-        pygame.display.flip()
+        renderer.present()
 
         for event in pygame.event.get():
+            handle_window_event(event)
             if event.type == pygame.QUIT:
                 pygame.quit()
                 return
             elif event.type == pygame.MOUSEBUTTONDOWN:
-                play_sound(mouse_click_sound)
+                play_sound("click")
                 if yes_rect.collidepoint(event.pos):
                     # Perform the actual reset
                     perform_reset()
@@ -364,35 +681,13 @@ def are_you_sure_reset():
 
 def perform_reset():
     """
-    Reset the high scores in the game and save the updated scores to a JSON file.
+    Reset the high scores of all rule variants of the current profile and save them
     """
     global high_score, timed_high_score
     high_score = 0
     timed_high_score = 0
-
-    # Assuming json_save_file is the file where all game data is stored
-    try:
-        # Load the existing data
-        with open(json_save_file, 'r') as gamedata_file:
-            data = json.load(gamedata_file)
-
-        # Update the high scores in the data
-        data['high_score'] = high_score
-        data['timed_high_score'] = timed_high_score
-
-        # Write the updated data back to the file
-        with open(json_save_file, 'w') as gamedata_file:
-            json.dump(data, gamedata_file, indent=4)
-
-    except FileNotFoundError:
-        # Handle the case where the game data file does not exist
-        data = {
-            "high_score": high_score,
-            "timed_high_score": timed_high_score,
-            # Include other default values as needed
-        }
-        with open(json_save_file, 'w') as gamedata_file:
-            json.dump(data, gamedata_file, indent=4)
+    variant_high_scores.clear()
+    save_game_data()
 
 
 # endregion RESET DATA
@@ -402,63 +697,152 @@ def draw_board(game_type='classic'):
     """
     Draw the board on the screen using the pygame.draw.rect function
     """
-    pygame.draw.rect(screen, colors["bg"], board_rectangle_dimensions, board_border_width,
-                     board_rectangle_border_radius)
+    renderer.rect(colors["bg"], layout.rect(*board_rectangle_dimensions), layout.length(board_border_width),
+                  layout.length(board_rectangle_border_radius))
 
     # Display scores
     if game_type == 'classic':
-        score_text = font.render(f"Score: {score}", True, colors['dark_text'])
-        high_score_text = font.render(f"High Score: {high_score}", True, colors['dark_text'])
-        screen.blit(score_text, (10, 410))
-        screen.blit(high_score_text, (10, 450))
+        score_text = layout.render(f"Score: {score}", colors['dark_text'])
+        high_score_text = layout.render(f"High Score: {high_score}", colors['dark_text'])
+        renderer.blit(score_text, layout.point(10, 410))
+        renderer.blit(high_score_text, layout.point(10, 450))
     elif game_type == 'timed':
-        score_text = font.render(f"Score: {timed_score}", True, colors['dark_text'])
-        high_score_text = font.render(f"High Score: {timed_high_score}", True, colors['dark_text'])
-        screen.blit(score_text, (10, 410))
-        screen.blit(high_score_text, (10, 450))
+        score_text = layout.render(f"Score: {timed_score}", colors['dark_text'])
+        high_score_text = layout.render(f"High Score: {timed_high_score}", colors['dark_text'])
+        renderer.blit(score_text, layout.point(10, 410))
+        renderer.blit(high_score_text, layout.point(10, 450))
 
 
-def draw_pieces(board):
+def get_tile_surface(value):
     """
-    Draw the pieces on the board
-    Colors of the pieces are defined in the colors dictionary by numbers in it
+    Get the surface of one piece, every piece is rendered only once per theme, variant, value and layout and then reused
+    Colors of the pieces are defined in the colors dictionary by numbers in it, the tiles of other rule variants
+    use the color of the classic tile with the same number of merges, a blocker is a plain dark piece
     Text color inside is defined by the value of the piece + font scale is adjusted based on the length of the value
+    Args:
+        value: int -> value of the piece
+    Return:
+        tile_surface: pygame.Surface -> rendered piece (75x75 logical px)
+    """
+    variant = board_variant()
+    tile_surface = tile_surface_cache.get((current_theme, variant, value))
+    if tile_surface is not None:
+        return tile_surface
+
+    # different colors for different values
+    color_value = rule_variants[variant].color_value(value) if value > 0 else value
+    if color_value < 2048:
+        value_color = colors["dark_text"]
+    else:
+        value_color = colors["light_text"]
+    if value == blocker:
+        color = colors["dark_text"]
+    elif color_value <= 2048:
+        color = colors[color_value]
+    else:
+        color = colors["other"]
+
+    # the corners of the piece show the board background
+    tile_size = layout.length(75)
+    tile_surface = pygame.Surface((tile_size, tile_size))
+    tile_surface.fill(colors["bg"])
+    pygame.draw.rect(tile_surface, color, [0, 0, tile_size, tile_size], 0, layout.length(10))
+    if value > 0:
+        font_size = 48 - (len(str(value)) * 5)
+        value_text = layout.font(font_size).render(str(value), True, value_color)
+        text_rect = value_text.get_rect(center=(tile_size // 2, tile_size // 2))
+        tile_surface.blit(value_text, text_rect)
+        pygame.draw.rect(tile_surface, colors["light_text"], [0, 0, tile_size, tile_size], layout.length(2),
+                         layout.length(10))
+
+    tile_surface_cache[(current_theme, variant, value)] = tile_surface
+    return tile_surface
+
+
+def draw_pieces(board, x_offset=0):
+    """
+    Draw the pieces on the board from the cached piece surfaces
     Args:
         board: list -> values of the board
+        x_offset: int -> horizontal offset of the board on the screen
     """
     for i in range(len(board)):
         for j in range(len(board)):
-            value = board[i][j]
-            # different colors for different values
-            if value < 2048:
-                value_color = colors["dark_text"]
-            else:
-                value_color = colors["light_text"]
-            if value <= 2048:
-                color = colors[value]
-            else:
-                color = colors["other"]
-            pygame.draw.rect(screen, color, [j * 95 + 20, i * 95 + 20, 75, 75], 0, 10)
-            if value > 0:
-                value_len = len(str(value))
-                piece_font = pygame.font.SysFont('Arial', 48 - (value_len * 5))
-                value_text = piece_font.render(str(value), True, value_color)
-                text_rect = value_text.get_rect(center=(j * 95 + 57, i * 95 + 57))
-                screen.blit(value_text, text_rect)
-                pygame.draw.rect(screen, colors["light_text"], [j * 95 + 20, i * 95 + 20, 75, 75], 2, 10)
-
-
-def draw_over(end_text="Game Over"):
+            renderer.blit(get_tile_surface(board[i][j]), layout.point(j * 95 + 20 + x_offset, i * 95 + 20))
+
+
+def draw_over(end_text="Game Over", x_offset=0):
     """
     Draw the game over screen
     Args:
         end_text: str -> text to display on the game over screen
+        x_offset: int -> horizontal offset of the board on the screen
     """
-    pygame.draw.rect(screen, colors["other"], game_over_rect, board_border_width, board_rectangle_border_radius)
-    game_over_text = font.render(end_text, True, colors["light_text"])
-    press_enter_text = font.render("Press Enter to play again", True, colors["dark_text"])
-    screen.blit(game_over_text, (130, 65))
-    screen.blit(press_enter_text, (70, 105))
+    over_rect = layout.rect(game_over_rect[0] + x_offset, *game_over_rect[1:])
+    renderer.rect(colors["other"], over_rect, layout.length(board_border_width),
+                  layout.length(board_rectangle_border_radius))
+    game_over_text = layout.render(end_text, colors["light_text"])
+    press_enter_text = layout.render("Press Enter to play again", colors["dark_text"])
+    renderer.blit(game_over_text, layout.point(130 + x_offset, 65))
+    renderer.blit(press_enter_text, layout.point(70 + x_offset, 105))
+    return over_rect
+
+
+def draw_versus_player(player_index):
+    """
+    Draw one board of the versus mode, only the parts which changed since the last frame are redrawn
+    Args:
+        player_index: int -> index of the player in versus_players (0 -> left board, 1 -> right board)
+    Return:
+        dirty_rects: list -> rectangles of the screen which were redrawn
+    """
+    player = versus_players[player_index]
+    x_offset = player_index * window_width
+    end_text = versus_end_text(player_index)
+    drawn_state = versus_drawn_states[player_index]
+    dirty_rects = []
+
+    if drawn_state is None:
+        # nothing of this board is on the screen yet -> draw the whole panel
+        panel_rect = layout.rect(x_offset, 0, window_width, window_height)
+        renderer.fill(colors["screen_color"], panel_rect)
+        renderer.rect(colors["bg"], layout.rect(board_rectangle_dimensions[0] + x_offset,
+                                                *board_rectangle_dimensions[1:]),
+                      layout.length(board_border_width), layout.length(board_rectangle_border_radius))
+        draw_pieces(player.board_values, x_offset)
+        dirty_rects.append(panel_rect)
+        drawn_board = [row[:] for row in player.board_values]
+        drawn_info = None
+    else:
+        drawn_board, drawn_info = drawn_state
+        for i in range(4):
+            for j in range(4):
+                if drawn_board[i][j] != player.board_values[i][j]:
+                    drawn_board[i][j] = player.board_values[i][j]
+                    dirty_rects.append(renderer.blit(get_tile_surface(drawn_board[i][j]),
+                                                     layout.point(j * 95 + 20 + x_offset, i * 95 + 20)))
+
+    # score, undo cooldown and controls under the board
+    info = (player.score, player.cooldown_counter, end_text)
+    if info != drawn_info:
+        info_rect = layout.rect(x_offset, 400, window_width, window_height - 400)
+        renderer.fill(colors["screen_color"], info_rect)
+        if player.cooldown_counter == 0:
+            undo_text_content = "Undo Ready"
+        else:
+            undo_text_content = f"Cooldown: {player.cooldown_counter}"
+        controls_text_content = "WASD, Q - undo" if player_index == 0 else "Arrows, Backspace - undo"
+        renderer.blit(layout.render(f"Score: {player.score}", colors['dark_text']), layout.point(x_offset + 10, 410))
+        renderer.blit(layout.render(undo_text_content, colors['dark_text']), layout.point(x_offset + 210, 410))
+        renderer.blit(layout.render(controls_text_content, colors['dark_text']), layout.point(x_offset + 10, 450))
+        dirty_rects.append(info_rect)
+
+    # the game over screen lies over the pieces -> redraw it whenever something below it changed
+    if end_text and dirty_rects:
+        dirty_rects.append(draw_over(end_text, x_offset))
+
+    versus_drawn_states[player_index] = (drawn_board, info)
+    return dirty_rects
 
 
 def draw_timer(remaining_time):
@@ -467,10 +851,10 @@ def draw_timer(remaining_time):
     """
     minutes = int(remaining_time // 60)
     seconds = int(remaining_time % 60)
-    time_text = font.render(f"Time: {minutes:02}:{seconds:02}", True, colors["light_text"])
-    time_rect = time_text.get_rect(center=(window_width - 100, 30))
-    pygame.draw.rect(screen, colors["bg"], time_rect.inflate(20, 10))
-    screen.blit(time_text, time_rect)
+    time_text = layout.render(f"Time: {minutes:02}:{seconds:02}", colors["light_text"])
+    time_rect = time_text.get_rect(center=layout.point(window_width - 100, 30))
+    renderer.rect(colors["bg"], time_rect.inflate(layout.length(20), layout.length(10)))
+    renderer.blit(time_text, time_rect)
 
 
 # region DRAW BUTTONS
@@ -478,10 +862,10 @@ def draw_return_button():
     """
     Draw the return to menu button on the game screen
     """
-    return_text = font.render("Return to Menu", True, colors[2])
-    return_button_rect = return_text.get_rect(center=(300, 470))
-    pygame.draw.rect(screen, colors["bg"], return_button_rect.inflate(20, 10))
-    screen.blit(return_text, return_button_rect)
+    return_text = layout.render("Return to Menu", colors[2])
+    return_button_rect = return_text.get_rect(center=layout.point(300, 470))
+    renderer.rect(colors["bg"], return_button_rect.inflate(layout.length(20), layout.length(10)))
+    renderer.blit(return_text, return_button_rect)
     return return_button_rect
 
 
@@ -498,62 +882,47 @@ def draw_undo_button():
         undo_text_content = f"Cooldown: {cooldown_counter}"
         undo_text_color = colors[16]
 
-    undo_text = font.render(undo_text_content, True, undo_text_color)
-    undo_button_rect = undo_text.get_rect(center=(300, 430))
-    pygame.draw.rect(screen, colors["bg"], undo_button_rect.inflate(20, 10))  # Background for button
-    screen.blit(undo_text, undo_button_rect)
+    undo_text = layout.render(undo_text_content, undo_text_color)
+    undo_button_rect = undo_text.get_rect(center=layout.point(300, 430))
+    renderer.rect(colors["bg"], undo_button_rect.inflate(layout.length(20), layout.length(10)))  # Background for button
+    renderer.blit(undo_text, undo_button_rect)
     return undo_button_rect
 
 
-# endregion DRAW BUTTONS
-# endregion DRAW FUNCTIONS
-
-# region GAME LOGIC FUNCTIONS
-
-def spawn_piece(board):
+def draw_hint_button():
     """
-    Spawn a new piece on the board per function call and checks if the game is over
-    Args:
-        board: list -> values of the board
+    Draw the hint button next to the undo button and highlight the best direction if the hint is shown
+    The hint is only read from the hint engine, the drawing never waits for the search
+    Return:
+        hint_rect: pygame.Rect -> rectangle of the hint button
     """
-    # only one new piece per function call
-    count = 0
-    # spawn a new piece on the board randomly
-    while any(0 in row for row in board) and count < 1:
-        row = random.randint(0, 3)
-        col = random.randint(0, 3)
-        if board[row][col] == 0:
-            count += 1
-            # one in ten chance of getting a 4
-            if random.randint(1, 10) == 1:
-                board[row][col] = 4
-            else:
-                board[row][col] = 2
+    hint_direction = hint_engine.get_hint(board_values) if hint_visible else None
+    if hint_visible and hint_direction is None:
+        hint_text_content = "..."
+    else:
+        hint_text_content = "Hint"
 
-    if count == 0 and not can_move_check(board):
-        return board, True  # game over
+    hint_text = layout.render(hint_text_content, colors[2])
+    hint_button_rect = hint_text.get_rect(center=layout.point(195, 430))
+    renderer.rect(colors["bg"], hint_button_rect.inflate(layout.length(20), layout.length(10)))  # Background for button
+    renderer.blit(hint_text, hint_button_rect)
 
-    return board, False  # game not over
+    # highlight the edge of the board in the direction of the best move
+    if hint_direction == "UP":
+        renderer.rect(colors[8], layout.rect(20, 5, 360, 10), 0, layout.length(5))
+    elif hint_direction == "DOWN":
+        renderer.rect(colors[8], layout.rect(20, 385, 360, 10), 0, layout.length(5))
+    elif hint_direction == "LEFT":
+        renderer.rect(colors[8], layout.rect(5, 20, 10, 360), 0, layout.length(5))
+    elif hint_direction == "RIGHT":
+        renderer.rect(colors[8], layout.rect(385, 20, 10, 360), 0, layout.length(5))
+    return hint_button_rect
 
 
-def can_move_check(board):
-    """
-    Check if the board can be moved in any direction (up, down, left, right) by checking if there are any same adjacent
-    For determining if the game is over
-    Args:
-        board: list -> values of the board
-    Return:
-        bool -> True if the board can be moved in any direction, False otherwise
-    """
-    size = len(board)
-    for i in range(size):
-        for j in range(size):
-            if i < size - 1 and board[i][j] == board[i + 1][j]:
-                return True  # Check vertical moves
-            if j < size - 1 and board[i][j] == board[i][j + 1]:
-                return True  # Check horizontal moves
-    return False
+# endregion DRAW BUTTONS
+# endregion DRAW FUNCTIONS
 
+# region GAME LOGIC FUNCTIONS
 
 def return_one_move():
     """
@@ -561,10 +930,13 @@ def return_one_move():
     Return:
         bool -> True if the move is undone, False otherwise
     """
-    global board_values, previous_states, cooldown_counter
-    if previous_states and cooldown_counter == 0:
-        board_values = previous_states.pop()
-        cooldown_counter = 10
+    global board_values, cooldown_counter
+    # same undo rule as PlayerState, the journal replays the classic game through it
+    board_values, cooldown_counter, undone = undo_move(board_values, previous_states, cooldown_counter)
+    if undone:
+        game_record.add_undo()
+        game_journal.record("undo")
+        telemetry.emit("undo", current_game_mode)
         return True
     return False
 
@@ -573,15 +945,54 @@ def reset_game_data():
     """
     Restart the game -> resets game values
     """
-    global board_values, spawn_new, init_pieces_count, score, direction, game_over, cooldown_counter, previous_states
+    global board_values, spawn_new, init_pieces_count, score, direction, game_over, cooldown_counter, previous_states, \
+        hint_visible, game_record
 
     board_values = [[0 for _ in range(4)] for _ in range(4)]
     spawn_new = True
     score = 0
     direction = ''
     game_over = False
-    cooldown_counter = 10
+    cooldown_counter = undo_cooldown
     previous_states = []
+    hint_visible = False
+    game_record = GameRecord(current_game_mode or 'classic', variant=current_variant)
+    if current_game_mode == 'timed':
+        game_journal.finish()
+    else:
+        game_journal.snapshot(journal_state())
+
+
+def reset_versus_game_data():
+    """
+    Restart the versus game -> resets the games of both players
+    """
+    global versus_drawn_states
+
+    for player in versus_players:
+        player.reset()
+    versus_drawn_states = [None, None]
+
+
+def versus_end_text(player_index):
+    """
+    Get the game over text of one versus board
+    Args:
+        player_index: int -> index of the player in versus_players
+    Return:
+        str -> text of the game over screen, empty string while the player is still playing
+    """
+    player = versus_players[player_index]
+    if not player.game_over:
+        return ''
+    if not all(other.game_over for other in versus_players):
+        return "Game Over"
+    best_score = max(other.score for other in versus_players)
+    if player.score < best_score:
+        return "You Lost"
+    if all(other.score == best_score for other in versus_players):
+        return "Draw"
+    return "You Won!"
 
 
 def reset_timed_game_data():
@@ -595,6 +1006,46 @@ def reset_timed_game_data():
     start_time = pygame.time.get_ticks()
 
 
+def board_variant():
+    """
+    Get the rule variant of the board on the screen -> the selected variant in the classic and timed modes,
+    the other modes always play the classic rules
+    Return:
+        str -> name of the rule variant (key of rule_variants)
+    """
+    return current_variant if current_game_mode in (None, 'classic', 'timed') else 'classic'
+
+
+def spawn_new_pieces(board, game_score):
+    """
+    Spawn the new pieces with the selected spawn rule, the two initial pieces are always spawned the classic way
+    Boards of other rule variants (other tiles or blockers) spawn with the rules of their variant,
+    the blockers are placed on the empty board of a new game
+    Args:
+        board: list -> values of the board
+        game_score: int -> score of the game (harder spawn rules ramp with it)
+    Return:
+        board: list -> values of the board with the new pieces
+        bool -> True if the game is over (no move left or the target of the variant is reached)
+    """
+    rules = rule_variants[current_variant]
+    if rules.blockers and not any(any(row) for row in board):
+        board = rules.place_blockers(board, random)
+    if not rules.classic_board:
+        board, is_game_over = rules.spawn(board, random)
+        telemetry.emit("spawn", current_variant, is_game_over)
+    elif init_pieces_count < 2:
+        board, is_game_over = spawn_piece(board)
+        telemetry.emit("spawn", 'classic', is_game_over)
+    else:
+        board, is_game_over = spawn_rules[current_spawn_rule].spawn(board, random, game_score)
+        telemetry.emit("spawn", current_spawn_rule, is_game_over)
+    is_game_over = is_game_over or rules.won(board)
+    if is_game_over:
+        telemetry.emit("game_over", current_game_mode, game_score, max(max(row) for row in board))
+    return board, is_game_over
+
+
 # endregion GAME LOGIC FUNCTIONS
 
 # region MOVE FUNCTIONS
@@ -606,172 +1057,29 @@ def move_board(board, move_direction, game_type='classic'):
         move_direction: str -> direction of the move
         game_type: str -> type of the game (classic or timed)
     """
-    global score, previous_states, cooldown_counter, timed_score, cooldown_counter
+    global score, cooldown_counter, timed_score
 
-    # Save the previous state of the board if return is available
-    if cooldown_counter == 0:
-        previous_states.append([row[:] for row in board])
-    else:
-        cooldown_counter = max(0, cooldown_counter - 1)
+    # Save the previous state of the board if return is available (same rule as PlayerState)
+    cooldown_counter = save_undo_state(board, previous_states, cooldown_counter)
 
-    play_sound(move_sound)
+    play_sound("move")
+    game_record.add_move(move_direction)
 
+    # the row table of the selected rule variant moves the board (the classic variant gives the classic moves)
+    rules = rule_variants[current_variant]
     if game_type == 'classic':
-        if move_direction == "UP":
-            board, score = move_up(board, score)
-        elif move_direction == "DOWN":
-            board, score = move_down(board, score)
-        elif move_direction == "LEFT":
-            board, score = move_left(board, score)
-        elif move_direction == "RIGHT":
-            board, score = move_right(board, score)
+        score_before = score
+        board, score = rules.move(board, move_direction, score)
+        telemetry.emit("move", game_type, move_direction, score - score_before)
+        game_journal.record("move", move_direction)
         return board
     elif game_type == 'timed':
-        if move_direction == "UP":
-            board, timed_score = move_up(board, timed_score)
-        elif move_direction == "DOWN":
-            board, timed_score = move_down(board, timed_score)
-        elif move_direction == "LEFT":
-            board, timed_score = move_left(board, timed_score)
-        elif move_direction == "RIGHT":
-            board, timed_score = move_right(board, timed_score)
+        score_before = timed_score
+        board, timed_score = rules.move(board, move_direction, timed_score)
+        telemetry.emit("move", game_type, move_direction, timed_score - score_before)
         return board
 
 
-def move_up(board, global_score):
-    """
-    Move the board up and merge the tiles + update the score
-    Args:
-        board: list -> values of the board
-        global_score: int -> score of the game
-    Return:
-        board: list -> updated values of the board after move UP
-        global_score: int -> updated score of the game
-    """
-    size = len(board)
-    for col in range(size):
-        # Compact the column
-        new_col = [tile for tile in [board[row][col] for row in range(size)] if tile != 0]
-        # Merge tiles
-        merged_col = []
-        skip = False
-        for i in range(len(new_col)):
-            if skip:
-                skip = False
-                continue
-            if i + 1 < len(new_col) and new_col[i] == new_col[i + 1]:
-                merged_col.append(new_col[i] * 2)
-                global_score += new_col[i] * 2
-                skip = True
-            else:
-                merged_col.append(new_col[i])
-        # Fill the remaining spaces with zeros
-        merged_col += [0] * (size - len(merged_col))
-        # Place back into the board
-        for row in range(size):
-            board[row][col] = merged_col[row]
-    return board, global_score
-
-
-def move_down(board, global_score):
-    """
-        Move the board down and merge the tiles + update the score
-        Args:
-            board: list -> values of the board
-            global_score: int -> score of the game
-        Return:
-            board: list -> updated values of the board after move DOWN
-            global_score: int -> updated score of the game
-    """
-    size = len(board)
-    for col in range(size):
-        # Compact the column in reverse (bottom to top)
-        new_col = [tile for tile in [board[row][col] for row in range(size - 1, -1, -1)] if tile != 0]
-        # Merge tiles
-        merged_col = []
-        skip = False
-        for i in range(len(new_col)):
-            if skip:
-                skip = False
-                continue
-            if i + 1 < len(new_col) and new_col[i] == new_col[i + 1]:
-                merged_col.append(new_col[i] * 2)
-                global_score += new_col[i] * 2
-                skip = True
-            else:
-                merged_col.append(new_col[i])
-        # Fill the remaining spaces with zeros, reverse before placing back
-        merged_col += [0] * (size - len(merged_col))
-        for row in range(size):
-            board[size - 1 - row][col] = merged_col[row]
-    return board, global_score
-
-
-def move_left(board, global_score):
-    """
-        Move the board left and merge the tiles + update the score
-        Args:
-            board: list -> values of the board
-            global_score: int -> score of the game
-        Return:
-            board: list -> updated values of the board after move LEFT
-            global_score: int -> updated score of the game
-    """
-    size = len(board)
-    for row in range(size):
-        # Compact the row
-        new_row = [tile for tile in board[row] if tile != 0]
-        # Merge tiles
-        merged_row = []
-        skip = False
-        for i in range(len(new_row)):
-            if skip:
-                skip = False
-                continue
-            if i + 1 < len(new_row) and new_row[i] == new_row[i + 1]:
-                merged_row.append(new_row[i] * 2)
-                global_score += new_row[i] * 2
-                skip = True
-            else:
-                merged_row.append(new_row[i])
-        # Fill the remaining spaces with zeros
-        merged_row += [0] * (size - len(merged_row))
-        board[row] = merged_row
-    return board, global_score
-
-
-def move_right(board, global_score):
-    """
-        Move the board right and merge the tiles + update the score
-        Args:
-            board: list -> values of the board
-            global_score: int -> score of the game
-        Return:
-            board: list -> updated values of the board after move RIGHT
-            global_score: int -> updated score of the game
-    """
-    size = len(board)
-    for row in range(size):
-        # Compact the row in reverse (right to left)
-        new_row = [tile for tile in board[row] if tile != 0][::-1]
-        # merge tiles
-        merged_row = []
-        skip = False
-        for i in range(len(new_row)):
-            if skip:
-                skip = False
-                continue
-            if i + 1 < len(new_row) and new_row[i] == new_row[i + 1]:
-                merged_row.append(new_row[i] * 2)
-                global_score += new_row[i] * 2
-                skip = True
-            else:
-                merged_row.append(new_row[i])
-        merged_row += [0] * (size - len(merged_row))
-        board[row] = merged_row[::-1]
-    return board, global_score
-
-
 # endregion MOVE FUNCTIONS
 
 # region GAME HANDLERS
@@ -785,11 +1093,12 @@ def handle_game_events(game_type='classic'):
     global run, direction, spawn_new, game_over, cooldown_counter
 
     for event in pygame.event.get():
+        handle_window_event(event)
         if event.type == pygame.QUIT:
             run = False
 
         elif event.type == pygame.MOUSEBUTTONDOWN:
-            play_sound(mouse_click_sound)
+            play_sound("click")
             handle_mouse_button(event)
 
         elif event.type == pygame.KEYDOWN:
@@ -810,13 +1119,19 @@ def handle_mouse_button(mouse_button_event):
     Args:
         mouse_button_event: pygame.event -> key press event on which the function decides what to do next
     """
-    global run
+    global run, hint_visible
 
     if return_rect.collidepoint(mouse_button_event.pos):
         run = False
 
     if undo_rect.collidepoint(mouse_button_event.pos) and cooldown_counter == 0:
-        return_one_move()
+        if return_one_move() and rule_variants[current_variant].classic_board:
+            hint_engine.request(board_values)
+
+    # the hint search knows only classic boards
+    if current_game_mode == 'classic' and rule_variants[current_variant].classic_board and \
+            hint_rect.collidepoint(mouse_button_event.pos):
+        hint_visible = not hint_visible
 
 
 def handle_key_press(key_press_event):
@@ -831,6 +1146,8 @@ def handle_key_press(key_press_event):
         run = False
 
     if not game_over:
+        if key_press_event.key in (pygame.K_UP, pygame.K_DOWN, pygame.K_LEFT, pygame.K_RIGHT):
+            audio.mark_input()
         if key_press_event.key == pygame.K_UP:
             direction = "UP"
         elif key_press_event.key == pygame.K_DOWN:
@@ -841,6 +1158,39 @@ def handle_key_press(key_press_event):
             direction = "RIGHT"
 
 
+def handle_versus_events():
+    """
+    Handle the events of the versus mode, keys of both players are queued independently -> nobody blocks the other
+    """
+    global run, versus_drawn_states
+
+    for event in pygame.event.get():
+        if handle_window_event(event):
+            # the new layout moved everything -> draw both boards and the borders again
+            renderer.fill(colors["screen_color"])
+            renderer.present()
+            versus_drawn_states = [None, None]
+
+        elif event.type == pygame.QUIT:
+            run = False
+
+        elif event.type == pygame.KEYDOWN:
+            if event.key == pygame.K_RETURN and all(player.game_over for player in versus_players):
+                reset_versus_game_data()
+
+        elif event.type == pygame.KEYUP:
+            if event.key == pygame.K_ESCAPE:
+                run = False
+            elif event.key in versus_move_keys:
+                player_index, move_direction = versus_move_keys[event.key]
+                versus_players[player_index].queue_move(move_direction)
+                audio.mark_input()
+            elif event.key in versus_undo_keys:
+                player = versus_players[versus_undo_keys[event.key]]
+                if not player.game_over:
+                    player.return_one_move()
+
+
 # endregion GAME EVENT HANDLERS
 
 # region GAME MODES
@@ -849,48 +1199,72 @@ def classic_game_loop():
     Main game loop for the classic mode
     """
     global run, spawn_new, direction, game_over, board_values, init_pieces_count, score, high_score, init_high_score, \
-        return_rect, undo_rect, cooldown_counter
+        return_rect, undo_rect, hint_rect, cooldown_counter, hint_visible, drawn_frame
+
+    drawn_frame = None
     while run:
         timer.tick(fps)
-        screen.fill(colors["screen_color"])
-
-        # Draw the return and undo buttons
-        return_rect = draw_return_button()
-        undo_rect = draw_undo_button()
-
-        # Draw the board and pieces
-        draw_board()
-        draw_pieces(board_values)
+        frame_times.add('classic', timer.get_rawtime())
+        hint_direction = hint_engine.get_hint(board_values) if hint_visible else None
+        redraw = frame_changed((layout, current_theme, tuple(map(tuple, board_values)), score, high_score,
+                                cooldown_counter, hint_visible, hint_direction, game_over))
+        if redraw:
+            renderer.fill(colors["screen_color"])
+
+            # Draw the return, undo and hint buttons
+            return_rect = draw_return_button()
+            undo_rect = draw_undo_button()
+
+            # Draw the board and pieces
+            draw_board()
+            draw_pieces(board_values)
+            hint_rect = draw_hint_button()
 
         if spawn_new or init_pieces_count < 2:
-            board_values, game_over = spawn_piece(board_values)
+            board_before_spawn = [row[:] for row in board_values]
+            board_values, game_over = spawn_new_pieces(board_values, score)
+            spawned = game_record.add_spawn(board_before_spawn, board_values)
             spawn_new = False
             init_pieces_count += 1
+            game_journal.record("spawn", spawned)
+            if game_over:
+                game_journal.finish()
+            # search the new position speculatively, the hint is ready before the player asks for it
+            if rule_variants[current_variant].classic_board:
+                hint_engine.request(board_values)
 
         if direction != '':
             board_values = move_board(board_values, direction)
             direction = ''
             spawn_new = True
+            hint_visible = False
 
         handle_game_events()
 
         # Draw the game over screen and update the high score file
         if game_over:
-            draw_over()
+            if redraw:
+                draw_over("You Won!" if rule_variants[current_variant].won(board_values) else "Game Over")
             save_game_data()
+            if not game_record.saved:
+                game_record.save()
 
         if score > high_score:
             high_score = score
 
-        pygame.display.flip()
+        if redraw:
+            renderer.present()
+
+    hint_engine.cancel()
 
 
 def timed_game_loop():
     global run, spawn_new, direction, game_over, board_values, init_pieces_count, timed_score, timed_high_score, \
-        init_time_high_score, return_rect, undo_rect, start_time, cooldown_counter
+        init_time_high_score, return_rect, undo_rect, start_time, cooldown_counter, drawn_frame
 
     time_limit = 300  # seconds
     start_time = pygame.time.get_ticks()
+    drawn_frame = None
 
     while run:
         current_time = pygame.time.get_ticks()
@@ -898,19 +1272,25 @@ def timed_game_loop():
         remaining_time = max(time_limit - elapsed_time, 0)
 
         timer.tick(fps)
-        screen.fill(colors["screen_color"])
+        frame_times.add('timed', timer.get_rawtime())
+        redraw = frame_changed((layout, current_theme, tuple(map(tuple, board_values)), timed_score, timed_high_score,
+                                cooldown_counter, int(remaining_time), game_over))
+        if redraw:
+            renderer.fill(colors["screen_color"])
 
-        # Draw the return and undo buttons
-        return_rect = draw_return_button()
-        undo_rect = draw_undo_button()
+            # Draw the return and undo buttons
+            return_rect = draw_return_button()
+            undo_rect = draw_undo_button()
 
-        # Draw the board and pieces
-        draw_board('timed')
-        draw_pieces(board_values)
-        draw_timer(remaining_time)
+            # Draw the board and pieces
+            draw_board('timed')
+            draw_pieces(board_values)
+            draw_timer(remaining_time)
 
         if spawn_new or init_pieces_count < 2:
-            board_values, game_over = spawn_piece(board_values)
+            board_before_spawn = [row[:] for row in board_values]
+            board_values, game_over = spawn_new_pieces(board_values, timed_score)
+            game_record.add_spawn(board_before_spawn, board_values)
             spawn_new = False
             init_pieces_count += 1
 
@@ -929,9 +1309,264 @@ def timed_game_loop():
         # Draw the game over screen
         if remaining_time <= 0 or game_over:
             game_over = True
-            draw_over("Time's Up!" if remaining_time <= 0 else "Game Over")
+            if redraw:
+                if remaining_time <= 0:
+                    draw_over("Time's Up!")
+                else:
+                    draw_over("You Won!" if rule_variants[current_variant].won(board_values) else "Game Over")
+            if not game_record.saved:
+                game_record.save()
+
+        if redraw:
+            renderer.present()
+
+
+def versus_game_loop():
+    """
+    Game loop for the versus mode -> two boards side by side in a double wide window
+    Only the changed pieces and texts are redrawn and sent to the display (dirty rectangles)
+    """
+    global run, versus_drawn_states
+
+    set_window(2)
+    renderer.fill(colors["screen_color"])
+    renderer.present()
+    versus_drawn_states = [None, None]
+
+    while run:
+        timer.tick(fps)
+        frame_times.add('versus', timer.get_rawtime())
+        handle_versus_events()
+
+        if not renderer.keeps_frame:
+            # the texture renderer loses its frame after showing it -> compose the whole frame every time
+            renderer.fill(colors["screen_color"])
+            versus_drawn_states = [None, None]
+
+        dirty_rects = []
+        for player_index, player in enumerate(versus_players):
+            if player.update():
+                play_sound("move")
+            dirty_rects += draw_versus_player(player_index)
+
+        if dirty_rects:
+            renderer.present(dirty_rects)
+
+    set_window()
+
+
+def ai_game_loop():
+    """
+    Game loop of the AI mode -> the n-tuple network plays the classic rules on its own board
+    The weight file is mapped into memory, so the mode starts instantly
+    Arrow up and down change the number of moves per frame, Enter restarts a finished game
+    """
+    global run
+
+    try:
+        network = load_network()
+    except (OSError, ValueError):
+        network = None
+
+    player = PlayerState()
+    speed_index = 0
+    moves_this_second = 0
+    moves_per_second = 0
+    second_start = pygame.time.get_ticks()
 
-        pygame.display.flip()
+    while run:
+        timer.tick(fps)
+        frame_times.add('ai', timer.get_rawtime())
+
+        for event in pygame.event.get():
+            handle_window_event(event)
+            if event.type == pygame.QUIT:
+                run = False
+            elif event.type == pygame.KEYDOWN:
+                if event.key == pygame.K_RETURN and player.game_over:
+                    player.reset()
+            elif event.type == pygame.KEYUP:
+                if event.key == pygame.K_ESCAPE:
+                    run = False
+                elif event.key == pygame.K_UP:
+                    speed_index = min(speed_index + 1, len(ai_speeds) - 1)
+                elif event.key == pygame.K_DOWN:
+                    speed_index = max(speed_index - 1, 0)
+
+        if network is not None:
+            for _ in range(ai_speeds[speed_index]):
+                # spawn the pending piece, the game over is checked there
+                player.update()
+                if player.game_over:
+                    break
+                if player.init_pieces_count < 2:
+                    continue
+                # the book and the table decide the positions they cover, the network plays all others
+                move_direction = (opening_book.best_move(pack_board(player.board_values))
+                                  if opening_book is not None else None)
+                if move_direction is None and tablebase is not None:
+                    move_direction = tablebase.best_move(player.board_values)
+                player.move(move_direction or network.best_move_values(player.board_values) or "UP")
+                # the AI never undoes, do not keep the history of a long game
+                player.previous_states.clear()
+                moves_this_second += 1
+
+        if pygame.time.get_ticks() - second_start >= 1000:
+            moves_per_second = moves_this_second
+            moves_this_second = 0
+            second_start = pygame.time.get_ticks()
+
+        renderer.fill(colors["screen_color"])
+        draw_board('ai')
+        draw_pieces(player.board_values)
+
+        if network is None:
+            info_text_content = "No weights: python ntuple.py train"
+        else:
+            info_text_content = f"Speed: {ai_speeds[speed_index]}/frame, {moves_per_second} moves/s"
+        score_text = layout.render(f"Score: {player.score}", colors['dark_text'])
+        info_text = layout.render(info_text_content, colors['dark_text'])
+        renderer.blit(score_text, layout.point(10, 410))
+        renderer.blit(info_text, layout.point(10, 450))
+
+        if player.game_over:
+            draw_over()
+
+        renderer.present()
+
+
+def puzzle_game_loop():
+    """
+    Game loop of the puzzle mode -> reach the goal of the puzzle within its moves
+    Puzzles are read from the library by difficulty, a solved puzzle moves the profile on to the next one
+    Enter continues after the end of a puzzle (next one when solved, again when failed), R restarts the puzzle
+    """
+    global run, puzzle_library, puzzle_progress, drawn_frame
+
+    if puzzle_library is None:
+        puzzle_library = PuzzleLibrary(puzzles_file)
+    if puzzle_library.count() == 0:
+        # first start -> a few quick puzzles, python puzzle.py generate adds the harder ones
+        renderer.fill(colors["screen_color"])
+        generating_text = layout.render("Generating puzzles...", colors["dark_text"])
+        renderer.blit(generating_text, generating_text.get_rect(center=layout.point(window_width / 2, 250)))
+        renderer.present()
+        generate_puzzles(puzzle_library, first_puzzle_count, quick_presets)
+
+    current_puzzle = puzzle_library.next_puzzle(puzzle_progress)
+    board = current_puzzle.board
+    moves_used = 0
+    result = None  # None while playing, then 'solved' or 'failed'
+    drawn_frame = None
+
+    while run:
+        timer.tick(fps)
+        frame_times.add('puzzle', timer.get_rawtime())
+
+        if frame_changed((layout, current_theme, board, moves_used, result, current_puzzle.puzzle_id)):
+            renderer.fill(colors["screen_color"])
+            return_rect = draw_return_button()
+            draw_board('puzzle')
+            draw_pieces(unpack_board(board))
+
+            goal_text = layout.render(current_puzzle.description(), colors['dark_text'])
+            moves_text = layout.render(f"Moves: {moves_used}/{current_puzzle.moves}", colors['dark_text'])
+            renderer.blit(goal_text, layout.point(10, 410))
+            renderer.blit(moves_text, layout.point(10, 450))
+
+            if result is not None:
+                draw_over("Solved!" if result == 'solved' else "Out of Moves")
+            renderer.present()
+
+        for event in pygame.event.get():
+            handle_window_event(event)
+            if event.type == pygame.QUIT:
+                run = False
+            elif event.type == pygame.MOUSEBUTTONDOWN:
+                play_sound("click")
+                if return_rect.collidepoint(event.pos):
+                    run = False
+            elif event.type == pygame.KEYDOWN:
+                if event.key == pygame.K_RETURN and result is not None:
+                    if result == 'solved':
+                        current_puzzle = puzzle_library.next_puzzle(current_puzzle.puzzle_id)
+                    board, moves_used, result = current_puzzle.board, 0, None
+                elif event.key == pygame.K_r:
+                    board, moves_used, result = current_puzzle.board, 0, None
+            elif event.type == pygame.KEYUP:
+                if event.key == pygame.K_ESCAPE:
+                    run = False
+                elif event.key in network_move_keys and result is None:
+                    audio.mark_input()
+                    new_board, _ = move_packed_board(board, network_move_keys[event.key])
+                    if new_board == board:
+                        continue
+                    play_sound("move")
+                    moves_used += 1
+                    if current_puzzle.reached(new_board):
+                        result = 'solved'
+                        puzzle_progress = current_puzzle.puzzle_id
+                        save_game_data()
+                    else:
+                        # the puzzle is proven for exactly these spawns
+                        new_board = current_puzzle.spawn(new_board)
+                        if moves_used >= current_puzzle.moves or not can_move(new_board):
+                            result = 'failed'
+                    board = new_board
+                    if result is not None:
+                        telemetry.emit("puzzle", current_puzzle.puzzle_id, result, moves_used)
+
+
+def network_game_loop(client, spectating=False):
+    """
+    Game loop of the network client -> the server plays the game, this loop only sends moves and draws the board
+    The client receives in its own thread, so a slow network never stops the frame
+    Args:
+        client: ThreadedGameClient -> client connected to the game server
+        spectating: bool -> True when only watching the session of another player
+    """
+    global run
+
+    run = True
+    while run:
+        timer.tick(fps)
+        frame_times.add('network', timer.get_rawtime())
+
+        for event in pygame.event.get():
+            handle_window_event(event)
+            if event.type == pygame.QUIT:
+                run = False
+            elif event.type == pygame.KEYDOWN:
+                if event.key == pygame.K_RETURN and client.client.game_over and not spectating:
+                    client.send_move("RESTART")
+            elif event.type == pygame.KEYUP:
+                if event.key == pygame.K_ESCAPE:
+                    run = False
+                elif event.key in network_move_keys and not spectating:
+                    client.send_move(network_move_keys[event.key])
+
+        renderer.fill(colors["screen_color"])
+        renderer.rect(colors["bg"], layout.rect(*board_rectangle_dimensions),
+                      layout.length(board_border_width), layout.length(board_rectangle_border_radius))
+        draw_pieces(client.client.board_values)
+
+        if client.connected:
+            session_text_content = f"{'Watching' if spectating else 'Session'}: {client.client.session_id}"
+        elif client.error is not None:
+            session_text_content = "Disconnected"
+        else:
+            session_text_content = "Connecting..."
+        score_text = layout.render(f"Score: {client.client.score}", colors['dark_text'])
+        session_text = layout.render(session_text_content, colors['dark_text'])
+        renderer.blit(score_text, layout.point(10, 410))
+        renderer.blit(session_text, layout.point(10, 450))
+
+        if client.client.game_over:
+            draw_over("Game Over" if not spectating else "Player Lost")
+
+        renderer.present()
+
+    client.close()
 
 
 # endregion GAME MODES
@@ -939,61 +1574,91 @@ def timed_game_loop():
 # region MAIN MENU
 def main_menu():
     """
-    Draw the main menu of the game with the start, timed mode, tutorial, settings, and exit buttons
+    Draw the main menu of the game with the start, timed mode, versus mode, AI mode, puzzle mode, tutorial, settings,
+    exit and profile buttons
     """
     global current_game_mode
 
     menu = True
     while menu:
-        screen.fill(colors["screen_color"])
-        title = font.render("2048 Game", True, colors["dark_text"])
-        title_rect = title.get_rect(center=(window_width / 2, 100))
-        screen.blit(title, title_rect)
+        renderer.fill(colors["screen_color"])
+        title = layout.render("2048 Game", colors["dark_text"])
+        title_rect = title.get_rect(center=layout.point(window_width / 2, 70))
+        renderer.blit(title, title_rect)
 
         # Start Classic Game
-        start_game_text = font.render("Classic Mode", True, colors["dark_text"])
-        start_game_rect = start_game_text.get_rect(center=(window_width / 2, 180))
-        screen.blit(start_game_text, start_game_rect)
+        start_game_text = layout.render("Classic Mode", colors["dark_text"])
+        start_game_rect = start_game_text.get_rect(center=layout.point(window_width / 2, 130))
+        renderer.blit(start_game_text, start_game_rect)
 
         # Start Timed Game
-        timed_game_text = font.render("Timed Mode", True, colors["dark_text"])
-        timed_game_rect = timed_game_text.get_rect(center=(window_width / 2, 230))
-        screen.blit(timed_game_text, timed_game_rect)
+        timed_game_text = layout.render("Timed Mode", colors["dark_text"])
+        timed_game_rect = timed_game_text.get_rect(center=layout.point(window_width / 2, 170))
+        renderer.blit(timed_game_text, timed_game_rect)
+
+        # Start Versus Game
+        versus_game_text = layout.render("Versus Mode", colors["dark_text"])
+        versus_game_rect = versus_game_text.get_rect(center=layout.point(window_width / 2, 210))
+        renderer.blit(versus_game_text, versus_game_rect)
+
+        # Start AI Game
+        ai_game_text = layout.render("AI Mode", colors["dark_text"])
+        ai_game_rect = ai_game_text.get_rect(center=layout.point(window_width / 2, 250))
+        renderer.blit(ai_game_text, ai_game_rect)
+
+        # Start Puzzle Game
+        puzzle_game_text = layout.render("Puzzle Mode", colors["dark_text"])
+        puzzle_game_rect = puzzle_game_text.get_rect(center=layout.point(window_width / 2, 290))
+        renderer.blit(puzzle_game_text, puzzle_game_rect)
 
         # Display Tutorial
-        tutorial_text = font.render("Tutorial", True, colors["dark_text"])
-        tutorial_rect = tutorial_text.get_rect(center=(window_width / 2, 280))
-        screen.blit(tutorial_text, tutorial_rect)
+        tutorial_text = layout.render("Tutorial", colors["dark_text"])
+        tutorial_rect = tutorial_text.get_rect(center=layout.point(window_width / 2, 330))
+        renderer.blit(tutorial_text, tutorial_rect)
 
         # Settings
-        settings_text = font.render("Settings", True, colors["dark_text"])
-        settings_rect = settings_text.get_rect(center=(window_width / 2, 330))
-        screen.blit(settings_text, settings_rect)
+        settings_text = layout.render("Settings", colors["dark_text"])
+        settings_rect = settings_text.get_rect(center=layout.point(window_width / 2, 370))
+        renderer.blit(settings_text, settings_rect)
 
         # Exit Game
-        exit_game_text = font.render("Exit Game", True, colors["dark_text"])
-        exit_game_rect = exit_game_text.get_rect(center=(window_width / 2, 380))
-        screen.blit(exit_game_text, exit_game_rect)
+        exit_game_text = layout.render("Exit Game", colors["dark_text"])
+        exit_game_rect = exit_game_text.get_rect(center=layout.point(window_width / 2, 410))
+        renderer.blit(exit_game_text, exit_game_rect)
 
-        pygame.display.flip()
+        # Switch Profile
+        profile_text = layout.render(f"Profile: {current_profile}", colors["light_text"])
+        profile_rect = profile_text.get_rect(center=layout.point(window_width / 2, 465))
+        renderer.blit(profile_text, profile_rect)
+
+        renderer.present()
 
         # Handle all user input events in menu
         for event in pygame.event.get():
+            handle_window_event(event)
             if event.type == pygame.QUIT:
                 pygame.quit()
                 return None, False
             if event.type == pygame.MOUSEBUTTONDOWN:
-                play_sound(mouse_click_sound)
+                play_sound("click")
                 mouse_pos = event.pos
                 new_mode = None
                 if start_game_rect.collidepoint(mouse_pos):
                     new_mode = 'classic'
                 elif timed_game_rect.collidepoint(mouse_pos):
                     new_mode = 'timed'
+                elif versus_game_rect.collidepoint(mouse_pos):
+                    new_mode = 'versus'
+                elif ai_game_rect.collidepoint(mouse_pos):
+                    new_mode = 'ai'
+                elif puzzle_game_rect.collidepoint(mouse_pos):
+                    new_mode = 'puzzle'
                 elif tutorial_rect.collidepoint(mouse_pos):
                     show_tutorial()
                 elif settings_rect.collidepoint(mouse_pos):
                     settings_menu()
+                elif profile_rect.collidepoint(mouse_pos):
+                    profile_menu()
                 elif exit_game_rect.collidepoint(mouse_pos):
                     pygame.quit()
                     return None, False
@@ -1009,7 +1674,7 @@ def main_menu():
 
 
 def return_to_menu():
-    play_sound(mouse_click_sound)
+    play_sound("click")
     return main_menu()
 
 
@@ -1019,7 +1684,7 @@ def show_tutorial():
     """
     tutorial_running = True
     while tutorial_running:
-        screen.fill(colors["screen_color"])
+        renderer.fill(colors["screen_color"])
         instructions = [
             "How to Play 2048:",
             "Use your arrow keys to move the tiles.",
@@ -1028,24 +1693,24 @@ def show_tutorial():
         ]
 
         y_offset = 150
-        tutorial_font = pygame.font.SysFont('Arial', 15)
         for line in instructions:
-            instruction_text = tutorial_font.render(line, True, colors["dark_text"])
-            instruction_rect = instruction_text.get_rect(center=(window_width / 2, y_offset))
-            screen.blit(instruction_text, instruction_rect)
+            instruction_text = layout.render(line, colors["dark_text"], 15)
+            instruction_rect = instruction_text.get_rect(center=layout.point(window_width / 2, y_offset))
+            renderer.blit(instruction_text, instruction_rect)
             y_offset += 50
 
         # Back Button
-        back_text = font.render("Back to Menu", True, colors["dark_text"])
-        back_rect = back_text.get_rect(center=(window_width / 2, 400))
-        screen.blit(back_text, back_rect)
+        back_text = layout.render("Back to Menu", colors["dark_text"])
+        back_rect = back_text.get_rect(center=layout.point(window_width / 2, 400))
+        renderer.blit(back_text, back_rect)
 
-        pygame.display.flip()
+        renderer.present()
         for menu_event in pygame.event.get():
+            handle_window_event(menu_event)
             if menu_event.type == pygame.QUIT:
                 tutorial_running = False
             elif menu_event.type == pygame.MOUSEBUTTONDOWN:
-                play_sound(mouse_click_sound)
+                play_sound("click")
                 if back_rect.collidepoint(menu_event.pos):
                     tutorial_running = False
 
@@ -1054,49 +1719,62 @@ def show_tutorial():
 
 def settings_menu():
     """
-    Display the settings menu with options to change the theme, sound, reset high scores, and credits
+    Display the settings menu with options to change the theme, sound, spawn rule, rule variant, reset high scores,
+    and credits
     """
-    global current_theme, sound_enabled
+    global current_theme, sound_enabled, current_spawn_rule
 
     settings_running = True
     themes_available = ['basic', 'dark', 'classic', 'retro']
     current_theme_index = themes_available.index(current_theme)
+    spawn_rules_available = list(spawn_rules)
+    current_spawn_rule_index = spawn_rules_available.index(current_spawn_rule)
+    variants_available = list(rule_variants)
 
     while settings_running:
-        screen.fill(colors["screen_color"])
-        settings_title = font.render("Settings", True, colors["dark_text"])
-        settings_title_rect = settings_title.get_rect(center=(window_width / 2, 100))
-        screen.blit(settings_title, settings_title_rect)
+        renderer.fill(colors["screen_color"])
+        settings_title = layout.render("Settings", colors["dark_text"])
+        settings_title_rect = settings_title.get_rect(center=layout.point(window_width / 2, 100))
+        renderer.blit(settings_title, settings_title_rect)
 
         # Additional settings elements
-        theme_text = font.render(f"Theme: {current_theme.capitalize()}", True, colors["dark_text"])
-        theme_rect = theme_text.get_rect(center=(window_width / 2, 150))
-        screen.blit(theme_text, theme_rect)
+        theme_text = layout.render(f"Theme: {current_theme.capitalize()}", colors["dark_text"])
+        theme_rect = theme_text.get_rect(center=layout.point(window_width / 2, 140))
+        renderer.blit(theme_text, theme_rect)
+
+        sound_text = layout.render(f"Sound: {'On' if sound_enabled else 'Off'}", colors["dark_text"])
+        sound_rect = sound_text.get_rect(center=layout.point(window_width / 2, 185))
+        renderer.blit(sound_text, sound_rect)
 
-        sound_text = font.render(f"Sound: {'On' if sound_enabled else 'Off'}", True, colors["dark_text"])
-        sound_rect = sound_text.get_rect(center=(window_width / 2, 200))
-        screen.blit(sound_text, sound_rect)
+        spawn_rule_text = layout.render(f"Spawns: {current_spawn_rule.capitalize()}", colors["dark_text"])
+        spawn_rule_rect = spawn_rule_text.get_rect(center=layout.point(window_width / 2, 230))
+        renderer.blit(spawn_rule_text, spawn_rule_rect)
 
-        reset_scores_text = font.render("Reset Saves", True, colors["dark_text"])
-        reset_scores_rect = reset_scores_text.get_rect(center=(window_width / 2, 250))
-        screen.blit(reset_scores_text, reset_scores_rect)
+        variant_text = layout.render(f"Rules: {current_variant.capitalize()}", colors["dark_text"])
+        variant_rect = variant_text.get_rect(center=layout.point(window_width / 2, 275))
+        renderer.blit(variant_text, variant_rect)
 
-        credits_text = font.render("Credits", True, colors["dark_text"])
-        credits_rect = credits_text.get_rect(center=(window_width / 2, 300))
-        screen.blit(credits_text, credits_rect)
+        reset_scores_text = layout.render("Reset Saves", colors["dark_text"])
+        reset_scores_rect = reset_scores_text.get_rect(center=layout.point(window_width / 2, 320))
+        renderer.blit(reset_scores_text, reset_scores_rect)
 
-        back_text = font.render("Back to Menu", True, colors["dark_text"])
-        back_rect = back_text.get_rect(center=(window_width / 2, 350))
-        screen.blit(back_text, back_rect)
+        credits_text = layout.render("Credits", colors["dark_text"])
+        credits_rect = credits_text.get_rect(center=layout.point(window_width / 2, 365))
+        renderer.blit(credits_text, credits_rect)
 
-        pygame.display.flip()
+        back_text = layout.render("Back to Menu", colors["dark_text"])
+        back_rect = back_text.get_rect(center=layout.point(window_width / 2, 410))
+        renderer.blit(back_text, back_rect)
+
+        renderer.present()
 
         for event in pygame.event.get():
+            handle_window_event(event)
             if event.type == pygame.QUIT:
                 pygame.quit()
                 return None, False
             elif event.type == pygame.MOUSEBUTTONDOWN:
-                play_sound(mouse_click_sound)
+                play_sound("click")
                 mouse_pos = event.pos
                 if theme_rect.collidepoint(mouse_pos):
                     current_theme_index = (current_theme_index + 1) % len(themes_available)
@@ -1104,6 +1782,12 @@ def settings_menu():
                     apply_theme(current_theme)
                 elif sound_rect.collidepoint(mouse_pos):
                     sound_enabled = not sound_enabled
+                elif spawn_rule_rect.collidepoint(mouse_pos):
+                    current_spawn_rule_index = (current_spawn_rule_index + 1) % len(spawn_rules_available)
+                    current_spawn_rule = spawn_rules_available[current_spawn_rule_index]
+                elif variant_rect.collidepoint(mouse_pos):
+                    next_index = (variants_available.index(current_variant) + 1) % len(variants_available)
+                    select_variant(variants_available[next_index])
                 elif reset_scores_rect.collidepoint(mouse_pos):
                     reset_high_scores()
                 elif credits_rect.collidepoint(mouse_pos):
@@ -1112,56 +1796,142 @@ def settings_menu():
                     settings_running = False
 
 
+def profile_menu():
+    """
+    Display the profile menu -> the profiles are listed by their last use, a page at a time
+    Clicking a profile switches to it, a new profile is named with the keyboard
+    """
+    page = 0
+    new_name = None  # name typed for a new profile, None when not typing
+
+    while True:
+        names = profile_store.names(page * profiles_per_page, profiles_per_page + 1)
+        has_next_page = len(names) > profiles_per_page
+        names = names[:profiles_per_page]
+
+        renderer.fill(colors["screen_color"])
+        profiles_title = layout.render("Profiles", colors["dark_text"])
+        profiles_title_rect = profiles_title.get_rect(center=layout.point(window_width / 2, 60))
+        renderer.blit(profiles_title, profiles_title_rect)
+
+        name_rects = []
+        for index, name in enumerate(names):
+            name_color = colors["other"] if name == current_profile else colors["dark_text"]
+            name_text = layout.render(name, name_color)
+            name_rect = name_text.get_rect(center=layout.point(window_width / 2, 110 + index * 40))
+            renderer.blit(name_text, name_rect)
+            name_rects.append((name_rect, name))
+
+        previous_rect = next_rect = None
+        if page > 0:
+            previous_text = layout.render("<", colors["dark_text"])
+            previous_rect = previous_text.get_rect(center=layout.point(window_width / 2 - 60, 320))
+            renderer.blit(previous_text, previous_rect)
+        if has_next_page:
+            next_text = layout.render(">", colors["dark_text"])
+            next_rect = next_text.get_rect(center=layout.point(window_width / 2 + 60, 320))
+            renderer.blit(next_text, next_rect)
+
+        if new_name is None:
+            new_profile_text = layout.render("New Profile", colors["dark_text"])
+        else:
+            new_profile_text = layout.render(f"Name: {new_name}_", colors["dark_text"])
+        new_profile_rect = new_profile_text.get_rect(center=layout.point(window_width / 2, 370))
+        renderer.blit(new_profile_text, new_profile_rect)
+
+        back_text = layout.render("Back to Menu", colors["dark_text"])
+        back_rect = back_text.get_rect(center=layout.point(window_width / 2, 420))
+        renderer.blit(back_text, back_rect)
+
+        renderer.present()
+
+        for event in pygame.event.get():
+            handle_window_event(event)
+            if event.type == pygame.QUIT:
+                pygame.quit()
+                return
+            elif event.type == pygame.KEYDOWN and new_name is not None:
+                if event.key == pygame.K_RETURN:
+                    if valid_profile_name(new_name):
+                        switch_profile(new_name.strip())
+                        return
+                elif event.key == pygame.K_ESCAPE:
+                    new_name = None
+                elif event.key == pygame.K_BACKSPACE:
+                    new_name = new_name[:-1]
+                elif valid_profile_name(new_name + event.unicode):
+                    new_name += event.unicode
+            elif event.type == pygame.MOUSEBUTTONDOWN:
+                play_sound("click")
+                mouse_pos = event.pos
+                for name_rect, name in name_rects:
+                    if name_rect.collidepoint(mouse_pos):
+                        if name != current_profile:
+                            switch_profile(name)
+                        return
+                if previous_rect is not None and previous_rect.collidepoint(mouse_pos):
+                    page -= 1
+                elif next_rect is not None and next_rect.collidepoint(mouse_pos):
+                    page += 1
+                elif new_profile_rect.collidepoint(mouse_pos):
+                    new_name = ''
+                elif back_rect.collidepoint(mouse_pos):
+                    return
+
+        timer.tick(fps)
+
+
 def credits_menu():
     """
     Display the credits screen with the author's name and links to GitHub and itch.io
     """
     credits_running = True
     while credits_running:
-        screen.fill(colors["screen_color"])
+        renderer.fill(colors["screen_color"])
 
         # Display the title and your name
-        title_text = font.render("Credits", True, colors["dark_text"])
-        title_rect = title_text.get_rect(center=(window_width / 2, 50))
-        screen.blit(title_text, title_rect)
+        title_text = layout.render("Credits", colors["dark_text"])
+        title_rect = title_text.get_rect(center=layout.point(window_width / 2, 50))
+        renderer.blit(title_text, title_rect)
 
-        name_text = font.render("Julie Vondráčková", True, colors["dark_text"])
-        name_rect = name_text.get_rect(center=(window_width / 2, 100))
-        screen.blit(name_text, name_rect)
+        name_text = layout.render("Julie Vondráčková", colors["dark_text"])
+        name_rect = name_text.get_rect(center=layout.point(window_width / 2, 100))
+        renderer.blit(name_text, name_rect)
 
         # Link to GitHub
-        github_text = font.render("Visit my GitHub", True, colors["dark_text"])
-        github_rect = github_text.get_rect(center=(window_width / 2, 180))
-        screen.blit(github_text, github_rect)
+        github_text = layout.render("Visit my GitHub", colors["dark_text"])
+        github_rect = github_text.get_rect(center=layout.point(window_width / 2, 180))
+        renderer.blit(github_text, github_rect)
 
         # Link to itch.io
-        itch_text = font.render("Visit my itch.io", True, colors["dark_text"])
-        itch_rect = itch_text.get_rect(center=(window_width / 2, 230))
-        screen.blit(itch_text, itch_rect)
+        itch_text = layout.render("Visit my itch.io", colors["dark_text"])
+        itch_rect = itch_text.get_rect(center=layout.point(window_width / 2, 230))
+        renderer.blit(itch_text, itch_rect)
 
         # Display an image if desired (optional)
         try:
             image = pygame.image.load('assets/profile.png')
-            image_rect = image.get_rect(center=(window_width / 2, 300))
-            screen.blit(image, image_rect)
+            image_rect = image.get_rect(center=layout.point(window_width / 2, 300))
+            renderer.blit(image, image_rect)
         except pygame.error:
-            error_text = font.render("Failed to load image", True, colors["dark_text"])
-            error_rect = error_text.get_rect(center=(window_width / 2, 300))
-            screen.blit(error_text, error_rect)
+            error_text = layout.render("Failed to load image", colors["dark_text"])
+            error_rect = error_text.get_rect(center=layout.point(window_width / 2, 300))
+            renderer.blit(error_text, error_rect)
 
         # Back button
-        back_text = font.render("Back to Settings", True, colors["dark_text"])
-        back_rect = back_text.get_rect(center=(window_width / 2, 400))
-        screen.blit(back_text, back_rect)
+        back_text = layout.render("Back to Settings", colors["dark_text"])
+        back_rect = back_text.get_rect(center=layout.point(window_width / 2, 400))
+        renderer.blit(back_text, back_rect)
 
-        pygame.display.flip()
+        renderer.present()
 
         for event in pygame.event.get():
+            handle_window_event(event)
             if event.type == pygame.QUIT:
                 pygame.quit()
                 credits_running = False
             elif event.type == pygame.MOUSEBUTTONDOWN:
-                play_sound(mouse_click_sound)
+                play_sound("click")
                 if back_rect.collidepoint(event.pos):
                     credits_running = False
                 elif github_rect.collidepoint(event.pos):
@@ -1173,12 +1943,47 @@ def credits_menu():
 # endregion MAIN MENU
 
 # region MAIN GAME LOOP
+def parse_arguments():
+    """
+    Parse the command line options of the game
+    Return:
+        argparse.Namespace -> parsed options
+    """
+    parser = argparse.ArgumentParser(description="2048 game")
+    parser.add_argument('--connect', metavar='HOST:PORT', help="play on a game server instead of locally")
+    parser.add_argument('--spectate', type=int, metavar='SESSION', help="only watch the session with this id")
+    parser.add_argument('--telemetry', metavar='TARGET',
+                        help="write telemetry events to an NDJSON file or to udp://HOST:PORT (statsd)")
+    parser.add_argument('--renderer', choices=renderer_names, default='software',
+                        help="draw with software blits or with SDL2 textures (falls back to software)")
+    parser.add_argument('--audio-buffer', type=int, default=default_buffer, metavar='SAMPLES',
+                        help="samples in the mixer buffer, smaller -> lower sound latency")
+    return parser.parse_args()
+
+
 def main():
     """
     Run the main menu and the game loop based on the user's choice
     """
     global run
+    arguments = parse_arguments()
+    if arguments.telemetry:
+        telemetry.start(open_sink(arguments.telemetry))
+    set_renderer(arguments.renderer)
+    audio.open(arguments.audio_buffer)
+
     load_game_data()
+    restore_journal_game()
+
+    if arguments.connect:
+        host, _, port = arguments.connect.rpartition(':')
+        client = ThreadedGameClient(host or '127.0.0.1', int(port), arguments.spectate)
+        network_game_loop(client, arguments.spectate is not None)
+        game_journal.close()
+        audio.close()
+        telemetry.stop()
+        return
+
     run, mode_changed = main_menu()
     while run is not None and run is not False:
         if mode_changed:
@@ -1188,14 +1993,30 @@ def main():
             elif run == 'timed':
                 reset_timed_game_data()
                 timed_game_loop()
+            elif run == 'versus':
+                reset_versus_game_data()
+                versus_game_loop()
+            elif run == 'ai':
+                ai_game_loop()
+            elif run == 'puzzle':
+                puzzle_game_loop()
         else:
             if run == 'classic':
                 classic_game_loop()
             elif run == 'timed':
                 timed_game_loop()
+            elif run == 'versus':
+                versus_game_loop()
+            elif run == 'ai':
+                ai_game_loop()
+            elif run == 'puzzle':
+                puzzle_game_loop()
 
         run, mode_changed = main_menu()
     save_game_data()
+    game_journal.close()
+    audio.close()
+    telemetry.stop()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,379 @@
+import argparse  # for the command line options
+import multiprocessing  # for the rollouts on all cores
+import os  # for the number of cores
+import random  # for the spawns of the played games
+import time  # for the time budget and the rollouts per second
+from multiprocessing import shared_memory  # for the boards shared with the workers
+import numpy as np  # for the vectorized rollouts
+from bitboard import directions, move_board, empty_shifts, max_exponent
+from ntuple import afterstates, spawn_pieces
+from opening_book import find_opening_book
+
+"""
+---------------------------------------------------------------------
+    Monte Carlo rollout player of 2048
+---------------------------------------------------------------------
+    - Every possible move of move_board (bitboard.py) is scored by many random playouts:
+      value of a move = score of its merges + average score of random games played after it
+    - A playout spawns a piece after every move (2 with 90 %, 4 with 10 %) and takes a random move which changes the board
+    - Playouts run in batches with NumPy (the afterstates of ntuple.py), one batch plays every move batch_size times
+    - The rollouts run in a process pool on boards in shared memory: the position, the batch boards of every worker
+      and the results -> a move sends only (slot, deadline, rollout moves) to every worker, nothing is pickled per rollout
+    - Every worker plays batches until the time budget of the move is used up (a batch still running stops
+      at the deadline) and adds its sums to its slot,
+      the player averages all slots -> one slot per core, it scales with the number of cores
+    - Positions of the opening book (opening_book.py) are played from the book without rollouts
+
+Usage: python mcts.py play --budget 0.1 --workers 32
+       python mcts.py scaling --budget 1
+---------------------------------------------------------------------
+"""
+
+# region VARIABLES
+"""
+Variables of the player
+    - default_batch_size: int -> playouts of every move in one batch of a worker
+    - worker_memory: SharedMemory -> shared block attached by the worker process
+    - worker_arrays: tuple -> (results, position, batches) views of the shared block in the worker
+    - worker_batch_size: int -> playouts of every move in one batch of the worker
+    - worker_rng: np.random.Generator -> random generator of the worker process
+"""
+default_batch_size = 64
+
+worker_memory = None
+worker_arrays = None
+worker_batch_size = default_batch_size
+worker_rng = None
+
+
+# endregion VARIABLES
+
+# region SHARED BOARDS
+
+def shared_size(slots, batch_size):
+    """
+    Size of the shared block
+    Args:
+        slots: int -> number of worker slots
+        batch_size: int -> playouts of every move in one batch
+    Return:
+        int -> size in bytes
+    """
+    return slots * len(directions) * 2 * 8 + 16 + slots * len(directions) * batch_size * 16
+
+
+def shared_arrays(buffer, slots, batch_size):
+    """
+    Views of the shared block, the float results come first so they stay aligned
+    Args:
+        buffer: memoryview -> buffer of the shared block
+        slots: int -> number of worker slots
+        batch_size: int -> playouts of every move in one batch
+    Return:
+        results: np.ndarray -> (slots, moves, 2) sum of the values and number of playouts of every move
+        position: np.ndarray -> (16) exponents of the searched board
+        batches: np.ndarray -> (slots, moves * batch_size, 16) exponents of the playout boards of every worker
+    """
+    results = np.ndarray((slots, len(directions), 2), dtype=np.float64, buffer=buffer)
+    offset = results.nbytes
+    position = np.ndarray(16, dtype=np.uint8, buffer=buffer, offset=offset)
+    offset += position.nbytes
+    batches = np.ndarray((slots, len(directions) * batch_size, 16), dtype=np.uint8, buffer=buffer, offset=offset)
+    return results, position, batches
+
+
+def unpack_exponents(board):
+    """
+    Exponents of the packed board, cell by cell
+    Args:
+        board: int -> packed board
+    Return:
+        list -> 16 exponents
+    """
+    return [(board >> (4 * cell)) & 0xF for cell in range(16)]
+
+
+# endregion SHARED BOARDS
+
+# region ROLLOUTS
+
+def play_batch(position, boards, rng, rollout_moves=None, deadline=None):
+    """
+    Play one batch of random playouts after every possible move of the position
+    All playouts of a batch stop at the deadline after the same number of moves, so the moves stay comparable
+    Args:
+        position: np.ndarray -> (16) exponents of the board
+        boards: np.ndarray -> (moves * batch_size, 16) playout boards, overwritten
+        rng: np.random.Generator -> random generator
+        rollout_moves: int -> moves of a playout (None -> until the game is over)
+        deadline: float -> time.monotonic time at which the playouts stop (None -> no deadline)
+    Return:
+        np.ndarray -> (moves) sum of the values of the playouts of every move, 0 for impossible moves
+        np.ndarray -> (moves) True if the move is possible
+    """
+    batch_size = len(boards) // len(directions)
+    first_after, first_scores, first_changed = afterstates(position[None, :])
+    boards[:] = np.repeat(first_after[0], batch_size, axis=0)
+    scores = np.repeat(first_scores[0], batch_size).astype(np.float64)
+    spawn_pieces(boards, rng)
+
+    # impossible moves are not played
+    alive = np.repeat(first_changed[0], batch_size)
+    played = 0
+    while alive.any() and (rollout_moves is None or played < rollout_moves):
+        if deadline is not None and time.monotonic() >= deadline:
+            break
+        live = np.flatnonzero(alive)
+        live_boards = boards[live]
+        after, rewards, changed = afterstates(live_boards)
+        rows = np.arange(len(live))
+        # random move among the moves which change the board
+        choice = (rng.random(changed.shape, dtype=np.float32) * changed).argmax(axis=1)
+        moved = changed.any(axis=1)
+        live_boards = after[rows, choice]
+        scores[live] += rewards[rows, choice]
+        moving = live_boards[moved]
+        spawn_pieces(moving, rng)
+        live_boards[moved] = moving
+        boards[live] = live_boards
+        alive[live[~moved]] = False
+        played += 1
+
+    return scores.reshape(len(directions), batch_size).sum(axis=1), first_changed[0]
+
+
+def init_worker(memory_name, slots, batch_size):
+    """
+    Initialize a worker process -> attach the shared block
+    Args:
+        memory_name: str -> name of the shared block
+        slots: int -> number of worker slots
+        batch_size: int -> playouts of every move in one batch
+    """
+    global worker_memory, worker_arrays, worker_batch_size, worker_rng
+    worker_memory = shared_memory.SharedMemory(name=memory_name)
+    worker_arrays = shared_arrays(worker_memory.buf, slots, batch_size)
+    worker_batch_size = batch_size
+    worker_rng = np.random.default_rng()
+
+
+def rollout_task(task):
+    """
+    Play batches of playouts of the shared position until the deadline, the last batch stops at the deadline
+    Args:
+        task: tuple -> (slot, deadline of time.monotonic, rollout moves)
+    """
+    slot, deadline, rollout_moves = task
+    results, position, batches = worker_arrays
+    sums = np.zeros(len(directions))
+    counts = np.zeros(len(directions))
+    while True:
+        batch_sums, possible = play_batch(position, batches[slot], worker_rng, rollout_moves, deadline)
+        sums += batch_sums
+        counts += possible * worker_batch_size
+        if time.monotonic() >= deadline:
+            break
+    results[slot, :, 0] = sums
+    results[slot, :, 1] = counts
+
+
+# endregion ROLLOUTS
+
+# region PLAYER
+
+class MonteCarloPlayer:
+    """
+    Monte Carlo rollout player, the rollouts of every move run on all cores
+    The process pool and the shared block are created on the first move, close the player to release them
+    Args:
+        time_budget: float -> seconds of rollouts for every move
+        workers: int -> number of worker processes (None -> all cores)
+        batch_size: int -> playouts of every move in one batch of a worker
+        rollout_moves: int -> moves of a playout (None -> until the game is over)
+        book: OpeningBook -> mapped opening book consulted before the rollouts (None -> always roll out)
+    """
+
+    def __init__(self, time_budget=0.1, workers=None, batch_size=default_batch_size, rollout_moves=None, book=None):
+        self.time_budget = time_budget
+        self.workers = workers or os.cpu_count() or 1
+        self.batch_size = batch_size
+        self.rollout_moves = rollout_moves
+        self.book = book
+        self.memory = None
+        self.arrays = None
+        self.pool = None
+        self.rollouts = 0
+        self.rollouts_per_second = 0.0
+
+    def start(self):
+        """
+        Create the shared block and the process pool, called by the first move
+        """
+        if self.pool is not None:
+            return
+        self.memory = shared_memory.SharedMemory(create=True, size=shared_size(self.workers, self.batch_size))
+        self.arrays = shared_arrays(self.memory.buf, self.workers, self.batch_size)
+        self.pool = multiprocessing.Pool(self.workers, initializer=init_worker,
+                                         initargs=(self.memory.name, self.workers, self.batch_size))
+
+    def close(self):
+        """
+        Stop the worker processes and free the shared block
+        """
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
+        if self.memory is not None:
+            # the views have to be released before the block is closed
+            self.arrays = None
+            self.memory.close()
+            self.memory.unlink()
+            self.memory = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def move_values(self, board):
+        """
+        Average value of the playouts of every possible move, the rollouts of the last call are counted
+        in rollouts and rollouts_per_second
+        Args:
+            board: int -> packed board
+        Return:
+            dict -> direction -> merge score of the move + average playout score after it,
+                    moves which do not change the board are left out
+        """
+        if all(move_board(board, move_direction)[0] == board for move_direction in directions):
+            return {}
+        self.start()
+        results, position, _ = self.arrays
+        position[:] = unpack_exponents(board)
+
+        start = time.monotonic()
+        tasks = [(slot, start + self.time_budget, self.rollout_moves) for slot in range(self.workers)]
+        self.pool.map(rollout_task, tasks, chunksize=1)
+        elapsed = time.monotonic() - start
+
+        sums = results[:, :, 0].sum(axis=0)
+        counts = results[:, :, 1].sum(axis=0)
+        self.rollouts = int(counts.sum())
+        self.rollouts_per_second = self.rollouts / elapsed if elapsed > 0 else 0.0
+        return {move_direction: float(sums[index] / counts[index])
+                for index, move_direction in enumerate(directions) if counts[index] > 0}
+
+    def best_move(self, board):
+        """
+        Move with the best average playout, a position of the book is answered from the book
+        Args:
+            board: int -> packed board
+        Return:
+            str -> best direction, None if no move is possible
+        """
+        move_direction = self.book.best_move(board) if self.book is not None else None
+        if move_direction is not None:
+            self.rollouts = 0
+            return move_direction
+        values = self.move_values(board)
+        if not values:
+            return None
+        return max(values, key=values.get)
+
+
+# endregion PLAYER
+
+# region MAIN
+
+def play_game(player, rng, report_interval=100):
+    """
+    Play one game with the player on packed boards
+    Args:
+        player: MonteCarloPlayer -> player
+        rng: random.Random -> random generator of the spawns
+        report_interval: int -> moves between two progress lines
+    Return:
+        score: int -> score of the game
+        moves: int -> number of moves
+        rollouts_per_second: float -> average rollouts per second of the game
+    """
+    board = 0
+    for _ in range(2):
+        board |= (1 if rng.random() < 0.9 else 2) << rng.choice(empty_shifts(board))
+    score = 0
+    moves = 0
+    rollouts = 0
+    rollout_time = 0.0
+    while True:
+        move_direction = player.best_move(board)
+        if move_direction is None:
+            break
+        # book moves have no rollouts
+        if player.rollouts:
+            rollouts += player.rollouts
+            rollout_time += player.rollouts / player.rollouts_per_second
+        board, move_score = move_board(board, move_direction)
+        score += move_score
+        board |= (1 if rng.random() < 0.9 else 2) << rng.choice(empty_shifts(board))
+        moves += 1
+        if moves % report_interval == 0:
+            print(f"move {moves}: score {score}, max piece {1 << max_exponent(board)}, "
+                  f"rollouts per second: {player.rollouts_per_second:.0f}")
+    return score, moves, rollouts / rollout_time if rollout_time else 0.0
+
+
+def scaling(time_budget, max_workers, batch_size):
+    """
+    Rollouts per second of the start position with 1, 2, 4, ... workers
+    Args:
+        time_budget: float -> seconds of rollouts of every measured move
+        max_workers: int -> largest number of workers
+        batch_size: int -> playouts of every move in one batch
+    """
+    board = 1 | (1 << 20)
+    workers = 1
+    while True:
+        with MonteCarloPlayer(time_budget, workers, batch_size) as player:
+            # the first move starts the pool, it is not measured
+            player.move_values(board)
+            player.move_values(board)
+            print(f"workers: {workers}, rollouts per second: {player.rollouts_per_second:.0f}")
+        if workers >= max_workers:
+            break
+        workers = min(workers * 2, max_workers)
+
+
+def main():
+    """
+    Parse the command line options and play games or measure the scaling over the cores
+    """
+    parser = argparse.ArgumentParser(description="Monte Carlo rollout player of 2048")
+    parser.add_argument('command', choices=['play', 'scaling'], help="play games or measure the rollouts per second")
+    parser.add_argument('--budget', type=float, default=0.1, help="seconds of rollouts per move")
+    parser.add_argument('--workers', type=int, default=None, help="worker processes (default: all cores)")
+    parser.add_argument('--batch-size', type=int, default=default_batch_size,
+                        help="playouts of every move in one batch")
+    parser.add_argument('--rollout-moves', type=int, default=None, help="moves of a playout (default: until game over)")
+    parser.add_argument('--games', type=int, default=1, help="number of played games")
+    parser.add_argument('--seed', type=int, default=None, help="seed of the spawns of the played games")
+    parser.add_argument('--no-book', action='store_true', help="roll out every move, even the moves of the book")
+    args = parser.parse_args()
+
+    if args.command == 'scaling':
+        scaling(args.budget, args.workers or os.cpu_count() or 1, args.batch_size)
+        return
+
+    rng = random.Random(args.seed)
+    book = None if args.no_book else find_opening_book()
+    with MonteCarloPlayer(args.budget, args.workers, args.batch_size, args.rollout_moves, book) as player:
+        for game in range(args.games):
+            score, moves, rollouts_per_second = play_game(player, rng)
+            print(f"game {game + 1}: score {score}, moves {moves}, rollouts per second: {rollouts_per_second:.0f}")
+
+
+if __name__ == "__main__":
+    main()
+
+# endregion MAIN
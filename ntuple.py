@@ -0,0 +1,423 @@
+import argparse  # for the command line options
+import json  # for the weight file description
+import multiprocessing  # for training on all cores
+import os  # for the weight file paths
+import time  # for the training statistics
+import numpy as np  # for the weights and the vectorized training
+from bitboard import directions, move_board, pack_board
+from symmetry import cell_maps
+from rl_env import row_left_array, row_right_array, row_score_array, row_cells_array, row_weights
+
+"""
+---------------------------------------------------------------------
+    N-tuple network player of 2048
+---------------------------------------------------------------------
+    - The value of a board is the sum of weights looked up by the pieces under fixed groups of cells (tuples)
+    - Every tuple is used in all 8 rotations and reflections of the board, they share the same weights
+    - The player takes the move with the best merge score + value of the board after the move (afterstate)
+    - Training is TD(0) afterstate learning, many games are played at once with NumPy
+    - Training processes share one weight file mapped into memory and update it without locks
+    - The game maps the weight file read only -> loading is instant and costs no memory until used
+
+Weight files
+    - <name>.npy -> flat float32 weights of all tuples
+    - <name>.json -> tuples of the network and the number of trained games
+
+Usage: python ntuple.py train --games 100000 --workers 4
+---------------------------------------------------------------------
+"""
+
+# region VARIABLES
+"""
+Variables of the network
+    - default_weights_file: str -> weight file used by the game
+    - tuple_presets: dict -> name -> tuples (cells are numbered row by row, 0 to 15)
+"""
+default_weights_file = 'assets/save_files/ntuple_weights.npy'
+
+tuple_presets = {
+    "small": [(0, 1, 2, 3), (4, 5, 6, 7), (0, 1, 4, 5), (1, 2, 5, 6), (5, 6, 9, 10)],
+    "standard": [(0, 1, 2, 3, 4, 5), (4, 5, 6, 7, 8, 9), (0, 1, 2, 4, 5, 6), (4, 5, 6, 8, 9, 10)]
+}
+
+
+# endregion VARIABLES
+
+# region NETWORK
+
+class NTupleNetwork:
+    """
+    N-tuple network over the exponents of the board
+    Args:
+        tuples: list -> tuples of cells, all of the same length
+        weights: np.ndarray -> flat float32 weights (None -> new zero weights)
+    """
+
+    def __init__(self, tuples, weights=None):
+        self.tuples = [tuple(cells) for cells in tuples]
+        self.tuple_length = len(self.tuples[0])
+        if any(len(cells) != self.tuple_length for cells in self.tuples):
+            raise ValueError("all tuples of the network must have the same length")
+
+        self.weights_per_tuple = 16 ** self.tuple_length
+        self.size = self.weights_per_tuple * len(self.tuples)
+        if weights is None:
+            weights = np.zeros(self.size, dtype=np.float32)
+        elif weights.shape != (self.size,):
+            raise ValueError(f"weights have shape {weights.shape}, the tuples need ({self.size},)")
+        self.weights = weights
+
+        # every tuple in every symmetry is one feature, its cells and the start of its weights
+        feature_cells = []
+        feature_offsets = []
+        for index, cells in enumerate(self.tuples):
+            for cell_map in cell_maps:
+                feature_cells.append([cell_map[cell] for cell in cells])
+                feature_offsets.append(index * self.weights_per_tuple)
+        self.feature_cells = np.array(feature_cells, dtype=np.intp)
+        self.feature_offsets = np.array(feature_offsets, dtype=np.int64)
+        self.feature_shifts = np.arange(self.tuple_length, dtype=np.int64) * 4
+        # the same as python lists for evaluating single boards without NumPy overhead
+        self.feature_bit_shifts = [[4 * cell for cell in cells] for cells in feature_cells]
+
+    def feature_indexes(self, boards):
+        """
+        Weight indexes of all features of many boards
+        Args:
+            boards: np.ndarray -> exponents of the boards (..., 16)
+        Return:
+            np.ndarray -> weight indexes (..., features)
+        """
+        pieces = boards[..., self.feature_cells].astype(np.int64)
+        return (pieces << self.feature_shifts).sum(axis=-1) + self.feature_offsets
+
+    def values(self, boards):
+        """
+        Values of many boards
+        Args:
+            boards: np.ndarray -> exponents of the boards (..., 16)
+        Return:
+            np.ndarray -> values of the boards
+        """
+        return self.weights[self.feature_indexes(boards)].sum(axis=-1)
+
+    def value(self, board):
+        """
+        Value of one packed board
+        Args:
+            board: int -> packed board (bitboard.py)
+        Return:
+            float -> value of the board
+        """
+        weights = self.weights
+        total = 0.0
+        for offset, bit_shifts in zip(self.feature_offsets.tolist(), self.feature_bit_shifts):
+            index = offset
+            shift = 0
+            for bit_shift in bit_shifts:
+                index += ((board >> bit_shift) & 0xF) << shift
+                shift += 4
+            total += weights[index]
+        return float(total)
+
+    def move_values(self, board):
+        """
+        Expected score of every possible move -> merge score + value of the board after the move
+        Args:
+            board: int -> packed board
+        Return:
+            dict -> direction -> expected score of the rest of the game, empty if no move is possible
+        """
+        values = {}
+        for move_direction in directions:
+            new_board, move_score = move_board(board, move_direction)
+            if new_board != board:
+                values[move_direction] = move_score + self.value(new_board)
+        return values
+
+    def best_move(self, board):
+        """
+        Find the move with the best merge score + value of the board after the move
+        Args:
+            board: int -> packed board
+        Return:
+            str -> best direction, None if no move is possible
+        """
+        values = self.move_values(board)
+        if not values:
+            return None
+        return max(values, key=values.get)
+
+    def best_move_values(self, board_values):
+        """
+        Find the best move of a board in the format of the game
+        Args:
+            board_values: list -> values of the board
+        Return:
+            str -> best direction, None if no move is possible
+        """
+        return self.best_move(pack_board(board_values))
+
+
+def create_weights_file(path, tuples):
+    """
+    Create a new weight file of zeros with its description
+    Args:
+        path: str -> path of the .npy weight file
+        tuples: list -> tuples of the network
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    network = NTupleNetwork(tuples)
+    weights = np.lib.format.open_memmap(path, mode='w+', dtype=np.float32, shape=(network.size,))
+    weights.flush()
+    del weights
+    save_description(path, tuples, 0)
+
+
+def save_description(path, tuples, games):
+    """
+    Save the description of a weight file
+    Args:
+        path: str -> path of the .npy weight file
+        tuples: list -> tuples of the network
+        games: int -> number of trained games
+    """
+    with open(os.path.splitext(path)[0] + '.json', 'w') as f:
+        json.dump({"tuples": [list(cells) for cells in tuples], "games": games}, f, indent=4)
+
+
+def load_description(path):
+    """
+    Load the description of a weight file
+    Args:
+        path: str -> path of the .npy weight file
+    Return:
+        dict -> tuples and number of trained games
+    """
+    with open(os.path.splitext(path)[0] + '.json', 'r') as f:
+        return json.load(f)
+
+
+def load_network(path=default_weights_file, writable=False):
+    """
+    Map a weight file into memory, nothing is read until the weights are used
+    Args:
+        path: str -> path of the .npy weight file
+        writable: bool -> True to map it for training (changes go to the file)
+    Return:
+        NTupleNetwork -> network using the mapped weights
+    """
+    weights = np.load(path, mmap_mode='r+' if writable else 'r')
+    return NTupleNetwork(load_description(path)["tuples"], weights)
+
+
+# endregion NETWORK
+
+# region TRAINING
+
+def afterstates(boards):
+    """
+    Boards after all four moves of many boards
+    Args:
+        boards: np.ndarray -> exponents of the boards (games, 16)
+    Return:
+        after: np.ndarray -> exponents after each move (games, 4, 16), moves in the order of directions
+        rewards: np.ndarray -> merge scores (games, 4)
+        changed: np.ndarray -> True where the move changes the board (games, 4)
+    """
+    grid = boards.reshape(-1, 4, 4).astype(np.uint16)
+    row_lines = grid @ row_weights
+    column_lines = grid.transpose(0, 2, 1) @ row_weights
+    games = len(boards)
+
+    after = np.empty((games, 4, 4, 4), dtype=np.uint8)
+    after[:, 0] = row_cells_array[row_left_array[column_lines]].transpose(0, 2, 1)
+    after[:, 1] = row_cells_array[row_right_array[column_lines]].transpose(0, 2, 1)
+    after[:, 2] = row_cells_array[row_left_array[row_lines]]
+    after[:, 3] = row_cells_array[row_right_array[row_lines]]
+    after = after.reshape(games, 4, 16)
+
+    column_scores = row_score_array[column_lines].sum(axis=1)
+    row_scores = row_score_array[row_lines].sum(axis=1)
+    rewards = np.stack([column_scores, column_scores, row_scores, row_scores], axis=1)
+    changed = (after != boards[:, None, :]).any(axis=2)
+    return after, rewards, changed
+
+
+def spawn_pieces(boards, rng):
+    """
+    Spawn one piece on a random empty cell of every board (2 with 90 %, 4 with 10 %)
+    Args:
+        boards: np.ndarray -> exponents of the boards (games, 16), changed in place
+        rng: np.random.Generator -> random generator
+    """
+    games = len(boards)
+    empty = boards == 0
+    cell = (rng.random((games, 16), dtype=np.float32) * empty).argmax(axis=1)
+    value = np.where(rng.random(games) < 0.9, 1, 2).astype(np.uint8)
+    rows = np.arange(games)
+    boards[rows, cell] = np.where(empty.any(axis=1), value, boards[rows, cell])
+
+
+def train(network, games, parallel_games=256, learning_rate=0.0025, seed=None, report=None):
+    """
+    TD(0) afterstate learning -> many games are played at once, the weights are updated after every move
+    Args:
+        network: NTupleNetwork -> network to train (its weights are changed in place)
+        games: int -> number of games to finish
+        parallel_games: int -> games played at once
+        learning_rate: float -> learning rate of the whole value (divided between the features)
+        seed: int -> seed of the random generator
+        report: callable -> called with the list of scores of every finished batch of games (None -> no reports)
+    Return:
+        list -> scores of the finished games
+    """
+    rng = np.random.default_rng(seed)
+    feature_rate = learning_rate / network.feature_cells.shape[0]
+    boards = np.zeros((parallel_games, 16), dtype=np.uint8)
+    spawn_pieces(boards, rng)
+    spawn_pieces(boards, rng)
+    scores = np.zeros(parallel_games, dtype=np.int64)
+    previous_after = np.zeros((parallel_games, 16), dtype=np.uint8)
+    has_previous = np.zeros(parallel_games, dtype=bool)
+    finished_scores = []
+    rows = np.arange(parallel_games)
+
+    while len(finished_scores) < games:
+        after, rewards, changed = afterstates(boards)
+        after_values = network.values(after)
+        move_values = np.where(changed, rewards + after_values, -np.inf)
+        actions = move_values.argmax(axis=1)
+        alive = changed.any(axis=1)
+
+        # V(previous afterstate) -> reward + V(new afterstate), or 0 when the game is over
+        targets = np.where(alive, rewards[rows, actions] + after_values[rows, actions], 0.0)
+        update = has_previous
+        if update.any():
+            indexes = network.feature_indexes(previous_after[update])
+            errors = targets[update] - network.weights[indexes].sum(axis=1)
+            np.add.at(network.weights, indexes, (feature_rate * errors)[:, None].astype(np.float32))
+
+        previous_after[:] = after[rows, actions]
+        has_previous[:] = alive
+        scores += np.where(alive, rewards[rows, actions], 0)
+        boards[:] = np.where(alive[:, None], previous_after, boards)
+        spawn_pieces(boards, rng)
+
+        lost = ~alive
+        if lost.any():
+            finished = scores[lost].tolist()
+            finished_scores += finished
+            if report is not None:
+                report(finished)
+            boards[lost] = 0
+            scores[lost] = 0
+            lost_boards = boards[lost]
+            spawn_pieces(lost_boards, rng)
+            spawn_pieces(lost_boards, rng)
+            boards[lost] = lost_boards
+
+    return finished_scores
+
+
+def train_worker(task):
+    """
+    Training process -> trains on the shared weight file without locks (Hogwild)
+    Args:
+        task: tuple -> (weight file path, games, parallel games, learning rate, seed)
+    Return:
+        list -> scores of the finished games
+    """
+    path, games, parallel_games, learning_rate, seed = task
+    network = load_network(path, writable=True)
+    scores = train(network, games, parallel_games, learning_rate, seed)
+    network.weights.flush()
+    return scores
+
+
+def train_parallel(path, games, workers=None, parallel_games=256, learning_rate=0.0025, rounds=10):
+    """
+    Train the weight file on all cores, the games are split into rounds to print the progress
+    Args:
+        path: str -> path of the .npy weight file
+        games: int -> number of games
+        workers: int -> number of processes (None -> all cores)
+        parallel_games: int -> games played at once by every process
+        learning_rate: float -> learning rate
+        rounds: int -> number of progress reports
+    """
+    workers = workers or os.cpu_count() or 1
+    description = load_description(path)
+    games_per_task = max(1, games // (workers * rounds))
+    seed = int(time.time())
+    with multiprocessing.Pool(workers) as pool:
+        for round_index in range(rounds):
+            start = time.perf_counter()
+            tasks = [(path, games_per_task, parallel_games, learning_rate, seed + round_index * workers + worker)
+                     for worker in range(workers)]
+            scores = [score for task_scores in pool.map(train_worker, tasks) for score in task_scores]
+            description["games"] += len(scores)
+            save_description(path, description["tuples"], description["games"])
+            print(f"games: {description['games']}, average score: {np.mean(scores):.0f}, "
+                  f"max score: {max(scores)}, time: {time.perf_counter() - start:.1f} s")
+
+
+# endregion TRAINING
+
+# region MAIN
+
+def benchmark(path, moves):
+    """
+    Measure how many moves per second the network plays with the single board evaluation of the game
+    Args:
+        path: str -> path of the .npy weight file
+        moves: int -> number of moves to play
+    """
+    import random  # only the benchmark spawns on packed boards
+    from bitboard import empty_shifts
+
+    network = load_network(path)
+    rng = random.Random(0)
+    board = (1 << 4 * rng.randrange(16)) | 1
+    played = 0
+    start = time.perf_counter()
+    while played < moves:
+        move_direction = network.best_move(board)
+        if move_direction is None:
+            board = (1 << 4 * rng.randrange(16)) | 1
+            continue
+        board, _ = move_board(board, move_direction)
+        board |= (1 if rng.random() < 0.9 else 2) << rng.choice(empty_shifts(board))
+        played += 1
+    print(f"moves per second: {moves / (time.perf_counter() - start):.0f}")
+
+
+def main():
+    """
+    Parse the command line options and train or benchmark the network
+    """
+    parser = argparse.ArgumentParser(description="N-tuple network for 2048")
+    parser.add_argument('command', choices=['train', 'benchmark'], help="train the weights or measure the play speed")
+    parser.add_argument('--weights', default=default_weights_file, help="path of the .npy weight file")
+    parser.add_argument('--tuples', default='small', choices=list(tuple_presets), help="tuples of a new network")
+    parser.add_argument('--games', type=int, default=20000, help="number of training games")
+    parser.add_argument('--workers', type=int, default=None, help="training processes (default: all cores)")
+    parser.add_argument('--parallel-games', type=int, default=256, help="games played at once by every process")
+    parser.add_argument('--learning-rate', type=float, default=0.0025, help="learning rate")
+    parser.add_argument('--moves', type=int, default=10000, help="moves played by the benchmark")
+    args = parser.parse_args()
+
+    if args.command == 'train':
+        if not os.path.exists(args.weights):
+            create_weights_file(args.weights, tuple_presets[args.tuples])
+        train_parallel(args.weights, args.games, args.workers, args.parallel_games, args.learning_rate)
+    else:
+        benchmark(args.weights, args.moves)
+
+
+if __name__ == "__main__":
+    main()
+
+# endregion MAIN
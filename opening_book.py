@@ -0,0 +1,322 @@
+import argparse  # for the command line options
+import json  # for the book description
+import multiprocessing  # for solving the positions on all cores
+import os  # for the book files
+import time  # for the build statistics
+import numpy as np  # for the mapped book
+from ai import Expectimax
+from bitboard import directions, move_board, empty_shifts
+from symmetry import canonical_board, restore_direction
+
+"""
+---------------------------------------------------------------------
+    Opening book of 2048
+---------------------------------------------------------------------
+    - Move values of the positions of the first moves of a game, solved offline by a deep expectimax search
+    - The book follows the best line from all start positions (two spawned pieces on an empty board):
+      ply by ply the best move of every position is played and all spawns after it are the positions of the next ply
+    - Only positions reached with at least min_probability by the best line are kept,
+      every ply has at most 1 / min_probability positions
+    - Positions are stored once per symmetry class (canonical board of symmetry.py)
+    - The build is incremental: positions already in the book are not solved again, so a build with more plies
+      or a smaller min_probability only solves the new positions, every finished ply is saved at once
+    - The book is one .npy file of (key, move values, ply) sorted by key, mapped into memory by the game
+      -> loading is instant and a lookup is a binary search
+    - The hint engine, the AI modes and the analyzer answer book positions from it and search all others
+
+Book files
+    - opening_book.npy -> (canonical key, values of the 4 moves (NaN -> impossible move), first ply) of every position
+    - opening_book.json -> plies, min_probability and search depth of the last build
+
+Usage: python opening_book.py build --plies 12 --min-probability 0.0001 --workers 32
+       python opening_book.py info
+---------------------------------------------------------------------
+"""
+
+# region VARIABLES
+"""
+Variables of the opening book
+    - default_book_file: str -> book used by the game
+    - book_dtype: np.dtype -> record of one position of the book, float64 values keep the order of moves
+      whose values (about 1.6e6) differ by less than the float32 step
+    - spawn_probabilities: tuple -> (exponent, probability) of the spawned pieces
+    - solve_chunk: int -> positions solved by one task of the pool
+    - worker_search: Expectimax -> search of the worker process
+"""
+default_book_file = 'assets/save_files/opening_book.npy'
+book_dtype = np.dtype([('key', np.uint64), ('values', np.float64, (len(directions),)), ('ply', np.uint8)])
+spawn_probabilities = ((1, 0.9), (2, 0.1))
+solve_chunk = 16
+
+worker_search = None
+
+
+# endregion VARIABLES
+
+# region LOOKUP
+
+class OpeningBook:
+    """
+    Book mapped into memory, nothing is read until a position is looked up
+    Args:
+        path: str -> path of the .npy book
+    """
+
+    def __init__(self, path=default_book_file):
+        with open(os.path.splitext(path)[0] + '.json', 'r') as f:
+            self.description = json.load(f)
+        book = np.load(path, mmap_mode='r')
+        self.keys = book['key']
+        self.values = book['values']
+        self.plies = book['ply']
+
+    def __len__(self):
+        return len(self.keys)
+
+    def find(self, key):
+        """
+        Index of a canonical board in the book
+        Args:
+            key: int -> canonical packed board
+        Return:
+            int -> index of the position, None if the position is out of book
+        """
+        index = int(np.searchsorted(self.keys, np.uint64(key)))
+        if index < len(self.keys) and int(self.keys[index]) == key:
+            return index
+        return None
+
+    def move_values(self, board):
+        """
+        Value of every possible move of a board
+        Args:
+            board: int -> packed board
+        Return:
+            dict -> direction -> value, None if the position is out of book
+        """
+        key, symmetry = canonical_board(board)
+        index = self.find(key)
+        if index is None:
+            return None
+        # the stored values belong to the moves of the canonical board
+        return {restore_direction(move_direction, symmetry): float(value)
+                for move_direction, value in zip(directions, self.values[index]) if not np.isnan(value)}
+
+    def best_move(self, board):
+        """
+        Best move of a board
+        Args:
+            board: int -> packed board
+        Return:
+            str -> best direction, None if the position is out of book or no move is possible
+        """
+        values = self.move_values(board)
+        if not values:
+            return None
+        return max(values, key=values.get)
+
+
+def find_opening_book(path=default_book_file):
+    """
+    Map the opening book, if one was built
+    Args:
+        path: str -> path of the .npy book
+    Return:
+        OpeningBook -> mapped book, None if there is no book
+    """
+    try:
+        return OpeningBook(path)
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+# endregion LOOKUP
+
+# region BUILD
+
+def start_positions():
+    """
+    Canonical positions after the two spawns of spawn_piece on an empty board
+    Return:
+        dict -> canonical key -> probability of the position
+    """
+    positions = {}
+    for first in range(16):
+        for second in range(16):
+            if first == second:
+                continue
+            for first_exponent, first_probability in spawn_probabilities:
+                for second_exponent, second_probability in spawn_probabilities:
+                    key = canonical_board((first_exponent << (4 * first)) | (second_exponent << (4 * second)))[0]
+                    positions[key] = (positions.get(key, 0.0)
+                                      + first_probability * second_probability / (16 * 15))
+    return positions
+
+
+def next_positions(positions, book_values, min_probability):
+    """
+    Positions of the next ply -> the best move of every position followed by all spawns
+    Args:
+        positions: dict -> canonical key -> probability of the positions of a ply
+        book_values: dict -> canonical key -> values of the 4 moves of every solved position
+        min_probability: float -> positions less likely than this are left out
+    Return:
+        dict -> canonical key -> probability of the positions of the next ply
+    """
+    children = {}
+    for key, probability in positions.items():
+        values = book_values[key]
+        if np.isnan(values).all():
+            continue
+        after, _ = move_board(key, directions[int(np.nanargmax(values))])
+        shifts = empty_shifts(after)
+        for shift in shifts:
+            for exponent, spawn_probability in spawn_probabilities:
+                child = canonical_board(after | (exponent << shift))[0]
+                children[child] = children.get(child, 0.0) + probability * spawn_probability / len(shifts)
+    return {key: probability for key, probability in children.items() if probability >= min_probability}
+
+
+def init_worker(depth):
+    """
+    Initialize a worker process -> create its search
+    Args:
+        depth: int -> search depth
+    """
+    global worker_search
+    worker_search = Expectimax(depth)
+
+
+def solve_task(keys):
+    """
+    Solve a chunk of positions
+    Args:
+        keys: list -> canonical keys
+    Return:
+        list -> values of the 4 moves of every position (NaN -> impossible move)
+    """
+    solved = []
+    for key in keys:
+        # the memo of one position does not help the next one, do not let it grow
+        worker_search.cache.clear()
+        values = worker_search.move_values(key)
+        solved.append([values.get(move_direction, np.nan) for move_direction in directions])
+    return solved
+
+
+def load_book_values(path):
+    """
+    Positions of an existing book, read into memory so the book file can be replaced
+    Args:
+        path: str -> path of the .npy book
+    Return:
+        dict -> canonical key -> (values of the 4 moves, first ply), empty if there is no book of this format
+    """
+    if not os.path.exists(path):
+        return {}
+    book = np.load(path)
+    # a book of an older format with float32 values is solved again
+    if book.dtype != book_dtype:
+        return {}
+    return {int(key): (values, int(ply)) for key, values, ply in zip(book['key'], book['values'], book['ply'])}
+
+
+def save_book(path, entries, description):
+    """
+    Save the book atomically -> the book file is either the old or the new one
+    Args:
+        path: str -> path of the .npy book
+        entries: dict -> canonical key -> (values of the 4 moves, first ply)
+        description: dict -> description of the build
+    """
+    book = np.zeros(len(entries), dtype=book_dtype)
+    keys = sorted(entries)
+    book['key'] = keys
+    book['values'] = [entries[key][0] for key in keys]
+    book['ply'] = [entries[key][1] for key in keys]
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    temporary_path = path + '.tmp'
+    with open(temporary_path, 'wb') as f:
+        np.save(f, book)
+    os.replace(temporary_path, path)
+    description_path = os.path.splitext(path)[0] + '.json'
+    with open(description_path + '.tmp', 'w') as f:
+        json.dump(dict(description, positions=len(entries)), f)
+    os.replace(description_path + '.tmp', description_path)
+
+
+def build_book(path=default_book_file, plies=12, min_probability=1e-4, depth=4, workers=None):
+    """
+    Build or extend the book, positions of an earlier build are reused and only new positions are solved
+    Args:
+        path: str -> path of the .npy book
+        plies: int -> number of player moves covered from the start of the game
+        min_probability: float -> positions reached less likely by the best line are left out
+        depth: int -> search depth of the new positions
+        workers: int -> number of worker processes (None -> all cores)
+    Return:
+        dict -> canonical key -> (values of the 4 moves, first ply) of the finished book
+    """
+    entries = load_book_values(path)
+    description = {"plies": plies, "min_probability": min_probability, "depth": depth}
+    positions = start_positions()
+    with multiprocessing.Pool(workers, initializer=init_worker, initargs=(depth,)) as pool:
+        for ply in range(plies):
+            start = time.perf_counter()
+            new_keys = sorted(key for key in positions if key not in entries)
+            chunks = [new_keys[index:index + solve_chunk] for index in range(0, len(new_keys), solve_chunk)]
+            for chunk, solved in zip(chunks, pool.imap(solve_task, chunks)):
+                for key, values in zip(chunk, solved):
+                    entries[key] = (np.array(values, dtype=np.float64), ply)
+            if new_keys:
+                save_book(path, entries, description)
+            print(f"ply {ply}: {len(positions)} positions, {len(new_keys)} solved, "
+                  f"coverage {sum(positions.values()):.3f}, time: {time.perf_counter() - start:.1f} s")
+
+            if ply + 1 < plies:
+                positions = next_positions(positions, {key: entries[key][0] for key in positions}, min_probability)
+                if not positions:
+                    break
+    # the description of the last build is saved even when nothing was new
+    save_book(path, entries, description)
+    return entries
+
+
+# endregion BUILD
+
+# region MAIN
+
+def main():
+    """
+    Parse the command line options and build the book or print its information
+    """
+    parser = argparse.ArgumentParser(description="Opening book of 2048")
+    parser.add_argument('command', choices=['build', 'info'], help="build or extend the book or print its information")
+    parser.add_argument('--book', default=default_book_file, help="path of the .npy book")
+    parser.add_argument('--plies', type=int, default=12, help="player moves covered from the start")
+    parser.add_argument('--min-probability', type=float, default=1e-4,
+                        help="positions reached less likely by the best line are left out")
+    parser.add_argument('--depth', type=int, default=4, help="search depth of the new positions")
+    parser.add_argument('--workers', type=int, default=None, help="worker processes (default: all cores)")
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        start = time.perf_counter()
+        build_book(args.book, args.plies, args.min_probability, args.depth, args.workers)
+        print(f"time: {time.perf_counter() - start:.1f} s")
+
+    book = find_opening_book(args.book)
+    if book is None:
+        parser.error(f"there is no book {args.book}, build it first")
+    ply_counts = np.bincount(book.plies)
+    print(f"{len(book)} positions, {os.path.getsize(args.book) / 1e6:.1f} MB, "
+          f"plies {book.description['plies']}, min probability {book.description['min_probability']}")
+    print("positions per ply: " + ", ".join(str(count) for count in ply_counts))
+
+
+if __name__ == "__main__":
+    main()
+
+# endregion MAIN
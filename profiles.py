@@ -0,0 +1,176 @@
+import json  # for the profile data and the old save file
+import os  # for the store directory
+import sqlite3  # for the indexed profile store
+import time  # for ordering the profiles by last use
+
+"""
+---------------------------------------------------------------------
+    Player profiles of the 2048 game
+---------------------------------------------------------------------
+    - Every profile has its own saved game, settings and high scores
+    - All profiles live in one SQLite file, every profile is one row indexed by its name
+    - Only the selected profile is read -> switching costs one indexed lookup, no matter how many profiles exist
+    - The selected profile is remembered in the store, the game starts with the last used profile
+    - The old single save file (save.json) is imported as the default profile on the first start
+---------------------------------------------------------------------
+"""
+
+# region VARIABLES
+"""
+Variables of the profile store
+    - default_profiles_file: str -> path of the profile store used by the game
+    - default_profile: str -> name of the profile used when no profile was selected yet
+    - max_profile_name_length: int -> maximum number of characters of a profile name
+"""
+default_profiles_file = 'assets/save_files/profiles.sqlite'
+default_profile = 'default'
+max_profile_name_length = 16
+
+
+# endregion VARIABLES
+
+# region PROFILE STORE
+
+class ProfileStore:
+    """
+    Indexed store of all profiles
+    Args:
+        path: str -> path of the SQLite file
+    """
+
+    def __init__(self, path=default_profiles_file):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.connection = sqlite3.connect(path)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        # a crash can lose the last save, but never corrupts the store
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS profiles "
+                                "(name TEXT PRIMARY KEY, data TEXT NOT NULL, last_used REAL NOT NULL)")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS profiles_last_used ON profiles (last_used)")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS store_settings (key TEXT PRIMARY KEY, value TEXT)")
+        self.connection.commit()
+
+    def count(self):
+        """
+        Number of profiles in the store
+        Return:
+            int -> number of profiles
+        """
+        return self.connection.execute("SELECT COUNT(*) FROM profiles").fetchone()[0]
+
+    def names(self, offset=0, limit=10):
+        """
+        Names of the profiles, the most recently used first
+        Args:
+            offset: int -> number of skipped profiles (for paging)
+            limit: int -> maximum number of names
+        Return:
+            list -> names of the profiles
+        """
+        rows = self.connection.execute("SELECT name FROM profiles ORDER BY last_used DESC LIMIT ? OFFSET ?",
+                                       (limit, offset))
+        return [name for name, in rows]
+
+    def exists(self, name):
+        """
+        Check if a profile exists
+        Args:
+            name: str -> name of the profile
+        Return:
+            bool -> True if the profile exists
+        """
+        return self.connection.execute("SELECT 1 FROM profiles WHERE name = ?", (name,)).fetchone() is not None
+
+    def load(self, name):
+        """
+        Read the data of one profile
+        Args:
+            name: str -> name of the profile
+        Return:
+            dict -> saved data of the profile, None if the profile does not exist
+        """
+        row = self.connection.execute("SELECT data FROM profiles WHERE name = ?", (name,)).fetchone()
+        return json.loads(row[0]) if row is not None else None
+
+    def save(self, name, data):
+        """
+        Write the data of one profile, the profile is created if needed
+        Args:
+            name: str -> name of the profile
+            data: dict -> data of the profile
+        """
+        with self.connection:
+            self.connection.execute("INSERT INTO profiles VALUES (?, ?, ?) ON CONFLICT (name) "
+                                    "DO UPDATE SET data = excluded.data, last_used = excluded.last_used",
+                                    (name, json.dumps(data), time.time()))
+
+    def delete(self, name):
+        """
+        Delete a profile
+        Args:
+            name: str -> name of the profile
+        """
+        with self.connection:
+            self.connection.execute("DELETE FROM profiles WHERE name = ?", (name,))
+
+    def current(self):
+        """
+        Name of the last selected profile
+        Return:
+            str -> name of the profile, default_profile if no profile was selected yet
+        """
+        row = self.connection.execute("SELECT value FROM store_settings WHERE key = 'current_profile'").fetchone()
+        return row[0] if row is not None else default_profile
+
+    def select(self, name):
+        """
+        Select a profile and read its data, the selection is remembered for the next start
+        Args:
+            name: str -> name of the profile
+        Return:
+            dict -> saved data of the profile, empty for a new profile
+        """
+        with self.connection:
+            self.connection.execute("INSERT OR REPLACE INTO store_settings VALUES ('current_profile', ?)", (name,))
+            self.connection.execute("UPDATE profiles SET last_used = ? WHERE name = ?", (time.time(), name))
+        data = self.load(name)
+        return data if data is not None else {}
+
+    def import_save_file(self, path, name=default_profile):
+        """
+        Import an old single save file as a profile, nothing happens if the file does not exist
+        Args:
+            path: str -> path of the save file
+            name: str -> name of the new profile
+        Return:
+            bool -> True if the file was imported
+        """
+        try:
+            with open(path, 'r') as f:
+                data = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return False
+        self.save(name, data)
+        return True
+
+    def close(self):
+        """
+        Close the store
+        """
+        self.connection.close()
+
+
+def valid_profile_name(name):
+    """
+    Check if a profile name can be used
+    Args:
+        name: str -> name of the profile
+    Return:
+        bool -> True if the name is not empty, not too long and printable
+    """
+    return 0 < len(name.strip()) and len(name) <= max_profile_name_length and name.isprintable()
+
+
+# endregion PROFILE STORE
@@ -0,0 +1,633 @@
+import argparse  # for the command line options
+import os  # for the library directory
+import random  # for the generator and the seeded spawns
+import sqlite3  # for the indexed puzzle library
+import time  # for the generator summary
+from game_logic import spawn_piece
+from bitboard import directions, pack_board, unpack_board, transpose, move_board, row_left_table, \
+    row_right_table, row_empty_table, empty_shifts, count_empty, max_exponent
+from symmetry import canonical_board
+from analyzer import to_signed
+
+"""
+---------------------------------------------------------------------
+    Puzzles of the 2048 game
+---------------------------------------------------------------------
+    - A puzzle is a start position, a goal and a move limit:
+      "tile" -> reach a tile (e.g. 512) within the moves, "single" -> clear the board to a single tile
+      (a 2 or 4 next to it is allowed -> the piece spawned before the last move does not have to be merged,
+      without it a single tile could only be reached by merging two 2s or two 4s)
+    - Spawns follow the spawn_piece rules in one of two ways:
+      "worst" -> the puzzle must be solvable for every possible spawn (any empty cell, 2 or 4)
+      "seeded" -> the spawn is spawn_piece with a generator seeded by the puzzle seed and the board,
+      the same position always gets the same spawn
+    - The generator builds puzzles backwards: it starts at a goal state and undoes moves and spawns,
+      the previous rows of a move are looked up in inverse row tables built from the bitboard tables
+    - The solver proves a puzzle by an AND-OR search (the player picks a move, every spawn must still be solvable)
+      -> memo of the canonical board with the fewest moves known to solve it and the most moves known to fail,
+      a failed shallow search is reused when the limit grows, and a bound on the tile sum or tile count
+      cuts branches which can never reach the goal in time
+    - Generated puzzles are stored in an indexed SQLite library ordered by difficulty,
+      the puzzle mode only reads the next one -> it starts instantly
+
+Usage: python puzzle.py generate --count 50
+       python puzzle.py list
+---------------------------------------------------------------------
+"""
+
+# region VARIABLES
+"""
+Variables of the puzzles
+    - default_puzzles_file: str -> path of the puzzle library used by the game
+    - goals: tuple -> goals of a puzzle
+    - spawn_modes: tuple -> spawn modes of a puzzle
+    - puzzle_presets: list -> (goal, target exponent, spawn mode, backward steps) of the generated puzzle kinds,
+      from easy to hard
+    - quick_presets: list -> presets generated when the puzzle mode starts with an empty library
+    - default_slack: int -> moves allowed above the shortest solution
+    - max_candidates: int -> generated positions per preset before the generator gives up on a puzzle
+    - walk_attempts: int -> undone moves tried per backward step before the walk gives up
+    - seed_attempts: int -> seeds tried for one seeded position
+    - predecessor_tables: dict -> row table name -> list of the rows which move to the row (built on first use)
+"""
+default_puzzles_file = 'assets/save_files/puzzles.sqlite'
+goals = ("tile", "single")
+spawn_modes = ("worst", "seeded")
+
+puzzle_presets = [
+    ("tile", 6, "worst", 3),
+    ("single", 5, "seeded", 4),
+    ("tile", 7, "worst", 4),
+    ("tile", 8, "seeded", 6),
+    ("single", 5, "seeded", 6),
+    ("tile", 8, "worst", 5),
+    ("tile", 9, "seeded", 10),
+    ("single", 5, "seeded", 8),
+]
+quick_presets = puzzle_presets[:3]
+default_slack = 1
+max_candidates = 200
+walk_attempts = 50
+seed_attempts = 8
+
+predecessor_tables = {}
+
+
+# endregion VARIABLES
+
+# region PUZZLE
+
+class Puzzle:
+    """
+    One puzzle -> start position, goal, move limit and spawn mode
+    Args:
+        board: int -> packed start board
+        goal: str -> "tile" or "single"
+        target: int -> exponent of the tile to reach (tile) or of the single tile (single)
+        moves: int -> move limit
+        spawn: str -> "worst" or "seeded"
+        seed: int -> seed of the seeded spawns
+        solution: int -> number of moves of the shortest solution (difficulty)
+        puzzle_id: int -> id in the library, None if not stored yet
+    """
+
+    def __init__(self, board, goal, target, moves, spawn="worst", seed=0, solution=None, puzzle_id=None):
+        self.board = board
+        self.goal = goal
+        self.target = target
+        self.moves = moves
+        self.spawn_mode = spawn
+        self.seed = seed
+        self.solution = solution if solution is not None else moves
+        self.puzzle_id = puzzle_id
+
+    def description(self):
+        """
+        Text of the goal shown in the puzzle mode
+        Return:
+            str -> e.g. "Reach 512 within 30 moves"
+        """
+        if self.goal == "tile":
+            return f"Reach {1 << self.target} within {self.moves} moves"
+        return f"Clear to a single {1 << self.target} within {self.moves} moves"
+
+    def reached(self, board):
+        """
+        Check if a board reaches the goal of the puzzle
+        Args:
+            board: int -> packed board
+        Return:
+            bool -> True if the goal is reached
+        """
+        if self.goal == "tile":
+            return max_exponent(board) >= self.target
+        return count_empty(board) >= 14 and max_exponent(board) == self.target \
+            and tile_sum(board) - (1 << self.target) in (0, 2, 4)
+
+    def spawn(self, board, rng=random):
+        """
+        Spawn the piece after a move the way the puzzle was proven -> spawn_piece, seeded by the board if needed
+        Args:
+            board: int -> packed board after the move
+            rng: random.Random -> random generator of the worst case puzzles (any spawn is solvable)
+        Return:
+            int -> packed board with the new piece
+        """
+        if self.spawn_mode == "seeded":
+            return seeded_spawn(board, self.seed)
+        board_values, _ = spawn_piece(unpack_board(board), rng)
+        return pack_board(board_values)
+
+
+def seeded_spawn(board, seed):
+    """
+    Spawn one piece with the spawn_piece rules, the random generator is seeded by the seed and the board
+    Args:
+        board: int -> packed board after the move
+        seed: int -> seed of the puzzle
+    Return:
+        int -> packed board with the new piece
+    """
+    board_values, _ = spawn_piece(unpack_board(board), random.Random((seed << 64) | board))
+    return pack_board(board_values)
+
+
+def tile_sum(board):
+    """
+    Sum of all tiles on the board
+    Args:
+        board: int -> packed board
+    Return:
+        int -> sum of the tile values
+    """
+    total = 0
+    while board:
+        exponent = board & 0xF
+        if exponent:
+            total += 1 << exponent
+        board >>= 4
+    return total
+
+
+# endregion PUZZLE
+
+# region SOLVER
+
+class PuzzleSolver:
+    """
+    Memoized AND-OR search which proves that a puzzle is solvable within a number of moves
+    Args:
+        puzzle: Puzzle -> puzzle to solve (its board and moves are ignored, they are passed to the calls)
+    """
+
+    def __init__(self, puzzle):
+        self.puzzle = puzzle
+        # key -> [fewest moves known to solve, most moves known to fail]
+        self.memo = {}
+        self.nodes = 0
+        self.memo_hits = 0
+        self.pruned = 0
+
+    def key(self, board):
+        """
+        Memo key of a board, worst case puzzles share one entry for all 8 symmetries
+        Args:
+            board: int -> packed board
+        Return:
+            int -> memo key
+        """
+        if self.puzzle.spawn_mode == "worst":
+            return canonical_board(board)[0]
+        return board  # the seeded spawn depends on the real board
+
+    def can_reach(self, board, moves_left):
+        """
+        Admissible bound -> False only if the goal can not be reached within the moves whatever is played
+        Args:
+            board: int -> packed board
+            moves_left: int -> moves left
+        Return:
+            bool -> False if the branch can be cut
+        """
+        if self.puzzle.goal == "tile":
+            # moves keep the sum, every spawn before the last move adds at most 4
+            return tile_sum(board) + 4 * (moves_left - 1) >= 1 << self.puzzle.target
+        # a move merges at most 2 pairs per line, every move but the last adds a spawn
+        tiles = 16 - count_empty(board)
+        if tiles > 7 * moves_left + 3:
+            return False
+        # the sum only grows -> it must end at the target, plus the unmerged last spawn
+        total = tile_sum(board)
+        if moves_left == 1:
+            return total - (1 << self.puzzle.target) in (0, 2, 4)
+        return (1 << self.puzzle.target) - 4 * (moves_left - 1) <= total <= (1 << self.puzzle.target) + 4
+
+    def children(self, board):
+        """
+        Boards after every move which changes the board, the most promising first
+        Args:
+            board: int -> packed board
+        Return:
+            list -> (direction, board after the move) pairs
+        """
+        moved = []
+        for move_direction in directions:
+            new_board, _ = move_board(board, move_direction)
+            if new_board != board:
+                moved.append((move_direction, new_board))
+        if self.puzzle.goal == "tile":
+            moved.sort(key=lambda child: (max_exponent(child[1]), count_empty(child[1])), reverse=True)
+        else:
+            moved.sort(key=lambda child: count_empty(child[1]), reverse=True)
+        return moved
+
+    def spawns(self, board):
+        """
+        Boards after the spawns the puzzle has to survive
+        Args:
+            board: int -> packed board after a move
+        Return:
+            list -> boards with the new piece
+        """
+        if self.puzzle.spawn_mode == "seeded":
+            return [seeded_spawn(board, self.puzzle.seed)]
+        # 4s first -> they block more and make failing branches fail early
+        return [board | (exponent << shift) for exponent in (2, 1) for shift in empty_shifts(board)]
+
+    def solvable(self, board, moves_left):
+        """
+        Check if the goal can be reached from the board within the moves for all spawns of the puzzle
+        Args:
+            board: int -> packed board (before the next move)
+            moves_left: int -> moves left
+        Return:
+            bool -> True if the goal can always be reached
+        """
+        if moves_left <= 0:
+            return False
+        key = self.key(board)
+        entry = self.memo.get(key)
+        if entry is not None:
+            if moves_left >= entry[0]:
+                self.memo_hits += 1
+                return True
+            if moves_left <= entry[1]:
+                self.memo_hits += 1
+                return False
+        else:
+            entry = [float('inf'), 0]
+            self.memo[key] = entry
+
+        self.nodes += 1
+        if not self.can_reach(board, moves_left):
+            self.pruned += 1
+            result = False
+        else:
+            result = self.best_move(board, moves_left) is not None
+        if result:
+            entry[0] = min(entry[0], moves_left)
+        else:
+            entry[1] = max(entry[1], moves_left)
+        return result
+
+    def best_move(self, board, moves_left):
+        """
+        Find a move after which the goal can still be reached for all spawns
+        Args:
+            board: int -> packed board
+            moves_left: int -> moves left
+        Return:
+            str -> direction of a winning move, None if there is none
+        """
+        for move_direction, new_board in self.children(board):
+            if self.puzzle.reached(new_board):
+                return move_direction
+            if moves_left > 1 and all(self.solvable(spawned, moves_left - 1) for spawned in self.spawns(new_board)):
+                return move_direction
+        return None
+
+    def shortest(self, board, limit):
+        """
+        Shortest number of moves which solves the board, searched with a growing limit
+        The failed searches stay in the memo -> every deeper search skips what is known to fail
+        Args:
+            board: int -> packed start board
+            limit: int -> maximum number of moves
+        Return:
+            int -> moves of the shortest solution, None if it is not solvable within the limit
+        """
+        for moves_left in range(1, limit + 1):
+            if self.solvable(board, moves_left):
+                return moves_left
+        return None
+
+
+# endregion SOLVER
+
+# region GENERATOR
+
+def get_predecessors(table_name):
+    """
+    Inverse of a row table -> for every row all rows which move to it, built once on first use
+    Args:
+        table_name: str -> "left" or "right"
+    Return:
+        list -> rows moving to the row, indexed by the row
+    """
+    predecessors = predecessor_tables.get(table_name)
+    if predecessors is None:
+        table = row_left_table if table_name == "left" else row_right_table
+        predecessors = [[] for _ in range(65536)]
+        for row in range(65536):
+            predecessors[table[row]].append(row)
+        predecessor_tables[table_name] = predecessors
+    return predecessors
+
+
+def undo_move(board, move_direction, rng):
+    """
+    Pick a random board from which the move leads to the board, splitting merges is preferred
+    Args:
+        board: int -> packed board after the move
+        move_direction: str -> direction of the move
+        rng: random.Random -> random generator of the generator
+    Return:
+        int -> packed board before the move, None if no move in this direction ends at the board
+    """
+    vertical = move_direction in ("UP", "DOWN")
+    predecessors = get_predecessors("left" if move_direction in ("UP", "LEFT") else "right")
+    lines = transpose(board) if vertical else board
+    previous = 0
+    for shift in range(0, 64, 16):
+        candidates = predecessors[(lines >> shift) & 0xFFFF]
+        if not candidates:
+            return None  # the line is not the result of a move in this direction
+        # more tiles -> more merges undone, lines pushed to one side -> the walk can go on from them
+        weights = [(5 - row_empty_table[candidate]) ** 2 * (4 if candidate in (row_left_table[candidate],
+                                                                               row_right_table[candidate]) else 1)
+                   for candidate in candidates]
+        previous |= rng.choices(candidates, weights=weights)[0] << shift
+    if vertical:
+        previous = transpose(previous)
+    return previous if previous != board else None
+
+
+def goal_board(goal, target, rng):
+    """
+    Random goal state of a puzzle
+    Args:
+        goal: str -> "tile" or "single"
+        target: int -> exponent of the target tile
+        rng: random.Random -> random generator of the generator
+    Return:
+        int -> packed goal board
+    """
+    shifts = list(range(0, 64, 4))
+    rng.shuffle(shifts)
+    board = target << shifts.pop()
+    if goal == "tile":
+        # a few small tiles around the target, they have to be played around
+        for _ in range(rng.randint(1, 4)):
+            board |= rng.randint(1, max(1, target - 3)) << shifts.pop()
+    elif rng.random() < 0.5:
+        # the last spawn was not merged
+        board |= rng.choice((1, 2)) << shifts.pop()
+    # the goal is the result of the last move -> its tiles are pushed to one side
+    board, _ = move_board(board, rng.choice(directions))
+    return board
+
+
+def undo_directions(board):
+    """
+    Directions of the moves which can end at the board
+    Args:
+        board: int -> packed board after a move
+    Return:
+        list -> directions with a previous board different from the board
+    """
+    possible = []
+    for move_direction in directions:
+        predecessors = get_predecessors("left" if move_direction in ("UP", "LEFT") else "right")
+        lines = transpose(board) if move_direction in ("UP", "DOWN") else board
+        line_predecessors = [predecessors[(lines >> shift) & 0xFFFF] for shift in range(0, 64, 16)]
+        # every line must be a move result and at least one line must have changed
+        if all(line_predecessors) and any(len(candidates) > 1 for candidates in line_predecessors):
+            possible.append(move_direction)
+    return possible
+
+
+def walkable(board):
+    """
+    Check if the walk can go on from a board -> a move ends at it without one of its 2s and 4s
+    Args:
+        board: int -> packed board
+    Return:
+        bool -> True if the board can be undone further
+    """
+    return any(undo_directions(board & ~(0xF << shift)) for shift in range(0, 64, 4)
+               if (board >> shift) & 0xF in (1, 2))
+
+
+def generate_candidate(goal, target, steps, rng):
+    """
+    Walk backwards from a goal state -> undo the spawn before a move (a 2 or a 4), then undo the move
+    The walk only guesses a position close to the goal, the solver proves it with the real spawns
+    Args:
+        goal: str -> "tile" or "single"
+        target: int -> exponent of the target tile
+        steps: int -> number of undone moves
+        rng: random.Random -> random generator of the generator
+    Return:
+        int -> packed start board, None if the walk got stuck
+    """
+    board = goal_board(goal, target, rng)
+    for step in range(steps):
+        for _ in range(walk_attempts):
+            candidate = board
+            if step > 0:
+                # every move but the last was followed by a spawn, 2s like spawn_piece -> 9 of 10
+                spawned = [shift for shift in range(0, 64, 4) if (board >> shift) & 0xF in (1, 2)]
+                if not spawned:
+                    return None
+                weights = [9 if (board >> shift) & 0xF == 1 else 1 for shift in spawned]
+                candidate &= ~(0xF << rng.choices(spawned, weights=weights)[0])
+            possible = undo_directions(candidate)
+            if not possible:
+                continue
+            previous = undo_move(candidate, rng.choice(possible), rng)
+            if previous is not None and max_exponent(previous) < target \
+                    and (step == steps - 1 or walkable(previous)):
+                board = previous
+                break
+        else:
+            return None
+    return board
+
+
+def generate_puzzle(goal, target, spawn, steps, rng, slack=default_slack):
+    """
+    Generate one puzzle of a preset which the solver proved solvable
+    Args:
+        goal: str -> "tile" or "single"
+        target: int -> exponent of the target tile
+        spawn: str -> "worst" or "seeded"
+        steps: int -> backward steps of the generator (about the number of moves of the solution)
+        rng: random.Random -> random generator of the generator
+        slack: int -> moves allowed above the shortest solution
+    Return:
+        Puzzle -> proven puzzle, None if no candidate was solvable
+    """
+    for _ in range(max_candidates):
+        board = generate_candidate(goal, target, steps, rng)
+        if board is None:
+            continue
+        # a seeded puzzle needs a seed whose spawns fit the position -> try a few
+        for _ in range(seed_attempts if spawn == "seeded" else 1):
+            puzzle = Puzzle(board, goal, target, steps, spawn, rng.getrandbits(31))
+            solution = PuzzleSolver(puzzle).shortest(board, steps + 1)
+            if solution is not None and solution >= max(1, steps // 2):
+                puzzle.solution = solution
+                puzzle.moves = solution + slack
+                return puzzle
+    return None
+
+
+def generate_puzzles(library, count, presets=puzzle_presets, seed=None, slack=default_slack):
+    """
+    Generate puzzles of all presets in turn and store the new ones in the library
+    Args:
+        library: PuzzleLibrary -> library of the puzzles
+        count: int -> number of puzzles to generate
+        presets: list -> presets generated in turn
+        seed: int -> seed of the generator (None -> random)
+        slack: int -> moves allowed above the shortest solution
+    Return:
+        int -> number of puzzles added to the library
+    """
+    rng = random.Random(seed)
+    added = 0
+    for index in range(count):
+        goal, target, spawn, steps = presets[index % len(presets)]
+        puzzle = generate_puzzle(goal, target, spawn, steps, rng, slack)
+        if puzzle is not None and library.add(puzzle):
+            added += 1
+    return added
+
+
+# endregion GENERATOR
+
+# region LIBRARY
+
+class PuzzleLibrary:
+    """
+    Indexed SQLite library of the generated puzzles, ordered by difficulty
+    Args:
+        path: str -> path of the SQLite file
+    """
+
+    def __init__(self, path=default_puzzles_file):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.connection = sqlite3.connect(path)
+        self.connection.execute("CREATE TABLE IF NOT EXISTS puzzles (id INTEGER PRIMARY KEY, board INTEGER NOT NULL, "
+                                "goal TEXT NOT NULL, target INTEGER NOT NULL, moves INTEGER NOT NULL, "
+                                "spawn TEXT NOT NULL, seed INTEGER NOT NULL, solution INTEGER NOT NULL, "
+                                "UNIQUE (board, goal, target, spawn, seed))")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS puzzles_difficulty ON puzzles (solution, id)")
+        self.connection.commit()
+
+    def count(self):
+        """
+        Number of puzzles in the library
+        Return:
+            int -> number of puzzles
+        """
+        return self.connection.execute("SELECT COUNT(*) FROM puzzles").fetchone()[0]
+
+    def add(self, puzzle):
+        """
+        Store a puzzle, a puzzle which is already in the library is skipped
+        Args:
+            puzzle: Puzzle -> proven puzzle
+        Return:
+            bool -> True if the puzzle was added
+        """
+        with self.connection:
+            cursor = self.connection.execute(
+                "INSERT OR IGNORE INTO puzzles (board, goal, target, moves, spawn, seed, solution) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (to_signed(puzzle.board), puzzle.goal, puzzle.target, puzzle.moves, puzzle.spawn_mode, puzzle.seed,
+                 puzzle.solution))
+        if cursor.rowcount:
+            puzzle.puzzle_id = cursor.lastrowid
+        return cursor.rowcount > 0
+
+    def next_puzzle(self, previous_id=None):
+        """
+        Next puzzle by difficulty after a puzzle, the first one again after the last
+        Args:
+            previous_id: int -> id of the last solved puzzle (None -> the easiest puzzle)
+        Return:
+            Puzzle -> next puzzle, None if the library is empty
+        """
+        columns = "SELECT id, board, goal, target, moves, spawn, seed, solution FROM puzzles "
+        row = None
+        if previous_id is not None:
+            row = self.connection.execute(
+                columns + "WHERE (solution, id) > (SELECT solution, id FROM puzzles WHERE id = ?) "
+                          "ORDER BY solution, id LIMIT 1", (previous_id,)).fetchone()
+        if row is None:
+            row = self.connection.execute(columns + "ORDER BY solution, id LIMIT 1").fetchone()
+        if row is None:
+            return None
+        puzzle_id, board, goal, target, moves, spawn, seed, solution = row
+        return Puzzle(board % (1 << 64), goal, target, moves, spawn, seed, solution, puzzle_id)
+
+    def summary(self):
+        """
+        Number of puzzles of every kind and difficulty
+        Return:
+            list -> (goal, spawn, solution, count) rows
+        """
+        return self.connection.execute("SELECT goal, spawn, solution, COUNT(*) FROM puzzles "
+                                       "GROUP BY goal, spawn, solution ORDER BY solution, goal, spawn").fetchall()
+
+    def close(self):
+        """
+        Close the library
+        """
+        self.connection.close()
+
+
+# endregion LIBRARY
+
+# region MAIN
+
+def main():
+    """
+    Parse the command line options and generate or list the puzzles
+    """
+    parser = argparse.ArgumentParser(description="Puzzles of the 2048 game")
+    parser.add_argument('command', choices=['generate', 'list'], help="generate new puzzles or list the library")
+    parser.add_argument('--count', type=int, default=len(puzzle_presets) * 5, help="number of puzzles to generate")
+    parser.add_argument('--library', default=default_puzzles_file, help="path of the puzzle library")
+    parser.add_argument('--seed', type=int, default=None, help="seed of the generator")
+    parser.add_argument('--slack', type=int, default=default_slack, help="moves above the shortest solution")
+    args = parser.parse_args()
+
+    library = PuzzleLibrary(args.library)
+    if args.command == 'generate':
+        start = time.perf_counter()
+        added = generate_puzzles(library, args.count, seed=args.seed, slack=args.slack)
+        print(f"added {added} of {args.count} puzzles in {time.perf_counter() - start:.1f} s "
+              f"({library.count()} in {args.library})")
+    for goal, spawn, solution, count in library.summary():
+        print(f"{goal:>6} {spawn:>6} solution {solution:>2} moves: {count}")
+    library.close()
+
+
+if __name__ == "__main__":
+    main()
+
+# endregion MAIN
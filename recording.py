@@ -0,0 +1,186 @@
+import json  # for the recording files
+import os  # for the recordings directory
+import time  # for the names of the recording files
+from game_logic import PlayerState
+from variants import rule_variants  # for replaying the games of other rule variants
+
+"""
+---------------------------------------------------------------------
+    Recording of played games
+---------------------------------------------------------------------
+    - A game is recorded as the ordered history of spawns, moves and undos
+    - Replaying the history with the game rules gives every board of the game
+    - Recordings are saved as JSON files into the recordings directory when the game ends
+    - Used by the game (main.py) to record and by the analysis tools to replay
+
+Recording file
+    - mode: str -> game mode (classic or timed)
+    - variant: str -> rule variant of the game (name in variants.rule_variants, classic if missing)
+    - initial_board: list -> board before the first event
+    - history: list -> events, each one is ["spawn", row, col, value], ["move", direction] or ["undo"]
+---------------------------------------------------------------------
+"""
+
+recordings_directory = 'assets/recordings'
+
+
+# region GAME RECORD
+
+class GameRecord:
+    """
+    History of one game
+    Args:
+        mode: str -> game mode (classic or timed)
+        initial_board: list -> values of the board before the first event (None -> empty board)
+        variant: str -> rule variant of the game
+    """
+
+    def __init__(self, mode='classic', initial_board=None, variant='classic'):
+        self.mode = mode
+        self.variant = variant
+        if initial_board is None:
+            initial_board = [[0 for _ in range(4)] for _ in range(4)]
+        self.initial_board = [row[:] for row in initial_board]
+        self.history = []
+        self.saved = False
+
+    def add_spawn(self, board_before, board_after):
+        """
+        Record the pieces spawned by the spawn rule, nothing is recorded when no piece was spawned
+        Args:
+            board_before: list -> values of the board before the spawn
+            board_after: list -> values of the board after the spawn
+        Return:
+            list -> [row, col, value] of every spawned piece
+        """
+        spawned = []
+        for row in range(4):
+            for col in range(4):
+                if board_before[row][col] != board_after[row][col]:
+                    spawned.append([row, col, board_after[row][col]])
+                    self.history.append(["spawn", row, col, board_after[row][col]])
+        return spawned
+
+    def add_move(self, move_direction):
+        """
+        Record a move of the player
+        Args:
+            move_direction: str -> direction of the move
+        """
+        self.history.append(["move", move_direction])
+
+    def add_undo(self):
+        """
+        Record an undo of the player
+        """
+        self.history.append(["undo"])
+
+    def replay(self):
+        """
+        Replay the history with the game rules (including the undo cooldown)
+        Return:
+            generator -> (event, player) after every event, player is the PlayerState of the replay
+        """
+        player = PlayerState()
+        if self.variant != 'classic':
+            player.rules = rule_variants[self.variant]
+        player.board_values = [row[:] for row in self.initial_board]
+        for event in self.history:
+            if event[0] == "spawn":
+                player.board_values[event[1]][event[2]] = event[3]
+            elif event[0] == "move":
+                player.move(event[1])
+            elif event[0] == "undo":
+                player.return_one_move()
+            yield event, player
+
+    def boards(self):
+        """
+        Get the board after every event of the game
+        Return:
+            list -> copies of the board values, the first one is the initial board
+        """
+        boards = [[row[:] for row in self.initial_board]]
+        for _, player in self.replay():
+            boards.append([row[:] for row in player.board_values])
+        return boards
+
+    def move_positions(self):
+        """
+        Get every position where the player moved together with the played move
+        Return:
+            list -> (board values before the move, direction of the move, score before the move)
+        """
+        positions = []
+        board_values = [row[:] for row in self.initial_board]
+        score = 0
+        for event, player in self.replay():
+            if event[0] == "move":
+                positions.append((board_values, event[1], score))
+            board_values = [row[:] for row in player.board_values]
+            score = player.score
+        return positions
+
+    def to_dict(self):
+        """
+        Convert the record to the dictionary saved in the recording file
+        Return:
+            dict -> data of the record
+        """
+        return {
+            "mode": self.mode,
+            "variant": self.variant,
+            "initial_board": self.initial_board,
+            "history": self.history
+        }
+
+    def save(self, directory=recordings_directory):
+        """
+        Save the record as a new file in the recordings directory
+        Args:
+            directory: str -> directory of the recordings
+        Return:
+            str -> path of the saved file
+        """
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"game_{time.strftime('%Y%m%d_%H%M%S')}_{time.time_ns() % 1000000:06}.json")
+        with open(path, 'w') as f:
+            json.dump(self.to_dict(), f)
+        self.saved = True
+        return path
+
+
+def load_record(path):
+    """
+    Load a game record from a recording file
+    Args:
+        path: str -> path of the recording file
+    Return:
+        GameRecord -> loaded record
+    """
+    with open(path, 'r') as f:
+        data = json.load(f)
+    record = GameRecord(data.get("mode", 'classic'), data.get("initial_board"), data.get("variant", 'classic'))
+    record.history = data.get("history", [])
+    record.saved = True
+    return record
+
+
+def find_recordings(paths):
+    """
+    Find all recording files in the given files and directories
+    Args:
+        paths: list -> recording files or directories with recording files
+    Return:
+        list -> sorted paths of the recording files
+    """
+    found = []
+    for path in paths:
+        if os.path.isdir(path):
+            found += [os.path.join(path, name) for name in os.listdir(path) if name.endswith('.json')]
+        else:
+            found.append(path)
+    return sorted(found)
+
+
+# endregion GAME RECORD
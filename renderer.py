@@ -0,0 +1,391 @@
+import argparse  # for the benchmark options
+import time  # for measuring the frame times
+import weakref  # for forgetting the textures of dropped surfaces
+import pygame
+
+try:
+    from pygame._sdl2.video import Window, Renderer, Texture  # only needed for the texture renderer
+    from pygame._sdl2.sdl2 import error as sdl2_error
+except ImportError:
+    Window = Renderer = Texture = None
+    sdl2_error = pygame.error
+
+"""
+---------------------------------------------------------------------
+    Rendering backends of the 2048 game
+---------------------------------------------------------------------
+    - The game draws through one renderer object: fill, rect, blit and present
+    - SoftwareRenderer draws on the display surface with pygame.draw and Surface.blit (the old way)
+    - TextureRenderer uploads every surface once as an SDL2 texture (pygame._sdl2.video) and composes
+      the frames with texture copies on the graphics card
+      -> the cached tiles and texts are uploaded once, a frame is only a few texture copies
+    - Rounded rectangles are drawn once into a surface and then used as a texture as well
+    - The texture renderer needs hardware acceleration, without it (or without pygame._sdl2, or with
+      the SDL dummy driver) create_renderer falls back to the software renderer
+    - The texture renderer redraws whole frames (keeps_frame is False) -> no dirty rectangles
+    - python renderer.py benchmark compares the frame times of both renderers on a typical game frame
+
+Usage: python main.py --renderer texture
+       python renderer.py benchmark --size 3840x2160
+---------------------------------------------------------------------
+"""
+
+# region VARIABLES
+"""
+Variables of the renderers
+    - renderer_names: tuple -> names of the renderers selectable with create_renderer
+    - window_title: str -> title of the game window
+    - shape_cache_size: int -> rounded rectangles kept as textures before the cache is emptied
+"""
+renderer_names = ("software", "texture")
+window_title = "2048"
+shape_cache_size = 256
+
+
+# endregion VARIABLES
+
+# region RENDERERS
+
+class SoftwareRenderer:
+    """
+    Draws on the display surface with the software functions of pygame
+    Args:
+        size: tuple -> size of the window
+        fullscreen: bool -> open the window in fullscreen
+    """
+    name = "software"
+    keeps_frame = True  # the display surface keeps the last frame -> dirty rectangles can be used
+
+    def __init__(self, size, fullscreen=False):
+        self.surface = None
+        self.open(size, fullscreen)
+
+    def open(self, size, fullscreen=False):
+        """
+        Open the window or change its size
+        Args:
+            size: tuple -> size of the window (ignored in fullscreen)
+            fullscreen: bool -> use the whole screen
+        """
+        if fullscreen:
+            self.surface = pygame.display.set_mode((0, 0), pygame.FULLSCREEN)
+        else:
+            self.surface = pygame.display.set_mode(size, pygame.RESIZABLE)
+        pygame.display.set_caption(window_title)
+
+    @property
+    def size(self):
+        """
+        Current size of the window in pixels
+        """
+        self.surface = pygame.display.get_surface()
+        return self.surface.get_size()
+
+    def fill(self, color, rect=None):
+        """
+        Fill the window or a part of it
+        Args:
+            color: tuple -> fill color
+            rect: pygame.Rect -> filled part (None -> the whole window)
+        """
+        self.surface.fill(color, rect)
+
+    def rect(self, color, rect, width=0, border_radius=0):
+        """
+        Draw a rectangle, same arguments as pygame.draw.rect
+        Args:
+            color: tuple -> color of the rectangle
+            rect: pygame.Rect -> rectangle
+            width: int -> border width (0 -> filled)
+            border_radius: int -> radius of the corners
+        Return:
+            pygame.Rect -> drawn rectangle
+        """
+        return pygame.draw.rect(self.surface, color, rect, width, border_radius)
+
+    def blit(self, source, position):
+        """
+        Draw a surface
+        Args:
+            source: pygame.Surface -> drawn surface
+            position: tuple -> top left corner (or a rectangle whose top left corner is used)
+        Return:
+            pygame.Rect -> covered rectangle
+        """
+        return self.surface.blit(source, position)
+
+    def present(self, dirty_rects=None):
+        """
+        Show the frame
+        Args:
+            dirty_rects: list -> only these rectangles changed (None -> the whole window)
+        """
+        if dirty_rects is None:
+            pygame.display.flip()
+        else:
+            pygame.display.update(dirty_rects)
+
+    def close(self):
+        """
+        Close the window
+        """
+        pygame.display.quit()
+        pygame.display.init()
+
+
+class TextureRenderer:
+    """
+    Composes the frames from SDL2 textures, every surface is uploaded only once
+    Args:
+        size: tuple -> size of the window
+        fullscreen: bool -> open the window in fullscreen
+        accelerated: bool -> require a hardware renderer (False allows the SDL software renderer, for testing)
+    """
+    name = "texture"
+    keeps_frame = False  # the back buffer is undefined after present -> every frame is drawn whole
+
+    def __init__(self, size, fullscreen=False, accelerated=True):
+        if Renderer is None:
+            raise pygame.error("pygame._sdl2 is not available")
+        self.window = Window(window_title, size=size, resizable=True)
+        try:
+            self.renderer = Renderer(self.window, accelerated=1 if accelerated else -1)
+        except sdl2_error:
+            self.window.destroy()
+            raise
+        self.textures = weakref.WeakKeyDictionary()  # surface -> texture, forgotten with the surface
+        self.shapes = {}  # (color, size, width, radius) -> texture of a rounded rectangle
+        self.open(size, fullscreen)
+
+    def open(self, size, fullscreen=False):
+        """
+        Change the size of the window or switch it to fullscreen
+        Args:
+            size: tuple -> size of the window (ignored in fullscreen)
+            fullscreen: bool -> use the whole screen
+        """
+        if fullscreen:
+            self.window.set_fullscreen(desktop=True)
+        else:
+            self.window.set_windowed()
+            self.window.size = size
+        self.shapes.clear()
+
+    @property
+    def size(self):
+        """
+        Current size of the window in pixels
+        """
+        return self.window.size
+
+    def texture(self, source):
+        """
+        Texture of a surface, uploaded on the first use
+        Args:
+            source: pygame.Surface -> surface of the texture
+        Return:
+            Texture -> uploaded texture
+        """
+        texture = self.textures.get(source)
+        if texture is None:
+            texture = Texture.from_surface(self.renderer, source)
+            self.textures[source] = texture
+        return texture
+
+    def fill(self, color, rect=None):
+        """
+        Fill the window or a part of it
+        Args:
+            color: tuple -> fill color
+            rect: pygame.Rect -> filled part (None -> the whole window)
+        """
+        self.renderer.draw_color = opaque(color)
+        if rect is None:
+            self.renderer.clear()
+        else:
+            self.renderer.fill_rect(rect)
+
+    def rect(self, color, rect, width=0, border_radius=0):
+        """
+        Draw a rectangle, same arguments as pygame.draw.rect
+        Plain rectangles are drawn by the renderer, rounded ones are drawn once in software and reused as a texture
+        Args:
+            color: tuple -> color of the rectangle
+            rect: pygame.Rect -> rectangle
+            width: int -> border width (0 -> filled)
+            border_radius: int -> radius of the corners
+        Return:
+            pygame.Rect -> drawn rectangle
+        """
+        rect = pygame.Rect(rect)
+        if border_radius == 0 and width in (0, 1):
+            self.renderer.draw_color = opaque(color)
+            if width == 0:
+                self.renderer.fill_rect(rect)
+            else:
+                self.renderer.draw_rect(rect)
+            return rect
+
+        key = (opaque(color), rect.size, width, border_radius)
+        texture = self.shapes.get(key)
+        if texture is None:
+            if len(self.shapes) >= shape_cache_size:
+                self.shapes.clear()
+            shape = pygame.Surface(rect.size, pygame.SRCALPHA)
+            pygame.draw.rect(shape, key[0], shape.get_rect(), width, border_radius)
+            texture = Texture.from_surface(self.renderer, shape)
+            self.shapes[key] = texture
+        texture.draw(dstrect=rect)
+        return rect
+
+    def blit(self, source, position):
+        """
+        Draw a surface from its texture
+        Args:
+            source: pygame.Surface -> drawn surface
+            position: tuple -> top left corner (or a rectangle whose top left corner is used)
+        Return:
+            pygame.Rect -> covered rectangle
+        """
+        rect = pygame.Rect(position[0], position[1], *source.get_size())
+        self.texture(source).draw(dstrect=rect)
+        return rect
+
+    def present(self, dirty_rects=None):
+        """
+        Show the frame, the whole frame is always shown
+        Args:
+            dirty_rects: list -> ignored, the frames are composed whole
+        """
+        self.renderer.present()
+
+    def close(self):
+        """
+        Close the window and free the textures
+        """
+        self.textures.clear()
+        self.shapes.clear()
+        self.window.destroy()
+
+
+def opaque(color):
+    """
+    Color without its alpha (the window has no alpha, some theme colors carry one)
+    Args:
+        color: tuple -> color with or without alpha
+    Return:
+        tuple -> (r, g, b, 255)
+    """
+    return int(color[0]), int(color[1]), int(color[2]), 255
+
+
+def create_renderer(name, size, fullscreen=False, current=None, accelerated=True):
+    """
+    Open the renderer of the given name, the texture renderer falls back to the software one if it cannot be used
+    Args:
+        name: str -> name of the renderer (see renderer_names)
+        size: tuple -> size of the window
+        fullscreen: bool -> open the window in fullscreen
+        current: SoftwareRenderer or TextureRenderer -> renderer used so far, closed when replaced
+        accelerated: bool -> the texture renderer requires hardware acceleration
+    Return:
+        SoftwareRenderer or TextureRenderer -> opened renderer
+    """
+    if current is not None and current.name == name:
+        return current
+    if current is not None:
+        # closing the display module would also close the texture window -> close first, then open
+        current.close()
+    if name == "texture":
+        try:
+            return TextureRenderer(size, fullscreen, accelerated)
+        except (pygame.error, sdl2_error):
+            pass  # no acceleration -> software
+    return SoftwareRenderer(size, fullscreen)
+
+
+# endregion RENDERERS
+
+# region MAIN
+
+def benchmark_frame(renderer, tiles, texts, size):
+    """
+    Draw one typical game frame: background, rounded board, 16 pieces and 3 texts
+    Args:
+        renderer: SoftwareRenderer or TextureRenderer -> renderer to draw with
+        tiles: list -> 16 piece surfaces
+        texts: list -> text surfaces
+        size: int -> size of the board in pixels
+    """
+    step = size // 4
+    renderer.fill((250, 248, 239))
+    renderer.rect((187, 173, 160), pygame.Rect(0, 0, size, size), 0, size // 40)
+    for cell, tile in enumerate(tiles):
+        renderer.blit(tile, (cell % 4 * step + step // 20, cell // 4 * step + step // 20))
+    for index, text in enumerate(texts):
+        renderer.blit(text, (10, size + 10 + index * text.get_height()))
+    renderer.present()
+
+
+def benchmark(width, height, frames, accelerated=True):
+    """
+    Measure the frame times of both renderers at the given window size
+    Args:
+        width: int -> width of the window
+        height: int -> height of the window
+        frames: int -> measured frames per renderer
+        accelerated: bool -> the texture renderer requires hardware acceleration
+    """
+    pygame.init()
+    board_size = min(width, height * 4 // 5)
+    tile_size = board_size // 4 - board_size // 10
+    font = pygame.font.SysFont('Arial', max(8, tile_size // 3))
+    tiles = []
+    for cell in range(16):
+        tile = pygame.Surface((tile_size, tile_size))
+        tile.fill((238, 228 - cell * 8, 218 - cell * 10))
+        value_text = font.render(str(2 << cell), True, (119, 110, 101))
+        tile.blit(value_text, value_text.get_rect(center=(tile_size // 2, tile_size // 2)))
+        tiles.append(tile)
+    texts = [font.render(text, True, (119, 110, 101)) for text in ("Score: 2048", "High Score: 4096", "Hint")]
+
+    current = None
+    for name in renderer_names:
+        current = create_renderer(name, (width, height), current=current, accelerated=accelerated)
+        if current.name != name:
+            print(f"{name}: not available, falls back to {current.name}")
+            continue
+        for _ in range(10):
+            benchmark_frame(current, tiles, texts, board_size)
+        times = []
+        for _ in range(frames):
+            start = time.perf_counter()
+            benchmark_frame(current, tiles, texts, board_size)
+            times.append((time.perf_counter() - start) * 1000)
+        times.sort()
+        print(f"{name}: {width}x{height}, p50 {times[len(times) // 2]:.2f} ms, "
+              f"p95 {times[len(times) * 95 // 100]:.2f} ms, max {times[-1]:.2f} ms")
+    current.close()
+    pygame.quit()
+
+
+def main():
+    """
+    Parse the command line options and run the benchmark
+    """
+    parser = argparse.ArgumentParser(description="Rendering backends of the 2048 game")
+    parser.add_argument('command', choices=['benchmark'], help="compare the frame times of the renderers")
+    parser.add_argument('--size', default='400x500', help="window size WIDTHxHEIGHT")
+    parser.add_argument('--frames', type=int, default=300, help="measured frames per renderer")
+    parser.add_argument('--allow-software', action='store_true',
+                        help="let the texture renderer use the SDL software renderer")
+    args = parser.parse_args()
+
+    width, _, height = args.size.partition('x')
+    benchmark(int(width), int(height), args.frames, not args.allow_software)
+
+
+if __name__ == "__main__":
+    main()
+
+# endregion MAIN
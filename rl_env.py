@@ -0,0 +1,281 @@
+import argparse  # for the benchmark options
+import time  # for the benchmark
+import numpy as np  # for stepping many boards in one call
+import bitboard
+from bitboard import directions
+
+try:
+    import gymnasium  # only needed for the observation and action spaces
+    from gymnasium import spaces
+except ImportError:
+    gymnasium = None
+
+"""
+---------------------------------------------------------------------
+    Gymnasium style reinforcement learning environment of 2048
+---------------------------------------------------------------------
+    - VectorGame2048Env steps many boards in one call with NumPy, Game2048Env is a single board
+    - Same rules as the game: every action spawns a new piece (2 with 90 %, 4 with 10 %),
+      even an action which does not move anything -> use the action mask to avoid those
+    - Actions: 0 = UP, 1 = DOWN, 2 = LEFT, 3 = RIGHT (the order of bitboard.directions)
+    - Observation: one-hot exponent planes (planes, 4, 4), plane 0 = empty cells, plane k = pieces 2 ** k
+    - The observation is a view of a buffer reused by every step (zero-copy) -> copy it to keep it
+    - Reward: score of the merges of the action
+    - An episode ends when no action changes the board, finished boards of the vector env are reset in the same step
+      (autoreset), the single env keeps the terminal board until reset is called
+    - Row moves come from the row tables of bitboard.py, so the rules are exactly the ones of game_logic.py
+    - gymnasium is optional, without it the environments keep the same API but have no spaces
+
+Benchmark: python rl_env.py --envs 4096 --steps 200
+---------------------------------------------------------------------
+"""
+
+# region VARIABLES
+"""
+Variables of the environment
+    - observation_planes: int -> number of one-hot planes (exponents 0 to 15)
+    - row_left_array: np.ndarray -> bitboard.row_left_table as an array
+    - row_right_array: np.ndarray -> bitboard.row_right_table as an array
+    - row_score_array: np.ndarray -> bitboard.row_score_table as an array
+    - row_cells_array: np.ndarray -> the 4 exponents of every row
+    - row_can_left_array: np.ndarray -> True if moving the row to the left changes it
+    - row_can_right_array: np.ndarray -> True if moving the row to the right changes it
+    - row_weights: np.ndarray -> weights packing 4 exponents to a row
+"""
+observation_planes = 16
+
+row_left_array = np.array(bitboard.row_left_table, dtype=np.uint16)
+row_right_array = np.array(bitboard.row_right_table, dtype=np.uint16)
+row_score_array = np.array(bitboard.row_score_table, dtype=np.int64)
+row_cells_array = ((np.arange(65536, dtype=np.uint32)[:, None] >> np.array([0, 4, 8, 12], dtype=np.uint32))
+                   & 0xF).astype(np.uint8)
+row_can_left_array = row_left_array != np.arange(65536, dtype=np.uint16)
+row_can_right_array = row_right_array != np.arange(65536, dtype=np.uint16)
+row_weights = np.array([1, 16, 256, 4096], dtype=np.uint16)
+
+
+# endregion VARIABLES
+
+# region VECTOR ENVIRONMENT
+
+class VectorGame2048Env:
+    """
+    Many 2048 boards stepped together with NumPy
+    Args:
+        num_envs: int -> number of boards
+        seed: int -> seed of the random generator (None -> random seed)
+        autoreset: bool -> reset finished boards in the step that finished them (False -> keep them until reset)
+    """
+
+    def __init__(self, num_envs, seed=None, autoreset=True):
+        self.num_envs = num_envs
+        self.autoreset = autoreset
+        self.rng = np.random.default_rng(seed)
+        self.boards = np.zeros((num_envs, 4, 4), dtype=np.uint8)
+        self.scores = np.zeros(num_envs, dtype=np.int64)
+        self.action_mask = np.ones((num_envs, 4), dtype=bool)
+        self.all_envs = np.arange(num_envs)
+        self.plane_values = np.arange(observation_planes, dtype=np.uint8)[None, :, None, None]
+        # one buffer for all observations, the bool buffer is viewed as uint8 without copying
+        self.observation_buffer = np.zeros((num_envs, observation_planes, 4, 4), dtype=bool)
+        self.observations = self.observation_buffer.view(np.uint8)
+        self.row_lines = np.zeros((num_envs, 4), dtype=np.uint16)
+        self.column_lines = np.zeros((num_envs, 4), dtype=np.uint16)
+        if gymnasium is not None:
+            self.single_observation_space = spaces.Box(0, 1, (observation_planes, 4, 4), np.uint8)
+            self.single_action_space = spaces.Discrete(4)
+
+    def reset(self, seed=None, options=None):
+        """
+        Reset all boards to two random pieces
+        Args:
+            seed: int -> new seed of the random generator (None -> keep the generator)
+            options: dict -> unused, for the gymnasium API
+        Return:
+            observations: np.ndarray -> one-hot planes of all boards (num_envs, planes, 4, 4)
+            infos: dict -> action_mask and score of all boards
+        """
+        if seed is not None:
+            self.rng = np.random.default_rng(seed)
+        self.reset_boards(self.all_envs)
+        self.update_lines()
+        return self.observe(), {"action_mask": self.action_mask, "score": self.scores}
+
+    def reset_boards(self, envs):
+        """
+        Clear the given boards and spawn the two initial pieces
+        Args:
+            envs: np.ndarray -> indexes of the boards
+        """
+        self.boards[envs] = 0
+        self.scores[envs] = 0
+        flat = self.boards.reshape(self.num_envs, 16)
+        first = self.rng.integers(0, 16, len(envs))
+        second = (first + self.rng.integers(1, 16, len(envs))) % 16
+        flat[envs, first] = np.where(self.rng.random(len(envs)) < 0.9, 1, 2)
+        flat[envs, second] = np.where(self.rng.random(len(envs)) < 0.9, 1, 2)
+
+    def update_lines(self):
+        """
+        Pack the rows and columns of all boards and compute the action masks
+        """
+        wide = self.boards.astype(np.uint16)
+        np.dot(wide, row_weights, out=self.row_lines)
+        np.dot(wide.transpose(0, 2, 1), row_weights, out=self.column_lines)
+        # UP and DOWN move columns, LEFT and RIGHT move rows
+        self.action_mask[:, 0] = row_can_left_array[self.column_lines].any(axis=1)
+        self.action_mask[:, 1] = row_can_right_array[self.column_lines].any(axis=1)
+        self.action_mask[:, 2] = row_can_left_array[self.row_lines].any(axis=1)
+        self.action_mask[:, 3] = row_can_right_array[self.row_lines].any(axis=1)
+
+    def observe(self):
+        """
+        Fill the observation buffer with the one-hot planes of the boards
+        Return:
+            np.ndarray -> observations (view of the reused buffer)
+        """
+        np.equal(self.boards[:, None, :, :], self.plane_values, out=self.observation_buffer)
+        return self.observations
+
+    def step(self, actions):
+        """
+        Apply one action on every board, spawn the new pieces and reset finished boards
+        Args:
+            actions: np.ndarray -> action of every board (0 = UP, 1 = DOWN, 2 = LEFT, 3 = RIGHT)
+        Return:
+            observations: np.ndarray -> one-hot planes after the step (view of the reused buffer)
+            rewards: np.ndarray -> score of the merges
+            terminations: np.ndarray -> True where the board was lost (already reset if autoreset is on)
+            truncations: np.ndarray -> always False
+            infos: dict -> action_mask, score and final_score (score of the finished boards)
+        """
+        actions = np.asarray(actions)
+        vertical = actions < 2
+        towards_end = (actions & 1).astype(bool)
+
+        # move every line with the left or right table, columns are the lines of vertical moves
+        lines = np.where(vertical[:, None], self.column_lines, self.row_lines)
+        moved = np.where(towards_end[:, None], row_right_array[lines], row_left_array[lines])
+        rewards = row_score_array[lines].sum(axis=1)
+        cells = row_cells_array[moved]
+        self.boards[:] = np.where(vertical[:, None, None], cells.transpose(0, 2, 1), cells)
+        self.scores += rewards
+
+        # spawn one piece on a random empty cell of every board
+        flat = self.boards.reshape(self.num_envs, 16)
+        empty = flat == 0
+        cell = (self.rng.random((self.num_envs, 16), dtype=np.float32) * empty).argmax(axis=1)
+        value = np.where(self.rng.random(self.num_envs, dtype=np.float32) < 0.9, 1, 2).astype(np.uint8)
+        has_empty = empty.any(axis=1)
+        flat[self.all_envs, cell] = np.where(has_empty, value, flat[self.all_envs, cell])
+
+        self.update_lines()
+        terminations = ~self.action_mask.any(axis=1)
+        final_scores = np.where(terminations, self.scores, 0)
+        if self.autoreset and terminations.any():
+            self.reset_boards(np.nonzero(terminations)[0])
+            self.update_lines()
+
+        infos = {"action_mask": self.action_mask, "score": self.scores, "final_score": final_scores}
+        return self.observe(), rewards, terminations, np.zeros(self.num_envs, dtype=bool), infos
+
+    def board_values(self, env):
+        """
+        Get one board in the list of lists format of the game
+        Args:
+            env: int -> index of the board
+        Return:
+            list -> values of the board
+        """
+        return [[1 << int(exponent) if exponent else 0 for exponent in row] for row in self.boards[env]]
+
+
+# endregion VECTOR ENVIRONMENT
+
+# region SINGLE ENVIRONMENT
+
+class Game2048Env(gymnasium.Env if gymnasium is not None else object):
+    """
+    One 2048 board with the gymnasium Env API, backed by a VectorGame2048Env of size 1
+    Args:
+        seed: int -> seed of the random generator (None -> random seed)
+    """
+
+    def __init__(self, seed=None):
+        # the terminal board is returned by the step which finished the game, only reset starts a new one
+        self.vector_env = VectorGame2048Env(1, seed, autoreset=False)
+        if gymnasium is not None:
+            self.observation_space = self.vector_env.single_observation_space
+            self.action_space = self.vector_env.single_action_space
+
+    def reset(self, seed=None, options=None):
+        """
+        Start a new game
+        Args:
+            seed: int -> new seed of the random generator (None -> keep the generator)
+            options: dict -> unused, for the gymnasium API
+        Return:
+            observation: np.ndarray -> one-hot planes of the board (planes, 4, 4)
+            info: dict -> action_mask and score
+        """
+        observations, _ = self.vector_env.reset(seed)
+        return observations[0], {"action_mask": self.vector_env.action_mask[0], "score": 0}
+
+    def step(self, action):
+        """
+        Apply one action
+        Args:
+            action: int -> action (0 = UP, 1 = DOWN, 2 = LEFT, 3 = RIGHT)
+        Return:
+            observation: np.ndarray -> one-hot planes after the step (the terminal board if the game is lost)
+            reward: int -> score of the merges
+            terminated: bool -> True if the game is lost (call reset to continue)
+            truncated: bool -> always False
+            info: dict -> action_mask (all False once the game is lost) and score of the game
+        """
+        observations, rewards, terminations, _, infos = self.vector_env.step(np.array([action]))
+        terminated = bool(terminations[0])
+        score = int(infos["score"][0])
+        return observations[0], int(rewards[0]), terminated, False, {"action_mask": infos["action_mask"][0],
+                                                                     "score": score}
+
+    def action_meanings(self):
+        """
+        Get the direction of every action
+        Return:
+            tuple -> directions in the order of the actions
+        """
+        return directions
+
+
+# endregion SINGLE ENVIRONMENT
+
+# region MAIN
+
+def main():
+    """
+    Benchmark the vector environment with random legal actions
+    """
+    parser = argparse.ArgumentParser(description="Benchmark of the 2048 vector environment")
+    parser.add_argument('--envs', type=int, default=4096, help="number of boards stepped together")
+    parser.add_argument('--steps', type=int, default=200, help="number of vector steps")
+    args = parser.parse_args()
+
+    env = VectorGame2048Env(args.envs, seed=0)
+    _, infos = env.reset()
+    rng = np.random.default_rng(1)
+    start = time.perf_counter()
+    finished = 0
+    for _ in range(args.steps):
+        actions = (rng.random((args.envs, 4), dtype=np.float32) * infos["action_mask"]).argmax(axis=1)
+        _, _, terminations, _, infos = env.step(actions)
+        finished += int(terminations.sum())
+    elapsed = time.perf_counter() - start
+    print(f"boards: {args.envs}, steps: {args.envs * args.steps}, finished games: {finished}")
+    print(f"env steps per second: {args.envs * args.steps / elapsed:.0f}")
+
+
+if __name__ == "__main__":
+    main()
+
+# endregion MAIN
@@ -0,0 +1,212 @@
+import random  # for the random spawns
+from game_logic import spawn_piece, can_move_check
+from bitboard import pack_board, transpose, row_left_table, row_right_table, row_score_table
+from ai import evaluate
+
+"""
+---------------------------------------------------------------------
+    Spawn rules of the 2048 game
+---------------------------------------------------------------------
+    - A spawn rule decides where new pieces appear and which values they get
+    - Every rule has the same spawn(board, rng, score) call as spawn_piece in game_logic.py
+    - ClassicSpawn: one piece, 2 with 90 % and 4 with 10 % (exactly spawn_piece)
+    - WeightedSpawn: configurable probabilities of 2, 4 and 8 and more pieces per move
+    - AdversarialSpawn: the piece is put where it hurts the player most (1-ply search)
+    - RampingSpawn: starts classic and gets harder with the score
+    - spawn_rules holds the presets selectable in the settings menu
+---------------------------------------------------------------------
+"""
+
+
+# region SPAWN RULES
+
+class ClassicSpawn:
+    """
+    Classic spawning -> one piece per move, one in ten chance of a 4
+    """
+
+    def spawn(self, board, rng=random, score=0):
+        """
+        Spawn the new pieces on the board and check if the game is over
+        Args:
+            board: list -> values of the board
+            rng: random.Random -> random generator used for the spawn
+            score: int -> current score of the game
+        Return:
+            board: list -> values of the board with the new pieces
+            bool -> True if the game is over
+        """
+        return spawn_piece(board, rng)
+
+
+class WeightedSpawn(ClassicSpawn):
+    """
+    Spawning with configurable piece values and number of pieces per move
+    Args:
+        weights: dict -> value -> probability of the value (e.g. {2: 0.8, 4: 0.15, 8: 0.05})
+        count: int -> number of pieces spawned per move
+    """
+
+    def __init__(self, weights, count=1):
+        self.values = list(weights)
+        self.cumulative_weights = []
+        total = 0.0
+        for value in self.values:
+            total += weights[value]
+            self.cumulative_weights.append(total)
+        self.count = count
+
+    def pick_value(self, rng):
+        """
+        Pick the value of a new piece by the weights
+        Args:
+            rng: random.Random -> random generator used for the spawn
+        Return:
+            int -> value of the new piece
+        """
+        return rng.choices(self.values, cum_weights=self.cumulative_weights)[0]
+
+    def spawn(self, board, rng=random, score=0):
+        empty_cells = [(row, col) for row in range(4) for col in range(4) if board[row][col] == 0]
+        spawned = 0
+        for row, col in rng.sample(empty_cells, min(self.count, len(empty_cells))):
+            board[row][col] = self.pick_value(rng)
+            spawned += 1
+
+        if spawned == 0 and not can_move_check(board):
+            return board, True  # game over
+        return board, False  # game not over
+
+
+class AdversarialSpawn(ClassicSpawn):
+    """
+    Spawning of the worst possible piece -> every empty cell and value is scored by the best reply of the player
+    The reply is searched only one move deep, every candidate changes just one row and one column,
+    so the moves of the other rows are taken from the row tables only once per spawn
+    Args:
+        values: tuple -> values the adversary can choose from
+    """
+
+    def __init__(self, values=(2, 4)):
+        self.exponents = [value.bit_length() - 1 for value in values]
+
+    def worst_spawn(self, board):
+        """
+        Find the spawn which leaves the player with the worst best reply
+        Args:
+            board: int -> packed board
+        Return:
+            tuple -> (row, col, exponent) of the worst spawn, None if the board is full
+        """
+        transposed = transpose(board)
+        row_mask = [0xFFFF << (16 * i) for i in range(4)]
+
+        # move all rows and columns of the board once, a candidate replaces only one of them
+        left = right = up = down = 0
+        row_scores = []
+        column_scores = []
+        for i in range(4):
+            row = (board >> (16 * i)) & 0xFFFF
+            column = (transposed >> (16 * i)) & 0xFFFF
+            left |= row_left_table[row] << (16 * i)
+            right |= row_right_table[row] << (16 * i)
+            up |= row_left_table[column] << (16 * i)
+            down |= row_right_table[column] << (16 * i)
+            row_scores.append(row_score_table[row])
+            column_scores.append(row_score_table[column])
+        rows_score = sum(row_scores)
+        columns_score = sum(column_scores)
+
+        worst = None
+        worst_value = float('inf')
+        for row_index in range(4):
+            row = (board >> (16 * row_index)) & 0xFFFF
+            for col_index in range(4):
+                if (row >> (4 * col_index)) & 0xF:
+                    continue
+                column = (transposed >> (16 * col_index)) & 0xFFFF
+                for exponent in self.exponents:
+                    new_row = row | (exponent << (4 * col_index))
+                    new_column = column | (exponent << (4 * row_index))
+                    candidate = board | (exponent << (16 * row_index + 4 * col_index))
+                    candidate_transposed = transposed | (exponent << (16 * col_index + 4 * row_index))
+                    row_shift = 16 * row_index
+                    column_shift = 16 * col_index
+                    row_score = rows_score - row_scores[row_index] + row_score_table[new_row]
+                    column_score = columns_score - column_scores[col_index] + row_score_table[new_column]
+
+                    best_reply = -1.0
+                    # the heuristic counts rows and columns -> a transposed board has the same value
+                    for moved, original, move_score in (
+                            ((left & ~row_mask[row_index]) | (row_left_table[new_row] << row_shift),
+                             candidate, row_score),
+                            ((right & ~row_mask[row_index]) | (row_right_table[new_row] << row_shift),
+                             candidate, row_score),
+                            ((up & ~row_mask[col_index]) | (row_left_table[new_column] << column_shift),
+                             candidate_transposed, column_score),
+                            ((down & ~row_mask[col_index]) | (row_right_table[new_column] << column_shift),
+                             candidate_transposed, column_score)):
+                        if moved != original:
+                            reply = move_score + evaluate(moved)
+                            if reply > best_reply:
+                                best_reply = reply
+
+                    if best_reply < worst_value:
+                        worst_value = best_reply
+                        worst = (row_index, col_index, exponent)
+        return worst
+
+    def spawn(self, board, rng=random, score=0):
+        worst = self.worst_spawn(pack_board(board))
+        if worst is None:
+            if not can_move_check(board):
+                return board, True  # game over
+            return board, False  # game not over
+
+        row, col, exponent = worst
+        board[row][col] = 1 << exponent
+        return board, False  # game not over
+
+
+class RampingSpawn(ClassicSpawn):
+    """
+    Spawning which gets harder with the score -> more 4s and more and more adversarial spawns
+    Args:
+        ramp_score: int -> score at which the full difficulty is reached
+        start_four_chance: float -> chance of a 4 at the start
+        end_four_chance: float -> chance of a 4 at the full difficulty
+        end_adversarial_chance: float -> chance of an adversarial spawn at the full difficulty
+    """
+
+    def __init__(self, ramp_score=20000, start_four_chance=0.1, end_four_chance=0.3, end_adversarial_chance=0.5):
+        self.ramp_score = ramp_score
+        self.start_four_chance = start_four_chance
+        self.end_four_chance = end_four_chance
+        self.end_adversarial_chance = end_adversarial_chance
+        self.adversarial = AdversarialSpawn()
+
+    def spawn(self, board, rng=random, score=0):
+        difficulty = min(1.0, score / self.ramp_score)
+        if rng.random() < difficulty * self.end_adversarial_chance:
+            return self.adversarial.spawn(board, rng, score)
+        four_chance = self.start_four_chance + (self.end_four_chance - self.start_four_chance) * difficulty
+        return WeightedSpawn({2: 1.0 - four_chance, 4: four_chance}).spawn(board, rng, score)
+
+
+# endregion SPAWN RULES
+
+# region PRESETS
+"""
+Spawn rules selectable in the settings menu
+    - spawn_rules: dict -> name of the rule -> spawn rule
+"""
+spawn_rules = {
+    "classic": ClassicSpawn(),
+    "more fours": WeightedSpawn({2: 0.7, 4: 0.3}),
+    "eights": WeightedSpawn({2: 0.8, 4: 0.15, 8: 0.05}),
+    "double": WeightedSpawn({2: 0.9, 4: 0.1}, count=2),
+    "ramping": RampingSpawn(),
+    "adversarial": AdversarialSpawn()
+}
+
+# endregion PRESETS
@@ -0,0 +1,244 @@
+from bitboard import directions, pack_board, transpose
+
+"""
+---------------------------------------------------------------------
+    Symmetries of the 2048 board
+---------------------------------------------------------------------
+    - The board has 8 symmetries (rotations and reflections), all of them play exactly the same
+    - Every symmetry is a number 0 to 7 built from three steps applied in this order:
+      1 -> mirror the columns (LEFT <-> RIGHT), 2 -> flip the rows (UP <-> DOWN), 4 -> transpose
+    - The canonical key of a board is the smallest packed board of its 8 symmetries,
+      caches keyed by it store one entry for all 8 boards
+    - A move found on the canonical board is turned back into a move of the real board by restore_direction
+    - Mirroring is one lookup per row in a 65536 entry table, flipping swaps the 16 bit rows,
+      transposing uses bitboard.transpose -> cheap enough to call on every searched node
+---------------------------------------------------------------------
+"""
+
+# region VARIABLES
+"""
+Variables of the symmetries
+    - symmetry_count: int -> number of symmetries of the board
+    - cell_maps: list -> for every symmetry the new cell (row * 4 + col) of every cell
+    - inverse_symmetries: list -> symmetry which undoes the symmetry
+    - direction_maps: list -> for every symmetry the new direction of every direction
+    - restore_maps: list -> for every symmetry the original direction of every new direction
+    - row_mirror_table: list -> row with reversed cells, indexed by the packed row
+"""
+symmetry_count = 8
+
+cell_maps = []
+inverse_symmetries = []
+direction_maps = []
+restore_maps = []
+
+row_mirror_table = [0] * 65536
+
+
+# endregion VARIABLES
+
+# region TABLES
+
+def map_cell(row, col, symmetry):
+    """
+    Position of a cell after the symmetry
+    Args:
+        row: int -> row of the cell
+        col: int -> column of the cell
+        symmetry: int -> symmetry (0 to 7)
+    Return:
+        tuple -> (row, col) after the symmetry
+    """
+    if symmetry & 1:
+        col = 3 - col
+    if symmetry & 2:
+        row = 3 - row
+    if symmetry & 4:
+        row, col = col, row
+    return row, col
+
+
+def map_direction(move_direction, symmetry):
+    """
+    Direction of a move after the symmetry
+    Args:
+        move_direction: str -> direction of the move
+        symmetry: int -> symmetry (0 to 7)
+    Return:
+        str -> direction which does the same move on the transformed board
+    """
+    if symmetry & 1:
+        move_direction = {"LEFT": "RIGHT", "RIGHT": "LEFT"}.get(move_direction, move_direction)
+    if symmetry & 2:
+        move_direction = {"UP": "DOWN", "DOWN": "UP"}.get(move_direction, move_direction)
+    if symmetry & 4:
+        move_direction = {"UP": "LEFT", "LEFT": "UP", "DOWN": "RIGHT", "RIGHT": "DOWN"}[move_direction]
+    return move_direction
+
+
+def build_tables():
+    """
+    Fill the cell, direction and mirror tables of all symmetries
+    """
+    for symmetry in range(symmetry_count):
+        cell_maps.append([4 * new_row + new_col for new_row, new_col in
+                          (map_cell(cell // 4, cell % 4, symmetry) for cell in range(16))])
+        direction_maps.append({move_direction: map_direction(move_direction, symmetry)
+                               for move_direction in directions})
+        restore_maps.append({map_direction(move_direction, symmetry): move_direction
+                             for move_direction in directions})
+
+    for symmetry in range(symmetry_count):
+        for inverse in range(symmetry_count):
+            if all(cell_maps[inverse][cell_maps[symmetry][cell]] == cell for cell in range(16)):
+                inverse_symmetries.append(inverse)
+                break
+
+    for row in range(65536):
+        row_mirror_table[row] = (((row & 0xF) << 12) | (((row >> 4) & 0xF) << 8)
+                                 | (((row >> 8) & 0xF) << 4) | (row >> 12))
+
+
+build_tables()
+
+
+# endregion TABLES
+
+# region PACKED BOARDS
+
+def mirror(board):
+    """
+    Mirror the columns of the packed board (first column becomes the last one)
+    Args:
+        board: int -> packed board
+    Return:
+        int -> mirrored board
+    """
+    table = row_mirror_table
+    return (table[board & 0xFFFF]
+            | (table[(board >> 16) & 0xFFFF] << 16)
+            | (table[(board >> 32) & 0xFFFF] << 32)
+            | (table[board >> 48] << 48))
+
+
+def flip(board):
+    """
+    Flip the rows of the packed board (first row becomes the last one)
+    Args:
+        board: int -> packed board
+    Return:
+        int -> flipped board
+    """
+    return (((board & 0xFFFF) << 48) | (((board >> 16) & 0xFFFF) << 32)
+            | (((board >> 32) & 0xFFFF) << 16) | (board >> 48))
+
+
+def transform_board(board, symmetry):
+    """
+    Apply a symmetry to the packed board
+    Args:
+        board: int -> packed board
+        symmetry: int -> symmetry (0 to 7)
+    Return:
+        int -> transformed board
+    """
+    if symmetry & 1:
+        board = mirror(board)
+    if symmetry & 2:
+        board = flip(board)
+    if symmetry & 4:
+        board = transpose(board)
+    return board
+
+
+def all_symmetries(board):
+    """
+    All 8 symmetries of the packed board
+    Args:
+        board: int -> packed board
+    Return:
+        list -> transformed boards, indexed by the symmetry
+    """
+    mirrored = mirror(board)
+    flipped = flip(board)
+    rotated = flip(mirrored)
+    return [board, mirrored, flipped, rotated,
+            transpose(board), transpose(mirrored), transpose(flipped), transpose(rotated)]
+
+
+def canonical_board(board):
+    """
+    Canonical key of the packed board -> the smallest of its 8 symmetries
+    Args:
+        board: int -> packed board
+    Return:
+        key: int -> canonical board, the same for all 8 symmetries of the board
+        symmetry: int -> symmetry which turns the board into the canonical board
+    """
+    boards = all_symmetries(board)
+    key = min(boards)
+    return key, boards.index(key)
+
+
+# endregion PACKED BOARDS
+
+# region BOARD VALUES
+
+def transform_values(board_values, symmetry):
+    """
+    Apply a symmetry to a board of values (list of lists as used by the game)
+    Args:
+        board_values: list -> values of the board
+        symmetry: int -> symmetry (0 to 7)
+    Return:
+        list -> new transformed board values
+    """
+    new_values = [[0 for _ in range(4)] for _ in range(4)]
+    cell_map = cell_maps[symmetry]
+    for cell in range(16):
+        new_cell = cell_map[cell]
+        new_values[new_cell // 4][new_cell % 4] = board_values[cell // 4][cell % 4]
+    return new_values
+
+
+def canonical_values(board_values):
+    """
+    Canonical key of a board of values
+    Args:
+        board_values: list -> values of the board
+    Return:
+        key: int -> canonical packed board
+        symmetry: int -> symmetry which turns the board into the canonical board
+    """
+    return canonical_board(pack_board(board_values))
+
+
+# endregion BOARD VALUES
+
+# region DIRECTIONS
+
+def transform_direction(move_direction, symmetry):
+    """
+    Direction on the transformed board which does the same move as the direction on the original board
+    Args:
+        move_direction: str -> direction on the original board
+        symmetry: int -> symmetry (0 to 7)
+    Return:
+        str -> direction on the transformed board
+    """
+    return direction_maps[symmetry][move_direction]
+
+
+def restore_direction(move_direction, symmetry):
+    """
+    Direction on the original board of a move found on the transformed (e.g. canonical) board
+    Args:
+        move_direction: str -> direction on the transformed board
+        symmetry: int -> symmetry which turned the original board into the transformed board
+    Return:
+        str -> direction on the original board
+    """
+    return restore_maps[symmetry][move_direction]
+
+
+# endregion DIRECTIONS
@@ -0,0 +1,591 @@
+import argparse  # for the command line options
+import json  # for the table description
+import multiprocessing  # for computing the layers on all cores
+import os  # for the table and work files
+import shutil  # for removing the work files
+import time  # for the generation statistics
+import numpy as np  # for the vectorized retrograde analysis and the mapped table
+from bitboard import directions, merge_line
+
+"""
+---------------------------------------------------------------------
+    Endgame tablebase of small 2048 boards
+---------------------------------------------------------------------
+    - Exact probability to reach the target tile with perfect play, for every position of a board space:
+      all boards of one size whose pieces are below the target (3x3 up to 256 or 512,
+      4x4 only for tiny targets like 8 or 16 -> the restricted 4x4 space)
+    - Positions are stored once per symmetry class (canonical board, smallest key of the 8 symmetries)
+    - Retrograde analysis by the sum of the pieces: a move keeps the sum, a spawn adds 2 or 4
+      -> the positions of one sum only depend on the two sums above it,
+      the layers are solved from the largest sum down to the smallest
+    - Every layer is split into chunks solved by a process pool, the solved layers of the work directory
+      are read by the workers as memory-mapped files
+    - Every solved layer is saved at once -> an interrupted generation resumes at the first unsolved layer
+    - The finished table is one .npy file of (key, probability) sorted by sum and key, mapped into memory
+      by the game -> loading is instant and a lookup is a binary search in one layer
+    - The hint engine and the AI mode use the 4x4 table for the positions it covers and search otherwise
+
+Table files
+    - <size>x<size>_<target>.npy -> (key, probability * 65535) of every canonical position
+    - <size>x<size>_<target>.json -> size, target and the first position of every layer
+
+Usage: python tablebase.py generate --size 3 --target 256 --workers 4
+       python tablebase.py info --size 3 --target 256
+---------------------------------------------------------------------
+"""
+
+# region VARIABLES
+"""
+Variables of the tablebase
+    - tablebases_directory: str -> directory of the tables and of the work files of unfinished generations
+    - index_chunk: int -> boards enumerated by one task of the pool
+    - layer_chunk: int -> positions solved by one task of the pool
+    - value_levels: int -> probabilities are stored as integers from 0 to value_levels
+    - tie_tolerance: float -> moves closer than this are equally good, the table does not choose between them
+    - layer_cache_size: int -> solved layers kept in memory by a worker
+    - worker_*: state of a worker process (board space, work directory and loaded layers)
+"""
+tablebases_directory = 'assets/tablebases'
+index_chunk = 1 << 20
+layer_chunk = 1 << 16
+value_levels = 65535
+tie_tolerance = 1e-4
+layer_cache_size = 4
+
+worker_space = None
+worker_directory = None
+worker_layers = {}
+
+
+# endregion VARIABLES
+
+# region BOARD SPACE
+
+class BoardSpace:
+    """
+    All boards of one size with pieces below the target, vectorized over many boards at once
+    A board is a row of exponents (row by row, 0 -> empty), its key is the number with these exponents as digits
+    Args:
+        size: int -> rows and columns of the board
+        target: int -> exponent of the target piece (3 -> 8, 8 -> 256)
+    """
+
+    def __init__(self, size, target):
+        if target < 3:
+            raise ValueError("the target must be at least 8, smaller pieces are spawned")
+        self.size = size
+        self.target = target
+        self.cells = size * size
+        self.count = target ** self.cells
+        self.key_type = np.uint32 if self.count <= 1 << 32 else np.uint64
+        self.layer_count = self.cells * (1 << (target - 2)) + 1
+        self.weights = target ** np.arange(self.cells, dtype=np.int64)
+
+        # key of every symmetry -> one product of the board with this matrix gives all 8 keys
+        symmetry_weights = np.zeros((self.cells, 8), dtype=np.float64)
+        for symmetry in range(8):
+            for row in range(size):
+                for col in range(size):
+                    new_row, new_col = map_cell(row, col, symmetry, size)
+                    symmetry_weights[row * size + col, symmetry] = self.weights[new_row * size + new_col]
+        self.symmetry_weights = symmetry_weights
+
+        # every line of exponents below the target after a move towards its start
+        self.row_weights = target ** np.arange(size, dtype=np.int64)
+        rows = np.arange(target ** size, dtype=np.int64)
+        row_cells = (rows[:, None] // self.row_weights) % target
+        self.row_table = np.array([merge_line(list(line))[0] for line in row_cells], dtype=np.uint8)
+
+    def decode(self, keys):
+        """
+        Exponents of boards from their keys
+        Args:
+            keys: np.ndarray -> keys of the boards
+        Return:
+            np.ndarray -> (boards, cells) exponents
+        """
+        return ((np.asarray(keys, dtype=np.int64)[:, None] // self.weights) % self.target).astype(np.uint8)
+
+    def canonical_keys(self, cells):
+        """
+        Key of the canonical board of every board -> the smallest key of its 8 symmetries
+        Args:
+            cells: np.ndarray -> (boards, cells) exponents
+        Return:
+            np.ndarray -> canonical keys (int64)
+        """
+        # every key is below 2 ** 53 -> the float product is exact and much faster than integers
+        return (cells @ self.symmetry_weights).min(axis=1).astype(np.int64)
+
+    def layers(self, cells):
+        """
+        Layer of every board -> half of the sum of its pieces
+        Args:
+            cells: np.ndarray -> (boards, cells) exponents
+        Return:
+            np.ndarray -> layers of the boards
+        """
+        return np.where(cells > 0, np.left_shift(1, cells.astype(np.int64)) >> 1, 0).sum(axis=1)
+
+    def move(self, cells, move_direction):
+        """
+        Boards after a move, a merged target piece is the exponent target
+        Args:
+            cells: np.ndarray -> (boards, cells) exponents below the target
+            move_direction: str -> direction of the move
+        Return:
+            np.ndarray -> (boards, cells) exponents after the move
+        """
+        grid = cells.reshape(-1, self.size, self.size)
+        if move_direction in ("UP", "DOWN"):
+            grid = grid.transpose(0, 2, 1)
+        if move_direction in ("RIGHT", "DOWN"):
+            grid = grid[:, :, ::-1]
+        moved = self.row_table[grid.astype(np.int64) @ self.row_weights]
+        if move_direction in ("RIGHT", "DOWN"):
+            moved = moved[:, :, ::-1]
+        if move_direction in ("UP", "DOWN"):
+            moved = moved.transpose(0, 2, 1)
+        return moved.reshape(-1, self.cells)
+
+
+def map_cell(row, col, symmetry, size):
+    """
+    Position of a cell after the symmetry, same numbering of the symmetries as symmetry.py for any size
+    Args:
+        row: int -> row of the cell
+        col: int -> column of the cell
+        symmetry: int -> symmetry (0 to 7)
+        size: int -> rows and columns of the board
+    Return:
+        tuple -> (row, col) after the symmetry
+    """
+    if symmetry & 1:
+        col = size - 1 - col
+    if symmetry & 2:
+        row = size - 1 - row
+    if symmetry & 4:
+        row, col = col, row
+    return row, col
+
+
+def move_probabilities(space, cells, layer, layer_table, value_scale=1.0):
+    """
+    Probability to reach the target after every move of many boards of the same layer
+    Args:
+        space: BoardSpace -> space of the boards
+        cells: np.ndarray -> (boards, cells) exponents
+        layer: int -> layer of all the boards
+        layer_table: callable -> layer -> (sorted canonical keys, values) of a solved layer
+        value_scale: float -> factor from the stored values to probabilities
+    Return:
+        np.ndarray -> (boards, 4) probability of every move in the order of directions, -1 if the move is not possible
+    """
+    result = np.full((len(cells), len(directions)), -1.0)
+    for index, move_direction in enumerate(directions):
+        moved = space.move(cells, move_direction)
+        changed = (moved != cells).any(axis=1)
+        won = changed & (moved >= space.target).any(axis=1)
+        result[won, index] = 1.0
+        open_boards = np.flatnonzero(changed & ~won)
+        if len(open_boards) == 0:
+            continue
+
+        moved = moved[open_boards]
+        empty = moved == 0
+        total = np.zeros(len(moved))
+        for cell in range(space.cells):
+            rows = np.flatnonzero(empty[:, cell])
+            if len(rows) == 0:
+                continue
+            spawned = moved[rows]
+            for exponent, probability in ((1, 0.9), (2, 0.1)):
+                spawned[:, cell] = exponent
+                keys, values = layer_table(layer + exponent)
+                found = values[np.searchsorted(keys, space.canonical_keys(spawned).astype(keys.dtype))]
+                total[rows] += probability * value_scale * found
+        # a move which changed the board without a merge always leaves an empty cell
+        result[open_boards, index] = total / empty.sum(axis=1)
+    return result
+
+
+# endregion BOARD SPACE
+
+# region GENERATION
+
+def table_name(size, target):
+    """
+    Name of the table of a board space
+    Args:
+        size: int -> rows and columns of the board
+        target: int -> exponent of the target piece
+    Return:
+        str -> name of the table files
+    """
+    return f"{size}x{size}_{1 << target}"
+
+
+def init_worker(size, target, directory):
+    """
+    Initialize a worker process -> build the board space
+    Args:
+        size: int -> rows and columns of the board
+        target: int -> exponent of the target piece
+        directory: str -> work directory of the generation
+    """
+    global worker_space, worker_directory
+    worker_space = BoardSpace(size, target)
+    worker_directory = directory
+    worker_layers.clear()
+
+
+def worker_layer_table(layer):
+    """
+    Solved layer read by a worker, the last few layers stay loaded
+    Args:
+        layer: int -> layer
+    Return:
+        tuple -> (sorted canonical keys, probabilities) of the layer
+    """
+    table = worker_layers.get(layer)
+    if table is None:
+        table = (np.load(os.path.join(worker_directory, f"positions_{layer:06}.npy")),
+                 np.load(os.path.join(worker_directory, f"values_{layer:06}.npy")))
+        if len(worker_layers) >= layer_cache_size:
+            del worker_layers[max(worker_layers, key=lambda loaded: abs(loaded - layer))]
+        worker_layers[layer] = table
+    return table
+
+
+def index_task(task):
+    """
+    Enumerate a range of keys and keep the canonical boards
+    Args:
+        task: tuple -> (first key, end key)
+    Return:
+        tuple -> (canonical keys, their layers)
+    """
+    start, end = task
+    keys = np.arange(start, end, dtype=np.int64)
+    cells = worker_space.decode(keys)
+    canonical = worker_space.canonical_keys(cells) == keys
+    # the empty board is not a position of the game
+    canonical[keys == 0] = False
+    return keys[canonical].astype(worker_space.key_type), worker_space.layers(cells[canonical])
+
+
+def layer_task(task):
+    """
+    Solve a chunk of a layer -> probability of the best move of every position
+    Args:
+        task: tuple -> (layer, first position, end position)
+    Return:
+        np.ndarray -> float32 probabilities of the positions
+    """
+    layer, start, end = task
+    keys = np.load(os.path.join(worker_directory, f"positions_{layer:06}.npy"), mmap_mode='r')[start:end]
+    probabilities = move_probabilities(worker_space, worker_space.decode(keys), layer, worker_layer_table)
+    # no possible move -> the game is lost (-1 becomes 0)
+    return np.maximum(probabilities.max(axis=1), 0.0).astype(np.float32)
+
+
+def save_array(path, array):
+    """
+    Save an array atomically -> a file of the work directory is either complete or missing
+    Args:
+        path: str -> path of the .npy file
+        array: np.ndarray -> array to save
+    """
+    temporary_path = path + '.tmp'
+    with open(temporary_path, 'wb') as f:
+        np.save(f, array)
+    os.replace(temporary_path, path)
+
+
+def index_positions(space, directory, pool):
+    """
+    Enumerate all canonical positions and save them layer by layer, skipped if the work directory has them
+    Args:
+        space: BoardSpace -> board space of the table
+        directory: str -> work directory
+        pool: multiprocessing.Pool -> worker pool
+    Return:
+        list -> number of positions of every layer
+    """
+    index_path = os.path.join(directory, 'index.json')
+    if os.path.exists(index_path):
+        with open(index_path, 'r') as f:
+            return json.load(f)["layer_sizes"]
+
+    layer_parts = [[] for _ in range(space.layer_count)]
+    tasks = [(start, min(start + index_chunk, space.count)) for start in range(0, space.count, index_chunk)]
+    # ordered results -> the keys of every layer stay sorted
+    for keys, layers in pool.imap(index_task, tasks):
+        order = np.argsort(layers, kind='stable')
+        keys, layers = keys[order], layers[order]
+        bounds = np.flatnonzero(np.diff(layers)) + 1
+        for part in np.split(np.arange(len(keys)), bounds):
+            if len(part):
+                layer_parts[layers[part[0]]].append(keys[part])
+
+    layer_sizes = []
+    for layer, parts in enumerate(layer_parts):
+        keys = np.concatenate(parts) if parts else np.zeros(0, dtype=space.key_type)
+        save_array(os.path.join(directory, f"positions_{layer:06}.npy"), keys)
+        layer_sizes.append(len(keys))
+    with open(index_path, 'w') as f:
+        json.dump({"layer_sizes": layer_sizes}, f)
+    return layer_sizes
+
+
+def solve_layers(layer_sizes, directory, pool):
+    """
+    Solve the layers from the largest sum down, layers solved by an earlier run are skipped
+    Args:
+        layer_sizes: list -> number of positions of every layer
+        directory: str -> work directory
+        pool: multiprocessing.Pool -> worker pool
+    """
+    total = sum(layer_sizes)
+    solved = 0
+    for layer in range(len(layer_sizes) - 1, -1, -1):
+        values_path = os.path.join(directory, f"values_{layer:06}.npy")
+        if not os.path.exists(values_path):
+            tasks = [(layer, start, min(start + layer_chunk, layer_sizes[layer]))
+                     for start in range(0, layer_sizes[layer], layer_chunk)]
+            parts = list(pool.imap(layer_task, tasks))
+            save_array(values_path, np.concatenate(parts) if parts else np.zeros(0, dtype=np.float32))
+        solved += layer_sizes[layer]
+        if layer_sizes[layer] and layer % 16 == 0:
+            print(f"layer {layer}: {solved}/{total} positions solved")
+
+
+def assemble_table(space, layer_sizes, directory, path):
+    """
+    Join the solved layers to the final table and write its description
+    Args:
+        space: BoardSpace -> board space of the table
+        layer_sizes: list -> number of positions of every layer
+        directory: str -> work directory
+        path: str -> path of the .npy table
+    """
+    dtype = np.dtype([('key', space.key_type), ('value', np.uint16)])
+    temporary_path = path + '.tmp.npy'
+    table = np.lib.format.open_memmap(temporary_path, mode='w+', dtype=dtype, shape=(sum(layer_sizes),))
+    layer_starts = [0]
+    for layer, layer_size in enumerate(layer_sizes):
+        start = layer_starts[-1]
+        table['key'][start:start + layer_size] = np.load(os.path.join(directory, f"positions_{layer:06}.npy"))
+        values = np.load(os.path.join(directory, f"values_{layer:06}.npy"))
+        table['value'][start:start + layer_size] = np.round(values * value_levels).astype(np.uint16)
+        layer_starts.append(start + layer_size)
+    table.flush()
+    del table
+    os.replace(temporary_path, path)
+    with open(os.path.splitext(path)[0] + '.json', 'w') as f:
+        json.dump({"size": space.size, "target": 1 << space.target, "layer_starts": layer_starts}, f)
+
+
+def generate_tablebase(size, target, directory=tablebases_directory, workers=None):
+    """
+    Generate the table of a board space, an interrupted generation continues where it stopped
+    Args:
+        size: int -> rows and columns of the board
+        target: int -> exponent of the target piece
+        directory: str -> directory of the tables
+        workers: int -> number of worker processes (None -> all cores)
+    Return:
+        str -> path of the table
+    """
+    space = BoardSpace(size, target)
+    name = table_name(size, target)
+    path = os.path.join(directory, name + '.npy')
+    work_directory = os.path.join(directory, name + '.parts')
+    os.makedirs(work_directory, exist_ok=True)
+
+    with multiprocessing.Pool(workers, initializer=init_worker, initargs=(size, target, work_directory)) as pool:
+        layer_sizes = index_positions(space, work_directory, pool)
+        solve_layers(layer_sizes, work_directory, pool)
+    assemble_table(space, layer_sizes, work_directory, path)
+    shutil.rmtree(work_directory)
+    return path
+
+
+# endregion GENERATION
+
+# region LOOKUP
+
+class Tablebase:
+    """
+    Generated table mapped into memory, nothing is read until a position is looked up
+    Args:
+        path: str -> path of the .npy table
+    """
+
+    def __init__(self, path):
+        with open(os.path.splitext(path)[0] + '.json', 'r') as f:
+            description = json.load(f)
+        self.space = BoardSpace(description["size"], description["target"].bit_length() - 1)
+        self.layer_starts = description["layer_starts"]
+        table = np.load(path, mmap_mode='r')
+        self.keys = table['key']
+        self.values = table['value']
+
+    def layer_table(self, layer):
+        """
+        Mapped keys and values of one layer
+        Args:
+            layer: int -> layer
+        Return:
+            tuple -> (sorted canonical keys, stored values) of the layer
+        """
+        start, end = self.layer_starts[layer], self.layer_starts[layer + 1]
+        return self.keys[start:end], self.values[start:end]
+
+    def board_cells(self, board_values):
+        """
+        Exponents of a board of the game, None if the table does not cover it
+        Args:
+            board_values: list -> values of the board
+        Return:
+            np.ndarray -> (1, cells) exponents, None if the size differs or a piece reached the target
+        """
+        if len(board_values) != self.space.size:
+            return None
+        exponents = [value.bit_length() - 1 if value else 0 for row in board_values for value in row]
+        if max(exponents) >= self.space.target:
+            return None
+        return np.array([exponents], dtype=np.uint8)
+
+    def move_values(self, board_values):
+        """
+        Probability to reach the target after every possible move
+        Args:
+            board_values: list -> values of the board
+        Return:
+            dict -> direction -> probability, None if the table does not cover the board
+        """
+        cells = self.board_cells(board_values)
+        if cells is None:
+            return None
+        layer = int(self.space.layers(cells)[0])
+        probabilities = move_probabilities(self.space, cells, layer, self.layer_table, 1.0 / value_levels)[0]
+        return {move_direction: float(probability)
+                for move_direction, probability in zip(directions, probabilities) if probability >= 0}
+
+    def win_probability(self, board_values):
+        """
+        Probability to reach the target from a board with perfect play
+        Args:
+            board_values: list -> values of the board
+        Return:
+            float -> probability, None if the table does not cover the board
+        """
+        values = self.move_values(board_values)
+        if values is None:
+            return None
+        return max(values.values(), default=0.0)
+
+    def best_move(self, board_values):
+        """
+        Best move of a board, only if the table covers it and the moves are not all equally good
+        Args:
+            board_values: list -> values of the board
+        Return:
+            str -> best direction, None if the search has to decide
+        """
+        values = self.move_values(board_values)
+        if not values or max(values.values()) - min(values.values()) < tie_tolerance:
+            return None
+        return max(values, key=values.get)
+
+
+def find_tablebase(size, directory=tablebases_directory):
+    """
+    Map the table of a board size with the largest target, if one was generated
+    Args:
+        size: int -> rows and columns of the board
+        directory: str -> directory of the tables
+    Return:
+        Tablebase -> mapped table, None if there is no table of the size
+    """
+    try:
+        names = os.listdir(directory)
+    except OSError:
+        return None
+    prefix = f"{size}x{size}_"
+    targets = [int(name[len(prefix):-4]) for name in names
+               if name.startswith(prefix) and name.endswith('.npy') and name[len(prefix):-4].isdigit()]
+    for target in sorted(targets, reverse=True):
+        try:
+            return Tablebase(os.path.join(directory, f"{prefix}{target}.npy"))
+        except (OSError, ValueError, KeyError):
+            continue
+    return None
+
+
+# endregion LOOKUP
+
+# region MAIN
+
+def start_probability(tablebase):
+    """
+    Probability to reach the target from the start of a game (two spawned pieces on an empty board)
+    Args:
+        tablebase: Tablebase -> mapped table
+    Return:
+        float -> probability with perfect play
+    """
+    size = tablebase.space.size
+    cells = size * size
+    total = 0.0
+    for first in range(cells):
+        for second in range(cells):
+            if first == second:
+                continue
+            for first_value, first_probability in ((2, 0.9), (4, 0.1)):
+                for second_value, second_probability in ((2, 0.9), (4, 0.1)):
+                    board = [[0] * size for _ in range(size)]
+                    board[first // size][first % size] = first_value
+                    board[second // size][second % size] = second_value
+                    total += first_probability * second_probability * tablebase.win_probability(board)
+    return total / (cells * (cells - 1))
+
+
+def main():
+    """
+    Parse the command line options and generate a table or print its information
+    """
+    parser = argparse.ArgumentParser(description="Endgame tablebase of small 2048 boards")
+    parser.add_argument('command', choices=['generate', 'info'], help="generate a table or print its information")
+    parser.add_argument('--size', type=int, default=3, help="rows and columns of the board")
+    parser.add_argument('--target', type=int, default=256, help="target piece (power of two, at least 8)")
+    parser.add_argument('--directory', default=tablebases_directory, help="directory of the tables")
+    parser.add_argument('--workers', type=int, default=None, help="worker processes (default: all cores)")
+    args = parser.parse_args()
+    if args.target < 8 or args.target & (args.target - 1):
+        parser.error("the target must be a power of two of at least 8")
+    target = args.target.bit_length() - 1
+    path = os.path.join(args.directory, table_name(args.size, target) + '.npy')
+
+    if args.command == 'generate':
+        space = BoardSpace(args.size, target)
+        print(f"boards: {space.count}, layers: {space.layer_count}")
+        start = time.perf_counter()
+        generate_tablebase(args.size, target, args.directory, args.workers)
+        elapsed = time.perf_counter() - start
+        print(f"time: {elapsed:.1f} s")
+
+    try:
+        tablebase = Tablebase(path)
+    except OSError:
+        parser.error(f"there is no table {path}, generate it first")
+    print(f"{table_name(args.size, target)}: {len(tablebase.keys)} positions, "
+          f"{os.path.getsize(path) / 1e6:.1f} MB")
+    print(f"probability to reach {args.target} from the start: {start_probability(tablebase):.4f}")
+
+
+if __name__ == "__main__":
+    main()
+
+# endregion MAIN
@@ -0,0 +1,419 @@
+import argparse  # for the command line options
+import json  # for the NDJSON lines
+import os  # for rotating the event files
+import socket  # for the statsd sink and the listener
+import tempfile  # for the benchmark event file
+import threading  # for draining the events next to the game loop
+import time  # for the event times
+
+"""
+---------------------------------------------------------------------
+    Telemetry events of the 2048 game
+---------------------------------------------------------------------
+    - The game emits small structured events (moves, spawns, undos, game overs, theme and rule variant changes,
+      save durations, the renderer, input to sound latencies, puzzle results and frame time percentiles)
+    - emit only stores the event into a preallocated ring buffer, there is no lock and no I/O
+    - A background thread drains the ring buffer every interval and writes the events to a sink:
+      a rotating NDJSON file or statsd lines over UDP
+    - When the sink is too slow and the ring buffer is full, new events are dropped and counted,
+      the game never waits for the telemetry
+    - The ring buffer has one producer (the game thread) and one consumer (the drain thread),
+      each index is written by one side only -> emit from the game thread only
+    - Without a started sink emit returns immediately
+
+Usage: python main.py --telemetry assets/telemetry/events.ndjson (or --telemetry udp://127.0.0.1:8125)
+       python telemetry.py listen --port 8125
+       python telemetry.py benchmark
+---------------------------------------------------------------------
+"""
+
+# region VARIABLES
+"""
+Variables of the telemetry
+    - event_fields: dict -> event name -> names of its fields in the order they are emitted
+    - default_capacity: int -> number of events the ring buffer holds (power of two)
+    - default_interval: float -> seconds between two drains of the ring buffer
+    - statsd_packet_size: int -> maximum size of one statsd datagram
+"""
+event_fields = {
+    "move": ("mode", "direction", "score_gain"),
+    "spawn": ("rule", "game_over"),
+    "undo": ("mode",),
+    "game_over": ("mode", "score", "max_tile"),
+    "theme_change": ("theme",),
+    "variant_change": ("variant",),
+    "renderer": ("backend", "width", "height"),
+    "sound_latency": ("sound", "latency_ms"),
+    "puzzle": ("puzzle_id", "result", "moves"),
+    "save": ("duration_ms",),
+    "frame_times": ("mode", "frames", "p50_ms", "p95_ms", "p99_ms", "max_ms"),
+    "merge_cache": ("hits", "misses", "size", "hit_rate"),
+    "telemetry_dropped": ("events",)
+}
+
+default_capacity = 8192
+default_interval = 0.5
+statsd_packet_size = 1400
+
+
+# endregion VARIABLES
+
+# region SINKS
+
+class NdjsonSink:
+    """
+    Writes every event as one JSON line, the file is rotated when it gets too big
+    Args:
+        path: str -> path of the event file
+        max_bytes: int -> size after which the file is rotated
+        backup_count: int -> number of rotated files kept (path.1 is the newest)
+    """
+
+    def __init__(self, path, max_bytes=1000000, backup_count=3):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.file = open(path, 'a')
+
+    def write(self, records):
+        """
+        Write the records and rotate the file if needed
+        Args:
+            records: list -> event dictionaries
+        """
+        self.file.write(''.join(json.dumps(record) + '\n' for record in records))
+        self.file.flush()
+        if self.file.tell() >= self.max_bytes:
+            self.rotate()
+
+    def rotate(self):
+        """
+        Move the files one number up (path -> path.1 -> path.2 ...) and start a new file
+        """
+        self.file.close()
+        for number in range(self.backup_count - 1, 0, -1):
+            if os.path.exists(f"{self.path}.{number}"):
+                os.replace(f"{self.path}.{number}", f"{self.path}.{number + 1}")
+        if self.backup_count > 0:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+        self.file = open(self.path, 'a')
+
+    def close(self):
+        """
+        Close the event file
+        """
+        self.file.close()
+
+
+class StatsdSink:
+    """
+    Sends the events as statsd lines over UDP (e.g. to a local statsd agent or to python telemetry.py listen)
+    Every event counts as prefix.event:1|c, fields ending with _ms are sent as timings, other numbers as gauges
+    Datagrams which cannot be sent right away are dropped
+    Args:
+        host: str -> address of the statsd agent
+        port: int -> port of the statsd agent
+        prefix: str -> prefix of all metric names
+    """
+
+    def __init__(self, host='127.0.0.1', port=8125, prefix='game2048'):
+        self.address = (host, port)
+        self.prefix = prefix
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.socket.setblocking(False)
+
+    def record_lines(self, record):
+        """
+        Convert one event to statsd lines
+        Args:
+            record: dict -> event dictionary
+        Return:
+            list -> statsd lines of the event
+        """
+        name = f"{self.prefix}.{record['event']}"
+        lines = [f"{name}:1|c"]
+        for field, value in record.items():
+            if isinstance(value, bool) or not isinstance(value, (int, float)) or field == "time":
+                continue
+            lines.append(f"{name}.{field}:{value}|{'ms' if field.endswith('_ms') else 'g'}")
+        return lines
+
+    def write(self, records):
+        """
+        Send the records packed into as few datagrams as possible
+        Args:
+            records: list -> event dictionaries
+        """
+        packet = ''
+        for record in records:
+            for line in self.record_lines(record):
+                if packet and len(packet) + len(line) + 1 > statsd_packet_size:
+                    self.send(packet)
+                    packet = ''
+                packet = f"{packet}\n{line}" if packet else line
+        if packet:
+            self.send(packet)
+
+    def send(self, packet):
+        """
+        Send one datagram, drop it if the socket is not ready
+        Args:
+            packet: str -> statsd lines separated by new lines
+        """
+        try:
+            self.socket.sendto(packet.encode(), self.address)
+        except OSError:
+            pass
+
+    def close(self):
+        """
+        Close the socket
+        """
+        self.socket.close()
+
+
+def open_sink(target):
+    """
+    Open the sink given on the command line
+    Args:
+        target: str -> udp://HOST:PORT for statsd, anything else is the path of an NDJSON file
+    Return:
+        NdjsonSink or StatsdSink -> opened sink
+    """
+    if target.startswith('udp://'):
+        host, _, port = target[len('udp://'):].rpartition(':')
+        return StatsdSink(host or '127.0.0.1', int(port))
+    return NdjsonSink(target)
+
+
+# endregion SINKS
+
+# region TELEMETRY
+
+class Telemetry:
+    """
+    Lock-free ring buffer of events drained by a background thread
+    Args:
+        capacity: int -> number of events the ring buffer holds, rounded up to a power of two
+    """
+
+    def __init__(self, capacity=default_capacity):
+        size = 1
+        while size < capacity:
+            size *= 2
+        self.buffer = [None] * size
+        self.mask = size - 1
+        self.write_index = 0  # written only by emit
+        self.read_index = 0  # written only by the drain
+        self.dropped = 0  # written only by emit
+        self.reported_dropped = 0
+        self.enabled = False
+        self.sink = None
+        self.thread = None
+        self.stop_event = threading.Event()
+        self.interval = default_interval
+        # perf_counter is cheaper than time.time, the wall time is added when the events are drained
+        self.time_offset = time.time() - time.perf_counter()
+
+    def start(self, sink, interval=default_interval):
+        """
+        Start collecting events and draining them to the sink
+        Args:
+            sink: NdjsonSink or StatsdSink -> where the events are written
+            interval: float -> seconds between two drains
+        """
+        self.sink = sink
+        self.interval = interval
+        self.stop_event.clear()
+        self.enabled = True
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """
+        Stop collecting events, write the rest of them and close the sink
+        """
+        if self.thread is None:
+            return
+        self.enabled = False
+        self.stop_event.set()
+        self.thread.join()
+        self.thread = None
+        self.flush()
+        self.sink.close()
+        self.sink = None
+
+    def emit(self, event, *fields):
+        """
+        Store one event into the ring buffer, never blocks -> the event is dropped if the buffer is full
+        Args:
+            event: str -> name of the event (key of event_fields)
+            fields: tuple -> values of the fields of the event in the order of event_fields
+        """
+        if not self.enabled:
+            return
+        index = self.write_index
+        if index - self.read_index > self.mask:
+            self.dropped += 1
+            return
+        self.buffer[index & self.mask] = (event, time.perf_counter(), fields)
+        self.write_index = index + 1
+
+    def drain(self):
+        """
+        Take all events out of the ring buffer
+        Return:
+            list -> (event, time, fields) of the events in the emit order
+        """
+        read_index = self.read_index
+        write_index = self.write_index
+        buffer = self.buffer
+        mask = self.mask
+        events = [buffer[index & mask] for index in range(read_index, write_index)]
+        # the slots are free for emit only after they are read
+        self.read_index = write_index
+        return events
+
+    def to_record(self, event, timestamp, fields):
+        """
+        Convert an event of the ring buffer to the dictionary written by the sinks
+        Args:
+            event: str -> name of the event
+            timestamp: float -> perf_counter time of the event
+            fields: tuple -> values of the fields
+        Return:
+            dict -> event dictionary
+        """
+        record = {"event": event, "time": round(self.time_offset + timestamp, 6)}
+        record.update(zip(event_fields.get(event, ()), fields))
+        return record
+
+    def flush(self):
+        """
+        Drain the ring buffer and write the events to the sink
+        """
+        records = [self.to_record(*event) for event in self.drain()]
+        dropped = self.dropped
+        if dropped > self.reported_dropped:
+            records.append(self.to_record("telemetry_dropped", time.perf_counter(), (dropped - self.reported_dropped,)))
+            self.reported_dropped = dropped
+        if records:
+            try:
+                self.sink.write(records)
+            except OSError:
+                pass  # a broken sink must never stop the game
+
+    def run(self):
+        """
+        Body of the drain thread -> flush every interval until stopped
+        """
+        while not self.stop_event.wait(self.interval):
+            self.flush()
+
+
+class FrameTimes:
+    """
+    Collects frame times and emits their percentiles every few frames
+    Args:
+        telemetry: Telemetry -> where the percentiles are emitted
+        window: int -> number of frames in one report
+        cache_stats: callable -> statistics of the merge cache emitted with every report (None -> not emitted)
+    """
+
+    def __init__(self, telemetry, window=300, cache_stats=None):
+        self.telemetry = telemetry
+        self.window = window
+        self.cache_stats = cache_stats
+        self.times = []
+
+    def add(self, mode, frame_ms):
+        """
+        Add the time of one frame, a full window is emitted as a frame_times event and a merge_cache event
+        Args:
+            mode: str -> game mode of the frame
+            frame_ms: float -> time spent on the frame in milliseconds
+        """
+        if not self.telemetry.enabled:
+            return
+        times = self.times
+        times.append(frame_ms)
+        if len(times) >= self.window:
+            times.sort()
+            count = len(times)
+            self.telemetry.emit("frame_times", mode, count, times[count // 2], times[count * 95 // 100],
+                                times[count * 99 // 100], times[-1])
+            if self.cache_stats is not None:
+                stats = self.cache_stats()
+                self.telemetry.emit("merge_cache", stats["hits"], stats["misses"], stats["size"], stats["hit_rate"])
+            times.clear()
+
+
+# endregion TELEMETRY
+
+# region MAIN
+
+def listen(port):
+    """
+    Print the statsd lines received on the port, a stand-in for a statsd agent
+    Args:
+        port: int -> UDP port to listen on
+    """
+    receiver = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    receiver.bind(('127.0.0.1', port))
+    print(f"listening on udp://127.0.0.1:{port}")
+    while True:
+        packet, _ = receiver.recvfrom(65535)
+        print(packet.decode())
+
+
+def benchmark(events):
+    """
+    Measure the cost of one emit while the drain thread writes to a temporary NDJSON file
+    The events are emitted as fast as possible, far faster than the game does -> most of them are dropped
+    Args:
+        events: int -> number of emitted events
+    """
+    telemetry = Telemetry()
+    start = time.perf_counter()
+    for _ in range(events):
+        telemetry.emit("move", "classic", "UP", 4)
+    disabled = (time.perf_counter() - start) / events
+
+    path = os.path.join(tempfile.gettempdir(), 'telemetry_benchmark.ndjson')
+    telemetry.start(NdjsonSink(path, backup_count=0), interval=0.01)
+    start = time.perf_counter()
+    for _ in range(events):
+        telemetry.emit("move", "classic", "UP", 4)
+    enabled = (time.perf_counter() - start) / events
+    telemetry.stop()
+    os.remove(path)
+
+    print(f"emit without sink: {disabled * 1e9:.0f} ns")
+    print(f"emit with sink: {enabled * 1e9:.0f} ns, dropped {telemetry.dropped} of {events} flooded events")
+
+
+def main():
+    """
+    Parse the command line options and run the listener or the benchmark
+    """
+    parser = argparse.ArgumentParser(description="Telemetry tools of the 2048 game")
+    parser.add_argument('command', choices=['listen', 'benchmark'], help="print statsd lines or measure emit")
+    parser.add_argument('--port', type=int, default=8125, help="UDP port of the listener")
+    parser.add_argument('--events', type=int, default=1000000, help="events emitted by the benchmark")
+    args = parser.parse_args()
+
+    if args.command == 'listen':
+        listen(args.port)
+    else:
+        benchmark(args.events)
+
+
+if __name__ == "__main__":
+    main()
+
+# endregion MAIN
@@ -0,0 +1,55 @@
+import random  # for the seeded spawns
+import pytest
+from bitboard import directions
+from flat_board import FlatBoard
+from game_logic import spawn_piece
+from test_game_logic import reference_moves, random_boards, board_count
+
+"""
+---------------------------------------------------------------------
+    Tests of the flat in-place board
+---------------------------------------------------------------------
+    - FlatBoard moves like the move functions of game_logic.py
+    - The move record undoes the move and the spawn after it
+    - FlatBoard spawns with the same random numbers as spawn_piece of game_logic.py
+
+Usage: python -m pytest -q
+---------------------------------------------------------------------
+"""
+
+
+# region TESTS
+
+@pytest.mark.parametrize("move_direction", directions)
+def test_flat_board_matches_game_logic(move_direction):
+    flat = FlatBoard()
+    for board in random_boards(directions.index(move_direction), board_count):
+        expected, expected_score = reference_moves[move_direction]([row[:] for row in board], 0)
+        flat.load_values(board)
+        record = flat.move(move_direction)
+        assert (flat.to_values(), record.score) == (expected, expected_score)
+        assert record.changed == (expected != board)
+
+
+def test_record_undoes_move_and_spawn():
+    rng = random.Random(9)
+    flat = FlatBoard()
+    for board in random_boards(9, board_count):
+        flat.load_values(board)
+        record = flat.move(rng.choice(directions))
+        flat.spawn(rng, record)
+        flat.undo(record)
+        assert flat.to_values() == board
+
+
+def test_spawn_matches_spawn_piece():
+    flat_rng = random.Random(10)
+    reference_rng = random.Random(10)
+    flat = FlatBoard()
+    board = [[0 for _ in range(4)] for _ in range(4)]
+    while flat.spawn(flat_rng) is not None:
+        board, _ = spawn_piece(board, reference_rng)
+        assert flat.to_values() == board
+
+
+# endregion TESTS
@@ -0,0 +1,101 @@
+import random  # for the seeded random boards
+from itertools import product  # for all short lines
+import pytest
+from bitboard import directions, pack_board, unpack_board, move_board as move_packed_board
+from game_logic import merge_row, move_up, move_down, move_left, move_right
+
+"""
+---------------------------------------------------------------------
+    Tests of the invariants the other modules depend on
+---------------------------------------------------------------------
+    - merge_row (the memoized kernel of game_logic.py) merges like the original loop of the move functions
+    - The move functions of game_logic.py and the packed boards of bitboard.py give the same boards and scores
+
+Usage: python -m pytest -q
+---------------------------------------------------------------------
+"""
+
+# region VARIABLES
+"""
+Variables of the tests
+    - reference_moves: dict -> direction -> move function of game_logic.py
+    - line_values: tuple -> tile values of the exhaustive line test
+    - board_count: int -> number of random boards compared between the engines
+"""
+reference_moves = {
+    "UP": move_up,
+    "DOWN": move_down,
+    "LEFT": move_left,
+    "RIGHT": move_right
+}
+line_values = (0, 2, 4, 8, 16, 32, 2048, 32768)
+board_count = 2000
+
+
+# endregion VARIABLES
+
+# region HELPERS
+
+def loop_merge(line):
+    """
+    Merge one line with the loop the move functions used before the memoized kernel
+    Args:
+        line: tuple -> values of the line, the first value is the side the tiles move to
+    Return:
+        tuple -> (values after the move, score of the merges)
+    """
+    tiles = [tile for tile in line if tile != 0]
+    merged_line = []
+    gain = 0
+    skip = False
+    for i in range(len(tiles)):
+        if skip:
+            skip = False
+            continue
+        if i + 1 < len(tiles) and tiles[i] == tiles[i + 1]:
+            merged_line.append(tiles[i] * 2)
+            gain += tiles[i] * 2
+            skip = True
+        else:
+            merged_line.append(tiles[i])
+    merged_line += [0] * (len(line) - len(merged_line))
+    return tuple(merged_line), gain
+
+
+def random_boards(seed, count):
+    """
+    Random boards with many equal neighbours and tiles up to 16384, so every merge fits into bitboard.py
+    Args:
+        seed: int -> seed of the boards
+        count: int -> number of boards
+    Return:
+        list -> values of the boards
+    """
+    rng = random.Random(seed)
+    boards = []
+    for _ in range(count):
+        top = rng.randint(1, 14)
+        boards.append([[0 if rng.random() < 0.3 else 2 ** rng.randint(1, top) for _ in range(4)] for _ in range(4)])
+    return boards
+
+
+# endregion HELPERS
+
+# region MERGE KERNEL
+
+def test_merge_row_matches_loop():
+    for line in product(line_values, repeat=4):
+        merged_line, gain, changed = merge_row(line)
+        assert (merged_line, gain) == loop_merge(line)
+        assert changed == (merged_line != line)
+
+
+@pytest.mark.parametrize("move_direction", directions)
+def test_bitboard_matches_game_logic(move_direction):
+    for board in random_boards(directions.index(move_direction), board_count):
+        expected, expected_score = reference_moves[move_direction]([row[:] for row in board], 0)
+        packed, packed_score = move_packed_board(pack_board(board), move_direction)
+        assert (unpack_board(packed), packed_score) == (expected, expected_score)
+
+
+# endregion MERGE KERNEL
@@ -0,0 +1,123 @@
+import random  # for the seeded games
+import pytest
+from bitboard import directions
+from game_logic import spawn_piece, PlayerState
+from journal import GameJournal, load_journal
+from recording import GameRecord
+from variants import rule_variants
+
+"""
+---------------------------------------------------------------------
+    Tests of the autosave journal
+---------------------------------------------------------------------
+    - A journaled game is restored exactly after a crash (load_journal), with the rules of its variant
+    - The undo history and the recording are rebuilt from the events of the game
+    - A finished game is not restored
+
+Usage: python -m pytest -q
+---------------------------------------------------------------------
+"""
+
+
+# region HELPERS
+
+def journal_state(player, record):
+    """
+    Snapshot of a game like journal_state of main.py
+    Args:
+        player: PlayerState -> state of the game
+        record: GameRecord -> recording of the game
+    Return:
+        dict -> copy of the start state
+    """
+    return {
+        "board_values": [row[:] for row in player.board_values],
+        "score": player.score,
+        "cooldown_counter": player.cooldown_counter,
+        "init_pieces_count": player.init_pieces_count,
+        "spawn_new": player.spawn_new,
+        "record": {"mode": record.mode, "variant": record.variant, "initial_board": record.initial_board}
+    }
+
+
+def play_journaled(journal, seed, moves, variant='classic'):
+    """
+    Play a game and journal it like the classic mode of main.py
+    Args:
+        journal: GameJournal -> journal of the game
+        seed: int -> seed of the spawns and moves
+        moves: int -> number of moves
+        variant: str -> name of the rule variant (variants.py)
+    Return:
+        PlayerState -> state of the game after the moves
+    """
+    rng = random.Random(seed)
+    player = PlayerState()
+    if variant != 'classic':
+        player.rules = rule_variants[variant]
+    record = GameRecord(variant=variant)
+    journal.snapshot(journal_state(player, record))
+    for _ in range(moves):
+        if player.spawn_new or player.init_pieces_count < 2:
+            before = [row[:] for row in player.board_values]
+            if player.rules is not None:
+                player.board_values, player.game_over = player.rules.spawn(player.board_values, rng)
+            else:
+                player.board_values, player.game_over = spawn_piece(player.board_values, rng)
+            spawned = [[row, col, player.board_values[row][col]] for row in range(4) for col in range(4)
+                       if before[row][col] != player.board_values[row][col]]
+            journal.record("spawn", spawned)
+            player.spawn_new = False
+            player.init_pieces_count += 1
+            if player.game_over:
+                break
+            if player.init_pieces_count < 2:
+                continue
+        if rng.random() < 0.1 and player.return_one_move():
+            journal.record("undo")
+        move_direction = rng.choice(directions)
+        player.move(move_direction)
+        journal.record("move", move_direction)
+    return player
+
+
+# endregion HELPERS
+
+# region TESTS
+
+@pytest.mark.parametrize("variant", ['classic', 'fibonacci', 'triples'])
+def test_journal_recovers_after_crash(tmp_path, variant):
+    path = str(tmp_path / 'game.journal')
+    journal = GameJournal(path)
+    player = play_journaled(journal, 7, 200, variant)
+    assert player.score > 0
+    # a crash -> the writer stops without marking the game as finished, the last line is torn
+    journal.close()
+    with open(path, 'a') as f:
+        f.write('["move", "LE')
+
+    state = load_journal(path)
+    assert state is not None
+    assert state["record"]["variant"] == variant
+    assert state["board_values"] == player.board_values
+    assert state["score"] == player.score
+    assert state["cooldown_counter"] == player.cooldown_counter
+    assert state["previous_states"] == player.previous_states
+    assert state["init_pieces_count"] == player.init_pieces_count
+
+    # the recording is rebuilt by the replay, replaying it again gives the same board
+    record = GameRecord(state["record"]["mode"], state["record"]["initial_board"], variant)
+    record.history = state["record"]["history"]
+    assert record.boards()[-1] == player.board_values
+
+
+def test_finished_game_is_not_restored(tmp_path):
+    path = str(tmp_path / 'game.journal')
+    journal = GameJournal(path)
+    play_journaled(journal, 8, 50)
+    journal.finish()
+    journal.close()
+    assert load_journal(path) is None
+
+
+# endregion TESTS
@@ -0,0 +1,84 @@
+import numpy as np  # for the actions and the observations
+from game_logic import can_move_check
+from rl_env import Game2048Env, VectorGame2048Env
+
+"""
+---------------------------------------------------------------------
+    Tests of the reinforcement learning environments
+---------------------------------------------------------------------
+    - The single env returns the terminal board when the game is lost and starts a new game only on reset
+    - The vector env resets finished boards in the same step
+
+Usage: python -m pytest -q
+---------------------------------------------------------------------
+"""
+
+
+# region HELPERS
+
+def observed_values(observation):
+    """
+    Values of the board of a one-hot observation
+    Args:
+        observation: np.ndarray -> one-hot planes (planes, 4, 4)
+    Return:
+        list -> values of the board
+    """
+    exponents = observation.argmax(axis=0)
+    return [[1 << int(exponent) if exponent else 0 for exponent in row] for row in exponents]
+
+
+def play_until_lost(env, rng):
+    """
+    Play random legal actions until the game is lost
+    Args:
+        env: Game2048Env -> environment after reset
+        rng: np.random.Generator -> random generator of the actions
+    Return:
+        tuple -> observation, info and number of steps of the step which lost the game
+    """
+    _, info = env.reset()
+    steps = 0
+    while True:
+        action = int((rng.random(4) * info["action_mask"]).argmax())
+        observation, _, terminated, _, info = env.step(action)
+        steps += 1
+        if terminated:
+            return observation, info, steps
+
+
+# endregion HELPERS
+
+# region TESTS
+
+def test_single_env_returns_terminal_board():
+    env = Game2048Env(seed=3)
+    observation, info, steps = play_until_lost(env, np.random.default_rng(4))
+    board = observed_values(observation)
+    assert steps > 0
+    assert all(value != 0 for row in board for value in row)
+    assert not can_move_check(board)
+    assert not info["action_mask"].any()
+    assert info["score"] > 0
+
+    observation, info = env.reset()
+    assert sum(value != 0 for row in observed_values(observation) for value in row) == 2
+    assert info["action_mask"].any()
+
+
+def test_vector_env_resets_finished_boards():
+    env = VectorGame2048Env(8, seed=5)
+    _, infos = env.reset()
+    rng = np.random.default_rng(6)
+    finished = 0
+    for _ in range(2000):
+        actions = (rng.random((8, 4)) * infos["action_mask"]).argmax(axis=1)
+        _, _, terminations, _, infos = env.step(actions)
+        finished += int(terminations.sum())
+        # a finished board is already the first board of a new game
+        assert infos["action_mask"].any(axis=1).all()
+        assert (infos["final_score"][terminations] > 0).all()
+    assert finished > 0
+
+
+# endregion TESTS
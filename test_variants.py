@@ -0,0 +1,43 @@
+import pytest
+from bitboard import directions
+from test_game_logic import reference_moves, random_boards, board_count
+from variants import ClassicRules, FibonacciRules, TripleRules, blocker
+
+"""
+---------------------------------------------------------------------
+    Tests of the rule variants
+---------------------------------------------------------------------
+    - The classic row table of variants.py moves like the move functions of game_logic.py
+    - Blockers stay in their cells and split the line they stand in
+    - Fibonacci and triple tiles merge by their own rules
+
+Usage: python -m pytest -q
+---------------------------------------------------------------------
+"""
+
+
+# region TESTS
+
+@pytest.mark.parametrize("move_direction", directions)
+def test_classic_rules_match_game_logic(move_direction):
+    rules = ClassicRules()
+    for board in random_boards(directions.index(move_direction), board_count):
+        expected, expected_score = reference_moves[move_direction]([row[:] for row in board], 0)
+        assert rules.move([row[:] for row in board], move_direction, 0) == (expected, expected_score)
+
+
+def test_blockers_split_lines():
+    rules = ClassicRules(blockers=2)
+    assert rules.transition((0, 2, blocker, 2)) == ((2, 0, blocker, 2), 0, True)
+    assert rules.transition((2, blocker, 2, 2)) == ((2, blocker, 4, 0), 4, True)
+    assert rules.transition((blocker, 2, 4, 8)) == ((blocker, 2, 4, 8), 0, False)
+
+
+def test_variant_merges():
+    assert FibonacciRules().transition((1, 2, 3, 0)) == ((3, 3, 0, 0), 3, True)
+    assert FibonacciRules().transition((1, 1, 2, 0)) == ((2, 2, 0, 0), 2, True)
+    assert TripleRules().transition((3, 3, 3, 3)) == ((9, 3, 0, 0), 9, True)
+    assert TripleRules().transition((3, 3, 9, 0)) == ((3, 3, 9, 0), 0, False)
+
+
+# endregion TESTS
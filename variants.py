@@ -0,0 +1,347 @@
+import random  # for the spawns and the blockers
+from itertools import product  # for all lines of the row table
+from game_logic import merge_row  # for the lines of the classic rules
+
+"""
+---------------------------------------------------------------------
+    Rule variants of the 2048 game
+---------------------------------------------------------------------
+    - A rule variant decides which tiles merge, which tiles spawn, where blockers stand and when the game is won
+    - ClassicRules: two equal tiles merge into their sum (the rules of move_up, ... in game_logic.py)
+    - FibonacciRules: two neighbouring Fibonacci numbers merge into their sum (1 + 1, 1 + 2, 2 + 3, ...)
+    - TripleRules: three equal tiles merge into their sum, tiles are powers of three
+    - Blockers are immovable tiles placed at the start of a game, they split the lines they stand in
+    - A target wins the game as soon as a tile reaches it
+    - When a variant is selected, the result of every line (tiles below a limit) is computed once into a row table
+      -> a move is one table lookup per line, exactly as fast for every variant
+    - Lines of classic merging without blockers are computed by merge_row of game_logic.py
+      -> the classic rules have one implementation in every mode
+    - rule_variants holds the presets selectable in the settings menu
+---------------------------------------------------------------------
+"""
+
+# region VARIABLES
+"""
+Variables of the rule variants
+    - blocker: int -> value of a blocker tile on the board
+"""
+blocker = -1
+
+
+# endregion VARIABLES
+
+# region RULE VARIANTS
+
+class ClassicRules:
+    """
+    Classic merging -> two equal tiles merge into their sum, 2 with 90 % and 4 with 10 % are spawned
+    Args:
+        target: int -> tile which wins the game (None -> play until no move is left)
+        blockers: int -> number of blockers placed at the start of a game
+        table_tiles: int -> number of tile values in the row table, longer lines are computed when they appear
+    """
+    merge_count = 2
+    spawn_values = (2, 4)
+    classic_merges = True  # equal pairs merge into their sum -> merge_row computes the lines without blockers
+
+    def __init__(self, target=None, blockers=0, table_tiles=13):
+        self.target = target
+        self.blockers = blockers
+        self.tiles = self.tile_values(table_tiles)
+        self.row_table = None
+
+    @property
+    def classic_board(self):
+        """
+        True if the boards are classic boards (powers of two, no blockers)
+        -> the spawn rules, the hint search and the tools can be used
+        """
+        return self.blockers == 0
+
+    def tile_values(self, count):
+        """
+        Values of the tiles in the order they are created by merging
+        Args:
+            count: int -> number of values
+        Return:
+            tuple -> values of the tiles
+        """
+        return tuple(2 ** (index + 1) for index in range(count))
+
+    def merged_value(self, tiles):
+        """
+        Value of the merge of neighbouring tiles
+        Args:
+            tiles: tuple -> merge_count tiles next to each other in a line
+        Return:
+            int -> value of the merged tile, None if the tiles do not merge
+        """
+        return tiles[0] * 2 if tiles[0] == tiles[1] else None
+
+    def color_value(self, value):
+        """
+        Classic value whose theme color is used for a tile of the variant
+        Args:
+            value: int -> value of the tile
+        Return:
+            int -> value of the classic tile with the same number of merges
+        """
+        return value
+
+    def merge_segment(self, tiles):
+        """
+        Merge the tiles of a line segment (no empty cells, no blockers) towards its start
+        Args:
+            tiles: list -> values of the tiles
+        Return:
+            merged: list -> values after the merges
+            gain: int -> score of the merges (sum of the merged tiles)
+        """
+        merged = []
+        gain = 0
+        index = 0
+        while index < len(tiles):
+            value = None
+            if index + self.merge_count <= len(tiles):
+                value = self.merged_value(tuple(tiles[index:index + self.merge_count]))
+            if value is None:
+                merged.append(tiles[index])
+                index += 1
+            else:
+                merged.append(value)
+                gain += value
+                index += self.merge_count
+        return merged, gain
+
+    def transition(self, line):
+        """
+        Move and merge one line towards its start, blockers stay and split the line into segments
+        Args:
+            line: tuple -> values of the line, the first value is the side the tiles move to
+        Return:
+            new_line: tuple -> values of the line after the move
+            gain: int -> score of the merges
+            changed: bool -> True if the move changed the line
+        """
+        if self.classic_merges and blocker not in line:
+            return merge_row(line)
+        new_line = []
+        gain = 0
+        segment = []
+        for value in line + (blocker,):
+            if value != blocker:
+                segment.append(value)
+                continue
+            merged, segment_gain = self.merge_segment([tile for tile in segment if tile != 0])
+            new_line += merged + [0] * (len(segment) - len(merged)) + [blocker]
+            gain += segment_gain
+            segment = []
+        new_line = tuple(new_line[:-1])
+        return new_line, gain, new_line != line
+
+    def compile(self, size=4):
+        """
+        Compute the row table of the variant, only the first call does the work
+        Args:
+            size: int -> length of the lines
+        """
+        if self.row_table is not None:
+            return
+        alphabet = (0,) + self.tiles + ((blocker,) if self.blockers else ())
+        self.row_table = {line: self.transition(line) for line in product(alphabet, repeat=size)}
+
+    def move_line(self, line):
+        """
+        Result of a move of one line from the row table
+        Args:
+            line: tuple -> values of the line
+        Return:
+            tuple -> (new line, gain, changed) as returned by transition
+        """
+        result = self.row_table.get(line)
+        if result is None:
+            # a tile above the table limit -> computed once and kept
+            result = self.transition(line)
+            self.row_table[line] = result
+        return result
+
+    def move(self, board, move_direction, score):
+        """
+        Move the board in the given direction + update the score, same as move_up, ... in game_logic.py
+        Args:
+            board: list -> values of the board
+            move_direction: str -> direction of the move
+            score: int -> score of the game
+        Return:
+            board: list -> values of the board after the move
+            score: int -> updated score
+        """
+        if self.row_table is None:
+            self.compile(len(board))
+        table = self.row_table
+        size = len(board)
+        if move_direction in ("LEFT", "RIGHT"):
+            for row in range(size):
+                line = tuple(board[row]) if move_direction == "LEFT" else tuple(board[row][::-1])
+                new_line, gain, changed = table.get(line) or self.move_line(line)
+                if changed:
+                    board[row] = list(new_line) if move_direction == "LEFT" else list(new_line[::-1])
+                    score += gain
+        else:
+            # the column is read from the side the tiles move to
+            rows = range(size - 1, -1, -1) if move_direction == "DOWN" else range(size)
+            for col in range(size):
+                line = tuple([board[row][col] for row in rows])
+                new_line, gain, changed = table.get(line) or self.move_line(line)
+                if changed:
+                    for index, row in enumerate(rows):
+                        board[row][col] = new_line[index]
+                    score += gain
+        return board, score
+
+    def can_move(self, board):
+        """
+        Check if any move changes the board
+        Args:
+            board: list -> values of the board
+        Return:
+            bool -> True if a move is possible
+        """
+        if self.row_table is None:
+            self.compile(len(board))
+        size = len(board)
+        for index in range(size):
+            row = tuple(board[index])
+            column = tuple(board[line][index] for line in range(size))
+            for line in (row, row[::-1], column, column[::-1]):
+                if self.move_line(line)[2]:
+                    return True
+        return False
+
+    def won(self, board):
+        """
+        Check if a tile reached the target
+        Args:
+            board: list -> values of the board
+        Return:
+            bool -> True if the game is won
+        """
+        return self.target is not None and any(value >= self.target for row in board for value in row)
+
+    def place_blockers(self, board, rng=random):
+        """
+        Put the blockers on random empty cells of a new board
+        Args:
+            board: list -> values of the board
+            rng: random.Random -> random generator
+        Return:
+            list -> values of the board with the blockers
+        """
+        empty_cells = [(row, col) for row in range(len(board)) for col in range(len(board)) if board[row][col] == 0]
+        for row, col in rng.sample(empty_cells, min(self.blockers, len(empty_cells))):
+            board[row][col] = blocker
+        return board
+
+    def spawn(self, board, rng=random):
+        """
+        Spawn one piece (first spawn value with 90 %, second with 10 %) and check if the game is over
+        Args:
+            board: list -> values of the board
+            rng: random.Random -> random generator
+        Return:
+            board: list -> values of the board with the new piece
+            bool -> True if the game is over
+        """
+        empty_cells = [(row, col) for row in range(len(board)) for col in range(len(board)) if board[row][col] == 0]
+        if empty_cells:
+            row, col = rng.choice(empty_cells)
+            board[row][col] = self.spawn_values[1] if rng.randint(1, 10) == 1 else self.spawn_values[0]
+            return board, False
+        return board, not self.can_move(board)
+
+
+class FibonacciRules(ClassicRules):
+    """
+    Fibonacci merging -> two neighbouring Fibonacci numbers merge into the next one, 1 and 2 are spawned
+    """
+    spawn_values = (1, 2)
+    classic_merges = False
+
+    def __init__(self, target=None, blockers=0, table_tiles=16):
+        super().__init__(target, blockers, table_tiles)
+        self.next_values = {}
+        previous = 1
+        for value in self.tile_values(60):
+            self.next_values[(previous, value)] = previous + value
+            self.next_values[(value, previous)] = previous + value
+            previous = value
+
+    @property
+    def classic_board(self):
+        return False
+
+    def tile_values(self, count):
+        values = [1, 2]
+        while len(values) < count:
+            values.append(values[-1] + values[-2])
+        return tuple(values[:count])
+
+    def merged_value(self, tiles):
+        return self.next_values.get(tiles)
+
+    def color_value(self, value):
+        # 1 -> 2, 2 -> 4, 3 -> 8, 5 -> 16, ...
+        count = 1
+        low, high = 1, 2
+        while low < value:
+            low, high = high, low + high
+            count += 1
+        return 2 ** count
+
+
+class TripleRules(ClassicRules):
+    """
+    Three of a kind -> three equal tiles merge into their sum, 3 and 9 are spawned
+    """
+    merge_count = 3
+    spawn_values = (3, 9)
+    classic_merges = False
+
+    def __init__(self, target=None, blockers=0, table_tiles=10):
+        super().__init__(target, blockers, table_tiles)
+
+    @property
+    def classic_board(self):
+        return False
+
+    def tile_values(self, count):
+        return tuple(3 ** (index + 1) for index in range(count))
+
+    def merged_value(self, tiles):
+        return tiles[0] * 3 if tiles[0] == tiles[1] == tiles[2] else None
+
+    def color_value(self, value):
+        count = 0
+        while value > 1:
+            value //= 3
+            count += 1
+        return 2 ** count
+
+
+# endregion RULE VARIANTS
+
+# region PRESETS
+"""
+Presets of the rule variants
+    - rule_variants: dict -> name of the variant -> rules
+"""
+rule_variants = {
+    "classic": ClassicRules(),
+    "fibonacci": FibonacciRules(),
+    "triples": TripleRules(),
+    "blockers": ClassicRules(blockers=2),
+    "target 512": ClassicRules(target=512),
+    "target 4096": ClassicRules(target=4096)
+}
+
+# endregion PRESETS